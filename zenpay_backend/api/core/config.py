@@ -15,6 +15,29 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./zenpay.db")
+    DB_POOL_SIZE: int = 5  # per worker process; not used for in-memory SQLite
+    DB_MAX_OVERFLOW: int = 10
+
+    # Server
+    WEB_CONCURRENCY: int = 0  # worker processes for serve.py; 0 = one per available core
+    GRACEFUL_SHUTDOWN_SECONDS: int = 30
+
+    # Executor lanes (api.core.lanes): threads and max queued calls per lane
+    LANE_INGEST_THREADS: int = 16
+    LANE_INGEST_QUEUE: int = 512
+    LANE_STRIPE_THREADS: int = 8
+    LANE_STRIPE_QUEUE: int = 64
+    LANE_REPORTING_THREADS: int = 4
+    LANE_REPORTING_QUEUE: int = 32
+
+    # Load shedding (api.core.load_shedding); 0 disables a signal
+    SHED_ENABLED: bool = True
+    SHED_MAX_IN_FLIGHT: int = 64  # requests on the default threadpool (routes without a lane)
+    SHED_LANE_QUEUE_FRACTION: float = 0.5  # of each lane's queue limit
+    SHED_LATENCY_SLO_MS: float = 1000.0
+    SHED_LATENCY_WINDOW_SECONDS: float = 5.0
+    SHED_RETRY_AFTER_SECONDS: int = 1
+    SHED_EXEMPT_PATHS: list[str] = ["/api/v1/usage/track", "/health", "/metrics"]
     
     # CORS
     BACKEND_CORS_ORIGINS: list[str] = ["http://localhost", "http://localhost:3000", "http://localhost:8000"]
@@ -22,9 +45,51 @@ class Settings(BaseSettings):
     # Stripe
     STRIPE_API_KEY: str = os.getenv("STRIPE_API_KEY", "")
     STRIPE_WEBHOOK_SECRET: str = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+    SUBSCRIPTION_CACHE_TTL_SECONDS: int = 60
+    SUBSCRIPTION_CACHE_MAX_ENTRIES: int = 100000
+
+    # Invoice previews (api.services.invoice_preview): rows younger than this
+    # are re-read on every request instead of cached
+    INVOICE_PREVIEW_SETTLE_SECONDS: float = 5.0
+    INVOICE_PREVIEW_MAX_TENANTS: int = 1000
     
     # API Keys
     API_KEY_PREFIX: str = "zp_"
+
+    # Per-tenant limits; users.rate_limit_* / max_concurrent_requests override
+    # them per user. 0 = unlimited.
+    RATE_LIMIT_PER_SECOND: float = 0.0
+    RATE_LIMIT_BURST: int = 0  # 0 = one second's worth of requests
+    TENANT_MAX_CONCURRENCY: int = 16
+
+    # Idempotency-Key handling for mutating requests (per worker process)
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 3600
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+    IDEMPOTENCY_WAIT_SECONDS: float = 60.0  # how long a duplicate waits for the first request
+
+    # Bulk imports (api.services.bulk_import): rows per file and per chunk,
+    # and the Stripe pool of each running import
+    IMPORT_MAX_ROWS: int = 100000
+    IMPORT_CHUNK_SIZE: int = 500
+    IMPORT_STRIPE_WORKERS: int = 8
+    IMPORT_STRIPE_RATE: float = 25.0  # requests per second; leaves room for live traffic
+
+    # Customer IDs per POST /credits/balances request
+    BALANCE_LOOKUP_MAX_IDS: int = 10000
+
+    # Credit leases (api.db.crud.credit_leases)
+    CREDIT_LEASE_DEFAULT_TTL_SECONDS: int = 60
+    CREDIT_LEASE_MAX_TTL_SECONDS: int = 3600
+
+    # Create the zp_test_key user on worker startup (development only; prefer
+    # ``python -m api.db.migrate --seed-test-user``)
+    SEED_TEST_USER: bool = False
+
+    # Observability
+    METRICS_ENABLED: bool = True
+    DB_SLOW_QUERY_MS: float = 200.0
+    DB_QUERY_COUNT_HEADER: bool = False
+    DB_QUERY_BUDGET: int = 0  # warn when a request runs more statements; 0 disables
     
     class Config:
         env_file = ".env"
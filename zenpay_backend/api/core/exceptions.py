@@ -11,6 +11,14 @@ class InsufficientCreditsError(ZenPayException):
     """Raised when a customer has insufficient credits"""
     pass
 
+class CreditLeaseNotFoundError(ZenPayException):
+    """Raised when a credit lease is not found"""
+    pass
+
+class CreditLeaseExpiredError(ZenPayException):
+    """Raised when a credit lease has expired or was released"""
+    pass
+
 class ProductNotFoundError(ZenPayException):
     """Raised when a product is not found"""
     pass
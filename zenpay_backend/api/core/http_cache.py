@@ -0,0 +1,36 @@
+# zenpay_backend/core/http_cache.py
+"""
+Conditional GET helpers.
+
+ETags are derived from version counters (see ``api.db.crud.versions``) rather
+than from the response body, so a route can answer ``If-None-Match`` with
+304 before loading the data it would have returned.
+"""
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(version: int) -> Optional[str]:
+    """ETag for a version; None while nothing has been written yet"""
+    if not version:
+        return None
+    return f'"v{version}"'
+
+
+def is_not_modified(request: Request, etag: Optional[str]) -> bool:
+    """True if the request's If-None-Match matches ``etag``"""
+    if etag is None:
+        return False
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
@@ -0,0 +1,201 @@
+# zenpay_backend/core/idempotency.py
+"""
+``Idempotency-Key`` support for mutating endpoints.
+
+A POST/PUT/PATCH/DELETE carrying an ``Idempotency-Key`` header is executed
+at most once per key and tenant (the ``api-key`` header): its status,
+headers and body are stored, and retries get the stored response replayed
+without running the handler. A duplicate arriving while the first request
+is still running waits for it instead of starting a second execution.
+
+Reusing a key for a different request (method, path, query or body) is
+rejected with 422. Responses that mean "not processed" (5xx, 401, 403, 429)
+are not stored, so the client can retry them under the same key.
+
+The store is in memory and per worker process; ``track_usage`` keeps its
+own database-backed idempotency check as the durable guarantee.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from api.core import metrics
+from api.core.config import settings
+
+MUTATING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+NOT_PROCESSED = frozenset({401, 403, 429})
+REPLAY_HEADER = (b"idempotent-replayed", b"true")
+
+StoreKey = Tuple[str, str]
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    expires_at: float
+
+
+class IdempotencyStore:
+    """
+    Bounded in-memory response store with a fixed TTL.
+
+    Entries are kept in insertion order, which with a fixed TTL is also
+    expiry order, so expired and excess entries are always at the front.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 24 * 3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[StoreKey, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: StoreKey) -> Optional[StoredResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            return entry
+
+    def put(self, key: StoreKey, fingerprint: str, status: int,
+            headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        now = self._clock()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = StoredResponse(fingerprint, status, headers, body, now + self.ttl)
+            while self._entries:
+                oldest = next(iter(self._entries.values()))
+                if len(self._entries) <= self.max_entries and oldest.expires_at > now:
+                    break
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware replaying stored responses for repeated keys"""
+
+    def __init__(self, app, store: Optional[IdempotencyStore] = None,
+                 wait_timeout: Optional[float] = None, max_body_bytes: int = 1024 * 1024):
+        self.app = app
+        self.store = store or IdempotencyStore(settings.IDEMPOTENCY_MAX_KEYS, settings.IDEMPOTENCY_TTL_SECONDS)
+        self.wait_timeout = settings.IDEMPOTENCY_WAIT_SECONDS if wait_timeout is None else wait_timeout
+        self.max_body_bytes = max_body_bytes
+        self._in_flight: Dict[StoreKey, asyncio.Event] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = _header(scope, b"idempotency-key")
+        api_key = _header(scope, b"api-key")
+        if not idempotency_key or not api_key:
+            await self.app(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        key = (hashlib.sha256(api_key.encode()).hexdigest(), idempotency_key)
+        fingerprint = hashlib.sha256(
+            b"\0".join((scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body))
+        ).hexdigest()
+
+        while True:
+            stored = self.store.get(key)
+            if stored is not None:
+                await self._replay(stored, fingerprint, scope, receive, send)
+                return
+            pending = self._in_flight.get(key)
+            if pending is None:
+                break
+            try:
+                await asyncio.wait_for(pending.wait(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                response = JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is still in progress"}, status_code=409
+                )
+                await response(scope, receive, send)
+                return
+
+        done = asyncio.Event()
+        self._in_flight[key] = done
+        try:
+            await self._execute(key, fingerprint, body, scope, receive, send)
+        finally:
+            del self._in_flight[key]
+            done.set()
+
+    async def _execute(self, key, fingerprint, body, scope, receive, send):
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start = {}
+        chunks = []
+        size = 0
+
+        async def capture_send(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= self.max_body_bytes:
+                    chunks.append(chunk)
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_send)
+
+        status = start.get("status", 500)
+        if status < 500 and status not in NOT_PROCESSED and size <= self.max_body_bytes:
+            self.store.put(key, fingerprint, status, list(start.get("headers", [])), b"".join(chunks))
+
+    async def _replay(self, stored: StoredResponse, fingerprint, scope, receive, send):
+        if stored.fingerprint != fingerprint:
+            response = JSONResponse(
+                {"detail": "Idempotency-Key was already used for a different request"}, status_code=422
+            )
+            await response(scope, receive, send)
+            return
+        metrics.IDEMPOTENT_REPLAYS.inc()
+        await send({
+            "type": "http.response.start",
+            "status": stored.status,
+            "headers": stored.headers + [REPLAY_HEADER],
+        })
+        await send({"type": "http.response.body", "body": stored.body})
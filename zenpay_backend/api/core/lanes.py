@@ -0,0 +1,157 @@
+# zenpay_backend/core/lanes.py
+"""
+Executor lanes: dedicated thread pools for classes of routes.
+
+Sync route handlers normally share Starlette's single default threadpool, so
+a burst of slow Stripe-backed or reporting calls can leave ``/usage/track``
+waiting for a thread. Decorating a handler with ``in_lane(name)`` runs it on
+that lane's own pool instead:
+
+    @router.post("/track")
+    @in_lane("ingest")
+    def record_usage(...):
+        ...
+
+Each lane has a thread count and a queue limit; once ``queue_limit`` calls
+are waiting for a thread, further calls are rejected with 503 instead of
+piling up. Dependencies (auth, DB session) still resolve on the default
+pool, which only does short work once handlers are moved off it.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from fastapi import HTTPException
+
+from api.core import metrics
+from api.core.config import settings
+
+INGEST = "ingest"
+STRIPE = "stripe"
+REPORTING = "reporting"
+
+
+class LaneFullError(Exception):
+    """Raised when a lane's queue is at its limit"""
+
+
+class Lane:
+    def __init__(self, name: str, threads: int, queue_limit: int):
+        self.name = name
+        self.threads = threads
+        self.queue_limit = queue_limit
+        self.queued = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"lane-{name}")
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run ``fn`` on this lane's pool, keeping the caller's contextvars"""
+        with self._lock:
+            if self.queued >= self.queue_limit:
+                metrics.LANE_REJECTED.inc(self.name)
+                raise LaneFullError(self.name)
+            self.queued += 1
+        metrics.LANE_QUEUE_DEPTH.inc(self.name)
+
+        submitted = time.perf_counter()
+        context = contextvars.copy_context()
+        started = threading.Event()
+
+        def call():
+            started.set()
+            self._started(submitted)
+            try:
+                return context.run(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                metrics.LANE_ACTIVE.dec(self.name)
+
+        try:
+            future = self._executor.submit(call)
+        except BaseException:
+            self._dequeue()
+            raise
+
+        def dequeue_if_cancelled(done):
+            # A caller cancelled while still queued: ``call`` never runs to dequeue
+            if done.cancelled() and not started.is_set():
+                self._dequeue()
+
+        future.add_done_callback(dequeue_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _started(self, submitted: float) -> None:
+        self._dequeue()
+        with self._lock:
+            self.active += 1
+        metrics.LANE_ACTIVE.inc(self.name)
+        metrics.LANE_WAIT.observe(time.perf_counter() - submitted, self.name)
+
+    def _dequeue(self) -> None:
+        with self._lock:
+            self.queued -= 1
+        metrics.LANE_QUEUE_DEPTH.dec(self.name)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+_lanes: Dict[str, Lane] = {}
+_lanes_lock = threading.Lock()
+
+
+def lane_config() -> Dict[str, tuple]:
+    return {
+        INGEST: (settings.LANE_INGEST_THREADS, settings.LANE_INGEST_QUEUE),
+        STRIPE: (settings.LANE_STRIPE_THREADS, settings.LANE_STRIPE_QUEUE),
+        REPORTING: (settings.LANE_REPORTING_THREADS, settings.LANE_REPORTING_QUEUE),
+    }
+
+
+def get_lane(name: str) -> Lane:
+    lane = _lanes.get(name)
+    if lane is None:
+        with _lanes_lock:
+            lane = _lanes.get(name)
+            if lane is None:
+                threads, queue_limit = lane_config()[name]
+                lane = _lanes[name] = Lane(name, threads, queue_limit)
+    return lane
+
+
+def shutdown_lanes() -> None:
+    """Stop all lane pools; called when the app shuts down"""
+    with _lanes_lock:
+        lanes = list(_lanes.values())
+        _lanes.clear()
+    for lane in lanes:
+        lane.shutdown()
+
+
+def in_lane(name: str):
+    """Run a sync route handler on the named lane instead of the default pool"""
+    if name not in lane_config():
+        raise ValueError(f"Unknown executor lane: {name}")
+
+    def decorator(fn: Callable):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await get_lane(name).run(fn, *args, **kwargs)
+            except LaneFullError:
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Server busy ({name} lane full), retry shortly",
+                    headers={"Retry-After": "1"},
+                )
+
+        wrapper.lane = name  # read by load shedding before routing
+        return wrapper
+
+    return decorator
@@ -0,0 +1,143 @@
+# zenpay_backend/core/load_shedding.py
+"""
+Admission control for overload.
+
+Under a spike every queued request eventually times out. This middleware
+instead rejects low-priority requests up front with 503 and ``Retry-After``
+while the capacity they need is overloaded, so the requests that are
+admitted (and ``/usage/track`` and ``/health``, which are never shed) still
+finish within their latency budget.
+
+Overload is judged per executor lane (see api.core.lanes), so a flood of
+reporting calls does not shed ingest traffic or the other way round. Before
+routing, the middleware finds the lane of the route a request will hit
+(routes without one run on the default threadpool) and sheds it when:
+
+* for a lane, its queue is over ``SHED_LANE_QUEUE_FRACTION`` of its limit;
+* for the default threadpool, more than ``SHED_MAX_IN_FLIGHT`` requests are
+  in progress on it;
+* the moving average latency of requests recently admitted to the same lane
+  exceeds ``SHED_LATENCY_SLO_MS`` (samples older than
+  ``SHED_LATENCY_WINDOW_SECONDS`` are ignored, so the signal clears once
+  traffic stops).
+"""
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+from api.core import lanes, metrics
+from api.core.config import settings
+
+EWMA_ALPHA = 0.2
+DEFAULT_POOL = "default"  # routes not assigned to a lane
+
+
+def route_lane(scope) -> str:
+    """Lane of the route ``scope`` will be routed to, or ``DEFAULT_POOL``"""
+    router = getattr(scope.get("app"), "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match is Match.FULL:
+            return getattr(getattr(route, "endpoint", None), "lane", DEFAULT_POOL)
+    return DEFAULT_POOL
+
+
+class LatencyTracker:
+    """Exponentially weighted moving average of recent request latency"""
+
+    def __init__(self, window: float, clock=time.monotonic):
+        self.window = window
+        self._clock = clock
+        self._average = 0.0
+        self._updated = float("-inf")
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            now = self._clock()
+            if now - self._updated > self.window:
+                self._average = seconds
+            else:
+                self._average += EWMA_ALPHA * (seconds - self._average)
+            self._updated = now
+
+    def recent(self) -> float:
+        """Average latency in seconds, or 0 if nothing finished recently"""
+        if self._clock() - self._updated > self.window:
+            return 0.0
+        return self._average
+
+
+class LoadSheddingMiddleware:
+    """Pure ASGI middleware rejecting non-exempt requests to overloaded lanes"""
+
+    def __init__(
+        self,
+        app,
+        max_in_flight: Optional[int] = None,
+        lane_queue_fraction: Optional[float] = None,
+        latency_slo_ms: Optional[float] = None,
+        exempt_paths: Optional[Iterable[str]] = None,
+        retry_after: Optional[int] = None,
+        clock=time.monotonic,
+    ):
+        self.app = app
+        self.max_in_flight = settings.SHED_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.lane_queue_fraction = (
+            settings.SHED_LANE_QUEUE_FRACTION if lane_queue_fraction is None else lane_queue_fraction
+        )
+        self.latency_slo = (settings.SHED_LATENCY_SLO_MS if latency_slo_ms is None else latency_slo_ms) / 1000
+        self.exempt_paths = frozenset(settings.SHED_EXEMPT_PATHS if exempt_paths is None else exempt_paths)
+        self.retry_after = str(settings.SHED_RETRY_AFTER_SECONDS if retry_after is None else retry_after)
+        # Per lane; touched on the event loop thread only, so no lock
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.latency: Dict[str, LatencyTracker] = {}
+        self._clock = clock
+
+    def lane_latency(self, lane: str) -> LatencyTracker:
+        tracker = self.latency.get(lane)
+        if tracker is None:
+            tracker = self.latency[lane] = LatencyTracker(settings.SHED_LATENCY_WINDOW_SECONDS, self._clock)
+        return tracker
+
+    def overload_reason(self, lane: str) -> Optional[str]:
+        if lane == DEFAULT_POOL:
+            if self.max_in_flight and self.in_flight[lane] >= self.max_in_flight:
+                return "in_flight"
+        elif self.lane_queue_fraction:
+            pool = lanes.get_lane(lane)
+            if pool.queued and pool.queued >= self.lane_queue_fraction * pool.queue_limit:
+                return "lane_queue"
+        if self.latency_slo and self.lane_latency(lane).recent() > self.latency_slo:
+            return "latency"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        lane = route_lane(scope)
+        if scope["path"].rstrip("/") not in self.exempt_paths:
+            reason = self.overload_reason(lane)
+            if reason is not None:
+                metrics.SHED_REQUESTS.inc(lane, reason)
+                response = JSONResponse(
+                    {"detail": "Server overloaded, retry shortly"},
+                    status_code=503,
+                    headers={"Retry-After": self.retry_after},
+                )
+                await response(scope, receive, send)
+                return
+
+        self.in_flight[lane] += 1
+        started = self._clock()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight[lane] -= 1
+            self.lane_latency(lane).observe(self._clock() - started)
@@ -0,0 +1,285 @@
+# zenpay_backend/core/metrics.py
+"""
+Prometheus-style metrics with per-thread sharded storage.
+
+Every metric keeps one shard per thread that touches it, so the hot path
+(``inc``/``observe``) only ever writes to thread-owned dicts and never takes
+a lock. Shards are merged when ``/metrics`` is scraped.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+from fastapi import Request
+
+from api.db.profiling import query_stats_scope
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def _snapshots(self) -> List[dict]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [dict(shard) for shard in shards]
+
+    def _format_labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return sum(shard.get(labels, 0) for shard in self._snapshots())
+
+    def _totals(self) -> Dict[LabelValues, float]:
+        totals: Dict[LabelValues, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def _render_samples(self) -> List[str]:
+        return [f"{self.name}{self._format_labels(k)} {v}" for k, v in sorted(self._totals().items())]
+
+
+class Gauge(Counter):
+    """A counter that may also go down; used for in-flight request counts"""
+    type_name = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # [per-bucket counts..., +Inf count, sum]
+            entry = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def count(self, *labels: str) -> int:
+        return sum(sum(shard[labels][:-1]) for shard in self._snapshots() if labels in shard)
+
+    def _render_samples(self) -> List[str]:
+        merged: Dict[LabelValues, list] = {}
+        for shard in self._snapshots():
+            for labels, entry in shard.items():
+                entry = list(entry)
+                total = merged.get(labels)
+                merged[labels] = entry if total is None else [a + b for a, b in zip(total, entry)]
+
+        lines = []
+        for labels, entry in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = self._format_labels(labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(labels)} {entry[-1]}")
+            lines.append(f"{self.name}_count{self._format_labels(labels)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -- metric definitions -----------------------------------------------------
+
+HTTP_REQUESTS = Counter("zenpay_http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("zenpay_http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("zenpay_http_requests_in_flight", "HTTP requests currently being handled", ("route",))
+
+DB_QUERIES = Histogram(
+    "zenpay_db_queries_per_request", "Database statements executed per request", ("route",), QUERY_COUNT_BUCKETS
+)
+DB_TIME = Histogram("zenpay_db_time_per_request_seconds", "Time spent in the database per request", ("route",))
+
+STRIPE_REQUESTS = Counter("zenpay_stripe_requests_total", "Stripe API calls", ("operation",))
+STRIPE_ERRORS = Counter("zenpay_stripe_errors_total", "Stripe API calls that failed", ("operation",))
+STRIPE_LATENCY = Histogram("zenpay_stripe_request_duration_seconds", "Stripe API call latency", ("operation",))
+
+LANE_QUEUE_DEPTH = Gauge("zenpay_lane_queue_depth", "Calls waiting for a thread in an executor lane", ("lane",))
+LANE_ACTIVE = Gauge("zenpay_lane_active", "Calls running in an executor lane", ("lane",))
+LANE_WAIT = Histogram("zenpay_lane_wait_seconds", "Time calls waited for an executor lane thread", ("lane",))
+LANE_REJECTED = Counter("zenpay_lane_rejected_total", "Calls rejected because the lane queue was full", ("lane",))
+SHED_REQUESTS = Counter("zenpay_shed_requests_total", "Requests rejected by load shedding", ("lane", "reason"))
+
+CREDIT_DEBITS = Counter("zenpay_credit_debits_total", "Credit debit transactions written")
+CREDIT_DEBIT_AMOUNT = Counter("zenpay_credit_debit_amount_total", "Sum of credits debited")
+USAGE_EVENTS = Counter("zenpay_usage_events_total", "Usage events ingested")
+IDEMPOTENT_REPLAYS = Counter("zenpay_idempotent_replays_total", "Mutating requests answered from the idempotency store")
+
+
+# -- HTTP middleware ------------------------------------------------------------
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    # Newer FastAPI keeps the router prefix on the effective route context
+    effective = scope.get("fastapi", {}).get("effective_route_context")
+    return getattr(effective, "path", None) or getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, status and DB load per route.
+
+    DB statement counts come from the per-request ``QueryStats`` scope that
+    engines hooked with ``api.db.profiling.profile_engine`` report into.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with query_stats_scope() as stats:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - started
+                route = route_label(scope)
+                method = scope["method"]
+                HTTP_REQUESTS.inc(method, route, str(status_holder[0]))
+                HTTP_LATENCY.observe(elapsed, method, route)
+                DB_QUERIES.observe(stats.queries, route)
+                DB_TIME.observe(stats.seconds, route)
+
+
+async def track_in_flight(request: Request):
+    """
+    App-level dependency maintaining the per-route in-flight gauge.
+
+    Middleware runs before routing, so it cannot know the route a request will
+    hit; dependencies run after, with the matched route already in scope.
+    """
+    route = route_label(request.scope)
+    HTTP_IN_FLIGHT.inc(route)
+    try:
+        yield
+    finally:
+        HTTP_IN_FLIGHT.dec(route)
+
+
+# -- Stripe client instrumentation ----------------------------------------------
+
+# ``cus_NffrFeUfNV2Hib``, ``si_123``, ``cs_test_a1B2``. Resource names such as
+# ``meter_events`` share the shape, but a random ID part always has a digit
+# or an uppercase letter.
+_STRIPE_ID = re.compile(r"^[a-z]+(?:_test|_live)?_(?=[A-Za-z0-9]*[A-Z0-9])[A-Za-z0-9]+$")
+
+
+def stripe_operation(method: str, url: str) -> str:
+    """``POST https://api.stripe.com/v1/customers/cus_123`` -> ``POST /v1/customers/{id}``"""
+    path = url.split("://", 1)[-1].split("/", 1)[-1].split("?", 1)[0]
+    parts = ["{id}" if _STRIPE_ID.match(p) else p for p in path.split("/")]
+    return f"{method.upper()} /" + "/".join(parts)
+
+
+def instrument_stripe() -> None:
+    """Wrap Stripe's shared HTTP client so every API call is timed"""
+    import stripe
+
+    client = stripe.default_http_client
+    if client is None:
+        client = stripe.default_http_client = stripe.new_default_http_client()
+    if getattr(client, "_zenpay_instrumented", False):
+        return
+
+    original = client.request_with_retries
+
+    def request_with_retries(method, url, *args, **kwargs):
+        operation = stripe_operation(method, url)
+        started = time.perf_counter()
+        try:
+            response = original(method, url, *args, **kwargs)
+        except Exception:
+            STRIPE_ERRORS.inc(operation)
+            raise
+        finally:
+            STRIPE_REQUESTS.inc(operation)
+            STRIPE_LATENCY.observe(time.perf_counter() - started, operation)
+        if response[1] >= 400:
+            STRIPE_ERRORS.inc(operation)
+        return response
+
+    client.request_with_retries = request_with_retries
+    client._zenpay_instrumented = True
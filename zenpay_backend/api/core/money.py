@@ -0,0 +1,35 @@
+# zenpay_backend/core/money.py
+"""
+Money as integer micro-units (millionths of a dollar).
+
+Prices, credit transactions and rated usage are stored as integers, so sums
+over millions of small debits are exact and sub-cent unit prices such as
+$0.0001 are representable. The API keeps taking and returning dollars;
+conversion happens at the model attributes (``price_per_unit``,
+``amount``, ``cost``) and at the Stripe boundary.
+"""
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Optional
+
+MICROS = 1_000_000
+_CENT_MICROS = MICROS // 100
+
+
+def to_micros(amount) -> Optional[int]:
+    """Dollars (float, int, Decimal or str) to micro-units, rounded half to even"""
+    if amount is None:
+        return None
+    return int((Decimal(str(amount)) * MICROS).to_integral_value(ROUND_HALF_EVEN))
+
+
+def from_micros(micros: Optional[int]) -> Optional[float]:
+    if micros is None:
+        return None
+    return micros / MICROS
+
+
+def stripe_decimal_cents(micros: int) -> str:
+    """Micro-units as a Stripe ``*_decimal`` amount in cents, e.g. 100 -> "0.01" """
+    cents = Decimal(micros) / _CENT_MICROS
+    text = format(cents, "f")
+    return text.rstrip("0").rstrip(".") if "." in text else text
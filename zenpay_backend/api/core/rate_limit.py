@@ -0,0 +1,114 @@
+# zenpay_backend/core/rate_limit.py
+"""
+In-process per-tenant request limits.
+
+Each API key gets a token bucket (sustained rate plus burst) and each tenant
+a cap on concurrently running requests, so one tenant's backfill cannot
+occupy the whole threadpool and database pool. Both checks are non-blocking:
+a request over either limit is rejected with 429 rather than queued.
+
+State is per worker process, so with N workers a tenant can get up to N
+times the configured rate in total.
+"""
+import math
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "lock")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.lock = threading.Lock()
+
+    def acquire(self, now: float) -> float:
+        """Take one token; return 0 on success, else seconds until one is available"""
+        with self.lock:
+            tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if tokens >= 1:
+                self.tokens = tokens - 1
+                return 0.0
+            self.tokens = tokens
+            return (1 - tokens) / self.rate
+
+
+class ConcurrencyLimit:
+    __slots__ = ("limit", "active", "lock")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self) -> None:
+        with self.lock:
+            self.active -= 1
+
+
+class TenantLimiter:
+    """
+    Token buckets per API key and concurrency limits per tenant.
+
+    Limits are passed on every call so per-user overrides take effect without
+    a restart; a rate of 0 or a concurrency of 0 means unlimited.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._slots: Dict[str, ConcurrencyLimit] = {}
+
+    def acquire_rate(self, api_key: str, rate: float, burst: int) -> float:
+        """Return 0 if the request may proceed, else the Retry-After delay in seconds"""
+        if rate <= 0:
+            return 0.0
+        capacity = float(max(burst, 1))
+        now = self._clock()
+        bucket = self._buckets.get(api_key)
+        if bucket is None:
+            bucket = self._buckets.setdefault(api_key, TokenBucket(rate, capacity, now))
+        elif bucket.rate != rate or bucket.capacity != capacity:
+            bucket.rate, bucket.capacity = rate, capacity
+        return bucket.acquire(now)
+
+    def acquire_slot(self, tenant: str, limit: int) -> Optional[ConcurrencyLimit]:
+        """
+        Claim a concurrency slot. Returns the limit to release afterwards, or
+        None if the tenant is at its limit. Unlimited tenants get a shared
+        no-op slot.
+        """
+        if limit <= 0:
+            return _UNLIMITED
+        slots = self._slots.get(tenant)
+        if slots is None:
+            slots = self._slots.setdefault(tenant, ConcurrencyLimit(limit))
+        elif slots.limit != limit:
+            slots.limit = limit
+        return slots if slots.try_acquire() else None
+
+
+class _Unlimited:
+    __slots__ = ()
+
+    def release(self) -> None:
+        pass
+
+
+_UNLIMITED = _Unlimited()
+
+
+def retry_after_header(delay: float) -> str:
+    return str(max(1, math.ceil(delay)))
@@ -0,0 +1,54 @@
+# zenpay_backend/core/serialization.py
+"""
+Fast JSON path for list endpoints.
+
+Returning ORM objects from a route makes FastAPI build and validate a
+Pydantic model per row against ``response_model`` before encoding. List
+endpoints instead select the needed columns as tuples, zip them into dicts
+with the response field names and return a ``FastJSONResponse``, which
+FastAPI sends as-is. ``response_model`` stays on the route for the OpenAPI
+schema; the field lists here must produce the same JSON keys.
+
+orjson is used when installed, otherwise the stdlib encoder.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, List, Sequence
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_to_dicts(rows: Iterable[Sequence], fields: Sequence[str]) -> List[dict]:
+    """Zip result tuples with the response field names"""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def rows_response(rows: Iterable[Sequence], fields: Sequence[str]) -> FastJSONResponse:
+    return FastJSONResponse(rows_to_dicts(rows, fields))
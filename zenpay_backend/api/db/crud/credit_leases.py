@@ -0,0 +1,204 @@
+# zenpay_backend/db/crud/credit_leases.py
+"""
+Credit leases: a block of a customer's credits set aside for a short time.
+
+Taking a lease debits the whole amount from the ledger in one
+``CreditTransaction``, so the balance other callers see already excludes it.
+Usage tracked against the lease then only moves the lease's ``used_micros``
+counter, with a single conditional UPDATE of the lease row; there is no
+ledger SUM and no ledger row per event. Settling the lease (on release, or
+once expired, by ``python -m api.services.credit_leases``) credits the
+unused rest back as one more ``CreditTransaction``.
+
+The counter lives in the database rather than in process memory, so a lease
+taken through one worker can be charged through any other and nothing is
+lost when a worker restarts.
+"""
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import CreditLease, CreditTransaction, Customer
+from .credits import get_credit_balance_micros
+from .versions import bump_credits_version
+from core.exceptions import (
+    CreditLeaseExpiredError, CreditLeaseNotFoundError, CustomerNotFoundError, InsufficientCreditsError,
+)
+from api.core.money import from_micros, to_micros
+
+
+def create_credit_lease(
+    db: Session,
+    user_id: str,
+    customer_id: str,
+    amount: float,
+    ttl_seconds: float,
+    now: Optional[datetime] = None,
+) -> CreditLease:
+    """
+    Set ``amount`` of the customer's credits aside for ``ttl_seconds``.
+    The customer's expired leases are settled first, so their rest counts
+    towards the balance.
+    """
+    now = now or datetime.utcnow()
+    customer = (
+        db.query(Customer)
+        .filter(Customer.user_id == user_id, Customer.id == customer_id)
+        .first()
+    )
+    if not customer:
+        raise CustomerNotFoundError(f"Customer {customer_id} not found")
+
+    settle_expired_credit_leases(db, now, user_id=user_id, customer_id=customer_id)
+    amount_micros = to_micros(amount)
+    balance = get_credit_balance_micros(db, user_id, customer_id)
+    if balance < amount_micros:
+        db.commit()  # keep the settlements
+        raise InsufficientCreditsError(f"Insufficient credits: balance {from_micros(balance)}, requested {amount}")
+
+    lease = CreditLease(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        customer_id=customer_id,
+        amount_micros=amount_micros,
+        used_micros=0,
+        created_at=now,
+        expires_at=now + timedelta(seconds=ttl_seconds),
+    )
+    db.add(lease)
+    db.add(CreditTransaction(
+        user_id=user_id,
+        customer_id=customer_id,
+        amount_micros=-amount_micros,
+        timestamp=now,
+        description=f"Credit lease {lease.id}",
+        type="lease",
+    ))
+    bump_credits_version(db, user_id, customer_id)
+    db.commit()
+    db.refresh(lease)
+    return lease
+
+
+def get_credit_lease(db: Session, user_id: str, lease_id: str) -> Optional[CreditLease]:
+    return db.query(CreditLease).filter(CreditLease.user_id == user_id, CreditLease.id == lease_id).first()
+
+
+def get_lease_usage(
+    db: Session,
+    user_id: str,
+    start: datetime,
+    end: datetime,
+    customer_id: Optional[str] = None,
+) -> List[tuple]:
+    """``(customer_id, used_micros)`` summed per customer over leases taken in ``[start, end)``"""
+    query = db.query(CreditLease.customer_id, func.sum(CreditLease.used_micros)).filter(
+        CreditLease.user_id == user_id,
+        CreditLease.created_at >= start,
+        CreditLease.created_at < end,
+    )
+    if customer_id:
+        query = query.filter(CreditLease.customer_id == customer_id)
+    return query.group_by(CreditLease.customer_id).all()
+
+
+def charge_credit_lease(
+    db: Session,
+    user_id: str,
+    lease_id: str,
+    customer_id: str,
+    cost_micros: int,
+    now: Optional[datetime] = None,
+) -> None:
+    """
+    Count ``cost_micros`` against an open lease of the customer; the caller
+    commits. A negative cost (volume tier refund) gives room back.
+    """
+    now = now or datetime.utcnow()
+    charged = (
+        db.query(CreditLease)
+        .filter(
+            CreditLease.id == lease_id,
+            CreditLease.user_id == user_id,
+            CreditLease.customer_id == customer_id,
+            CreditLease.settled_at.is_(None),
+            CreditLease.expires_at > now,
+            CreditLease.used_micros + cost_micros <= CreditLease.amount_micros,
+        )
+        .update({CreditLease.used_micros: CreditLease.used_micros + cost_micros}, synchronize_session=False)
+    )
+    if charged:
+        return
+
+    # Only failed charges pay for finding out why
+    lease = get_credit_lease(db, user_id, lease_id)
+    if lease is None or lease.customer_id != customer_id:
+        raise CreditLeaseNotFoundError(f"Credit lease {lease_id} not found")
+    if lease.settled_at is not None or lease.expires_at <= now:
+        raise CreditLeaseExpiredError(f"Credit lease {lease_id} has expired")
+    raise InsufficientCreditsError(
+        f"Insufficient credits: lease remaining {lease.remaining}, required {from_micros(cost_micros)}"
+    )
+
+
+def _settle(db: Session, lease_id: str, now: datetime) -> bool:
+    """Close the lease and credit back its rest; False if it was already settled"""
+    closed = (
+        db.query(CreditLease)
+        .filter(CreditLease.id == lease_id, CreditLease.settled_at.is_(None))
+        .update({CreditLease.settled_at: now}, synchronize_session=False)
+    )
+    if not closed:
+        return False
+    # Read after the UPDATE, so no charge can land in between
+    user_id, customer_id, amount_micros, used_micros = (
+        db.query(CreditLease.user_id, CreditLease.customer_id, CreditLease.amount_micros, CreditLease.used_micros)
+        .filter(CreditLease.id == lease_id)
+        .one()
+    )
+    if amount_micros != used_micros:
+        db.add(CreditTransaction(
+            user_id=user_id,
+            customer_id=customer_id,
+            amount_micros=amount_micros - used_micros,
+            timestamp=now,
+            description=f"Credit lease {lease_id} settled",
+            type="lease_settlement",
+        ))
+        bump_credits_version(db, user_id, customer_id)
+        db.flush()  # counted by balance reads in the same transaction
+    return True
+
+
+def release_credit_lease(db: Session, user_id: str, lease_id: str, now: Optional[datetime] = None) -> CreditLease:
+    """Settle a lease before it expires; releasing a settled lease changes nothing"""
+    lease = get_credit_lease(db, user_id, lease_id)
+    if lease is None:
+        raise CreditLeaseNotFoundError(f"Credit lease {lease_id} not found")
+    _settle(db, lease_id, now or datetime.utcnow())
+    db.commit()
+    db.refresh(lease)
+    return lease
+
+
+def settle_expired_credit_leases(
+    db: Session,
+    now: Optional[datetime] = None,
+    user_id: Optional[str] = None,
+    customer_id: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> int:
+    """Settle leases that expired unreleased and return how many; the caller commits"""
+    now = now or datetime.utcnow()
+    query = db.query(CreditLease.id).filter(CreditLease.settled_at.is_(None), CreditLease.expires_at <= now)
+    if user_id:
+        query = query.filter(CreditLease.user_id == user_id)
+    if customer_id:
+        query = query.filter(CreditLease.customer_id == customer_id)
+    if limit is not None:
+        query = query.order_by(CreditLease.expires_at).limit(limit)
+    lease_ids: List[str] = [lease_id for lease_id, in query]
+    return sum(_settle(db, lease_id, now) for lease_id in lease_ids)
@@ -1,14 +1,19 @@
 # zenpay_backend/db/crud/credits.py
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional, List
+from sqlalchemy import func, insert
+from datetime import datetime
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
 from fastapi import APIRouter, Depends
 from models.request import CreditTopUpRequest
 from models.response import CreditTopUpResponse
 from ..models import CreditTransaction, Customer, User
+from .versions import bump_credits_version
 from core.exceptions import CustomerNotFoundError
 from api.dependencies import get_current_user_by_api_key as get_current_user
 from api.db.session import get_db
+from api.core import metrics
+from api.core.money import from_micros, to_micros
 
 
 def add_credits(
@@ -39,12 +44,61 @@ def add_credits(
     )
 
     db.add(transaction)
+    bump_credits_version(db, user_id, customer_id)
     db.commit()
     db.refresh(transaction)
 
     return transaction
 
 
+# IDs per IN list: SQLite binds at most 32766 parameters per statement
+IN_CHUNK_SIZE = 10000
+
+
+def grant_credits(
+    db: Session,
+    user_id: str,
+    customer_ids: List[str],
+    amount: float,
+    description: Optional[str] = None,
+) -> int:
+    """
+    Add the same amount of credits to many customers in one transaction and
+    return how many were credited; repeated IDs are credited once. Raises
+    CustomerNotFoundError, and writes nothing, if any ID is not the user's
+    customer.
+    """
+    customer_ids = list(dict.fromkeys(customer_ids))
+    chunks = [customer_ids[i:i + IN_CHUNK_SIZE] for i in range(0, len(customer_ids), IN_CHUNK_SIZE)]
+
+    found = set()
+    for chunk in chunks:
+        found.update(
+            customer_id for customer_id, in db.query(Customer.id).filter(
+                Customer.user_id == user_id, Customer.id.in_(chunk)
+            )
+        )
+    if len(found) < len(customer_ids):
+        missing = [customer_id for customer_id in customer_ids if customer_id not in found]
+        raise CustomerNotFoundError(f"{len(missing)} customers not found: {', '.join(missing[:20])}")
+
+    amount_micros = to_micros(amount)
+    now = datetime.utcnow()
+    description = description or "Credit grant"
+    db.execute(insert(CreditTransaction.__table__), [
+        dict(id=str(uuid.uuid4()), user_id=user_id, customer_id=customer_id, amount_micros=amount_micros,
+             timestamp=now, description=description, type="grant")
+        for customer_id in customer_ids
+    ])
+    # Balance ETags of every credited customer change with the grant
+    for chunk in chunks:
+        db.query(Customer).filter(Customer.user_id == user_id, Customer.id.in_(chunk)).update(
+            {Customer.credits_version: Customer.credits_version + 1}, synchronize_session=False
+        )
+    db.commit()
+    return len(customer_ids)
+
+
 def use_credits(
     db: Session,
     user_id: str,
@@ -63,10 +117,11 @@ def use_credits(
     if not customer:
         raise CustomerNotFoundError(f"Customer {customer_id} not found")
 
-    # Check if sufficient credits are available
-    balance = get_credit_balance(db, user_id, customer_id)
-    if balance < amount:
-        raise ValueError(f"Insufficient credits: balance {balance}, requested {amount}")
+    # Check if sufficient credits are available; compared in micro-units so
+    # a balance of exactly the amount is never short by a rounding error
+    balance = get_credit_balance_micros(db, user_id, customer_id)
+    if balance < to_micros(amount):
+        raise ValueError(f"Insufficient credits: balance {from_micros(balance)}, requested {amount}")
 
     # Create credit transaction (negative = deduction)
     transaction = CreditTransaction(
@@ -78,17 +133,21 @@ def use_credits(
     )
 
     db.add(transaction)
+    bump_credits_version(db, user_id, customer_id)
     db.commit()
     db.refresh(transaction)
 
+    if amount > 0:
+        metrics.CREDIT_DEBITS.inc()
+        metrics.CREDIT_DEBIT_AMOUNT.inc(amount=amount)
+
     return transaction
 
 
-def get_credit_balance(db: Session, user_id: str, customer_id: str) -> float:
-    """Get current credit balance for a customer"""
-    # Sum all transactions for this customer
+def get_credit_balance_micros(db: Session, user_id: str, customer_id: str) -> int:
+    """Current credit balance of a customer in micro-units; an exact integer SUM"""
     balance = (
-        db.query(func.sum(CreditTransaction.amount))
+        db.query(func.sum(CreditTransaction.amount_micros))
         .filter(
             CreditTransaction.user_id == user_id,
             CreditTransaction.customer_id == customer_id,
@@ -96,7 +155,88 @@ def get_credit_balance(db: Session, user_id: str, customer_id: str) -> float:
         .scalar()
     )
 
-    return float(balance or 0)
+    return int(balance or 0)
+
+
+def _customer_balances_query(db: Session, user_id: str):
+    """``(customer_id, balance_micros)`` of the user's customers, grouped per customer"""
+    return (
+        db.query(Customer.id, func.coalesce(func.sum(CreditTransaction.amount_micros), 0))
+        .outerjoin(
+            CreditTransaction,
+            (CreditTransaction.customer_id == Customer.id) & (CreditTransaction.user_id == user_id),
+        )
+        .filter(Customer.user_id == user_id)
+        .group_by(Customer.id)
+    )
+
+
+def get_credit_balances_micros(db: Session, user_id: str, customer_ids: List[str]) -> Dict[str, int]:
+    """
+    Balances in micro-units of many customers, from one grouped query per
+    ``IN_CHUNK_SIZE`` IDs; IDs that are not the user's customers are left out
+    """
+    customer_ids = list(dict.fromkeys(customer_ids))
+    balances = {}
+    for i in range(0, len(customer_ids), IN_CHUNK_SIZE):
+        chunk = customer_ids[i:i + IN_CHUNK_SIZE]
+        balances.update(
+            (customer_id, int(balance))
+            for customer_id, balance in _customer_balances_query(db, user_id).filter(Customer.id.in_(chunk))
+        )
+    return balances
+
+
+def iter_credit_balances_micros(db: Session, user_id: str, page_size: int = 1000) -> Iterator[Tuple[str, int]]:
+    """
+    ``(customer_id, balance_micros)`` of every customer of the user, ordered
+    by ID; read a page of customers at a time (keyset pagination), so only
+    one page is held in memory
+    """
+    after_id = None
+    while True:
+        query = _customer_balances_query(db, user_id)
+        if after_id is not None:
+            query = query.filter(Customer.id > after_id)
+        page = query.order_by(Customer.id).limit(page_size).all()
+        for customer_id, balance in page:
+            yield customer_id, int(balance)
+        if len(page) < page_size:
+            return
+        after_id = page[-1][0]
+
+
+def get_credit_balance_changes(
+    db: Session,
+    user_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    customer_id: Optional[str] = None,
+    transaction_type: Optional[str] = None,
+) -> List[tuple]:
+    """
+    ``(customer_id, amount_micros)`` summed per customer over the user's
+    transactions (of ``transaction_type`` only, if given) in ``[start,
+    end)``; without ``start`` that is the balance as of ``end``
+    """
+    query = db.query(
+        CreditTransaction.customer_id,
+        func.sum(CreditTransaction.amount_micros),
+    ).filter(CreditTransaction.user_id == user_id)
+    if start is not None:
+        query = query.filter(CreditTransaction.timestamp >= start)
+    if end is not None:
+        query = query.filter(CreditTransaction.timestamp < end)
+    if customer_id:
+        query = query.filter(CreditTransaction.customer_id == customer_id)
+    if transaction_type:
+        query = query.filter(CreditTransaction.type == transaction_type)
+    return query.group_by(CreditTransaction.customer_id).all()
+
+
+def get_credit_balance(db: Session, user_id: str, customer_id: str) -> float:
+    """Get current credit balance for a customer"""
+    return from_micros(get_credit_balance_micros(db, user_id, customer_id))
 
 
 def get_credit_transactions(
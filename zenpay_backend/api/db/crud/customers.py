@@ -1,9 +1,11 @@
 # zenpay_backend/db/crud/customers.py
 from typing import List, Optional, Dict, Any, Union
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 import stripe
 
 from ..models import Customer, User
+from api.services.subscription_cache import subscription_cache
 
 def create_customer(
     db: Session,
@@ -111,6 +113,56 @@ def get_customers(db: Session, user_id: str, skip: int = 0, limit: int = 100) ->
         Customer.user_id == user_id
     ).offset(skip).limit(limit).all()
 
+# Keys of CustomerResponse as serialized (metadata goes out under its alias)
+CUSTOMER_FIELDS = ("id", "name", "email", "metadata_json", "created_at")
+
+def get_customer_rows(db: Session, user_id: str, skip: int = 0, limit: int = 100) -> List[tuple]:
+    """
+    Get customers for a user as plain tuples for the fast serialization path
+    """
+    return db.query(
+        Customer.id,
+        Customer.name,
+        Customer.email,
+        Customer.metadata_json,
+        Customer.created_at,
+    ).filter(
+        Customer.user_id == user_id
+    ).offset(skip).limit(limit).all()
+
+def get_stripe_customer_page(
+    db: Session, after_id: Optional[str] = None, limit: int = 500, user_id: Optional[str] = None
+) -> List[tuple]:
+    """
+    ``(id, stripe_customer_id)`` of customers linked to Stripe, ordered by ID
+    and starting after ``after_id``, for jobs that walk all customers
+    """
+    query = db.query(Customer.id, Customer.stripe_customer_id).filter(
+        Customer.stripe_customer_id.isnot(None)
+    )
+    if after_id is not None:
+        query = query.filter(Customer.id > after_id)
+    if user_id:
+        query = query.filter(Customer.user_id == user_id)
+    return query.order_by(Customer.id).limit(limit).all()
+
+def get_customer_owners(db: Session, customer_ids: List[str]) -> Dict[str, str]:
+    """``{customer_id: user_id}`` of the given IDs that exist, in one query"""
+    if not customer_ids:
+        return {}
+    rows = db.query(Customer.id, Customer.user_id).filter(Customer.id.in_(customer_ids)).all()
+    return dict(rows)
+
+def insert_customers(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """
+    Insert customers as one executemany; ``rows`` are column dicts. The
+    caller commits.
+    """
+    if rows:
+        # NULLs rendered as such, so rows with and without e.g. an email
+        # still go out as one statement
+        db.execute(insert(Customer).execution_options(render_nulls=True), rows)
+
 def delete_customer(db: Session, user_id: str, customer_id: str) -> bool:
     """
     Delete a customer
@@ -130,6 +182,7 @@ def delete_customer(db: Session, user_id: str, customer_id: str) -> bool:
 
         db.delete(customer)
         db.commit()
+        subscription_cache.invalidate_customer(user_id, customer_id)
         return True
     return False
 
@@ -146,5 +199,6 @@ def update_stripe_customer_id(db: Session, user_id: str, customer_id: str, strip
         customer.stripe_customer_id = stripe_customer_id
         db.commit()
         db.refresh(customer)
+        subscription_cache.invalidate_customer(user_id, customer_id)
     
     return customer
\ No newline at end of file
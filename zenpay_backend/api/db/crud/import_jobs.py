@@ -0,0 +1,62 @@
+# zenpay_backend/db/crud/import_jobs.py
+"""
+Bulk import jobs.
+
+The job row is the only shared state of an import: the request that
+uploads the file creates it, the background run updates its counters after
+every chunk, and any worker process can serve its status.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..models import ImportJob
+
+# Errors kept on the job; the counters still count every failure
+MAX_JOB_ERRORS = 100
+
+
+def create_import_job(db: Session, user_id: str, kind: str, total: int, errors: Optional[List[dict]] = None) -> ImportJob:
+    """A pending job; rows rejected while parsing count as processed and failed"""
+    errors = errors or []
+    job = ImportJob(
+        user_id=user_id,
+        kind=kind,
+        total=total,
+        processed=len(errors),
+        failed=len(errors),
+        errors=errors[:MAX_JOB_ERRORS],
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_import_job(db: Session, user_id: str, job_id: str) -> Optional[ImportJob]:
+    return db.query(ImportJob).filter(ImportJob.user_id == user_id, ImportJob.id == job_id).first()
+
+
+def record_import_progress(
+    db: Session,
+    job: ImportJob,
+    created: int = 0,
+    skipped: int = 0,
+    errors: Optional[List[dict]] = None,
+    status: Optional[str] = None,
+) -> None:
+    """Add one chunk's outcome to the job and commit"""
+    errors = errors or []
+    job.created += created
+    job.skipped += skipped
+    job.failed += len(errors)
+    job.processed += created + skipped + len(errors)
+    if errors and len(job.errors or []) < MAX_JOB_ERRORS:
+        # Reassigned so the JSON column is written
+        job.errors = (job.errors or []) + errors[:MAX_JOB_ERRORS - len(job.errors or [])]
+    if status is not None:
+        job.status = status
+        if status in ("completed", "failed"):
+            job.finished_at = datetime.utcnow()
+    db.commit()
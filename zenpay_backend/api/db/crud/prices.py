@@ -0,0 +1,59 @@
+# zenpay_backend/db/crud/prices.py
+"""
+Price history of products.
+
+Every price a product has had is kept as a ``ProductPrice`` row, written in
+the same transaction as the product change, so past usage can be re-rated
+offline (see ``api.services.price_index``).
+"""
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..models import Product, ProductPrice
+
+
+def record_price(db: Session, product: Product, effective_from: Optional[datetime] = None) -> ProductPrice:
+    """Add the product's current price and version to its history; the caller commits"""
+    if product.id is None:
+        db.flush()
+    price = ProductPrice(
+        product_id=product.id,
+        version=product.price_version or 1,
+        price_micros=product.price_micros,
+        tiers_mode=product.tiers_mode,
+        price_tiers=product.price_tiers,
+        stripe_price_id=product.stripe_price_id,
+        effective_from=effective_from or datetime.utcnow(),
+    )
+    db.add(price)
+    return price
+
+
+def get_price_history_rows(
+    db: Session,
+    user_id: Optional[str] = None,
+    product_ids: Optional[Iterable[str]] = None,
+) -> List[tuple]:
+    """
+    ``(product_id, effective_from, price_micros, version, tiers_mode,
+    price_tiers)`` ordered by product and time
+    """
+    query = db.query(
+        ProductPrice.product_id,
+        ProductPrice.effective_from,
+        ProductPrice.price_micros,
+        ProductPrice.version,
+        ProductPrice.tiers_mode,
+        ProductPrice.price_tiers,
+    )
+    if user_id:
+        query = query.join(Product, Product.id == ProductPrice.product_id).filter(Product.user_id == user_id)
+    if product_ids is not None:
+        query = query.filter(ProductPrice.product_id.in_(list(product_ids)))
+    return query.order_by(ProductPrice.product_id, ProductPrice.effective_from).all()
+
+
+def delete_price_history(db: Session, product_id: str) -> None:
+    db.query(ProductPrice).filter(ProductPrice.product_id == product_id).delete(synchronize_session=False)
@@ -4,7 +4,9 @@ from typing import List, Optional
 import stripe
 from fastapi import HTTPException, status
 
-from ..models import Product, User
+from ..models import Product, User, generate_uuid
+from .versions import bump_products_version
+from .prices import record_price, delete_price_history
 from core.exceptions import ProductNotFoundError
 
 def create_product(
@@ -15,9 +17,11 @@ def create_product(
     unit_name: str,
     price_per_unit: float,
     stripe_product_id: Optional[str] = None,
-    stripe_price_id: Optional[str] = None
+    stripe_price_id: Optional[str] = None,
+    tiers_mode: Optional[str] = None,
+    price_tiers: Optional[List[dict]] = None
 ) -> Product:
-    """Create a new product"""
+    """Create a new product; ``tiers_mode``/``price_tiers`` make it tiered (see api.services.pricing)"""
     # Check if product code already exists for this user
     existing = db.query(Product).filter(
         Product.user_id == user_id,
@@ -38,7 +42,9 @@ def create_product(
             price_per_unit=price_per_unit,
             product_code=code,
             event_name="zenpay_tokens",
-            quantity_payload_key="value"
+            quantity_payload_key="value",
+            tiers_mode=tiers_mode,
+            tiers=price_tiers
         )
         stripe_product_id = stripe_product.id
         stripe_price_id = stripe_price.id
@@ -50,11 +56,15 @@ def create_product(
         code=code,
         unit_name=unit_name,
         price_per_unit=price_per_unit,
+        tiers_mode=tiers_mode,
+        price_tiers=price_tiers,
         stripe_product_id=stripe_product_id,
         stripe_price_id=stripe_price_id
     )
     
     db.add(product)
+    record_price(db, product)
+    bump_products_version(db, user_id)
     db.commit()
     db.refresh(product)
     
@@ -66,9 +76,15 @@ def update_product(
     product_id: str,
     name: Optional[str] = None,
     unit_name: Optional[str] = None,
-    price_per_unit: Optional[float] = None
+    price_per_unit: Optional[float] = None,
+    tiers_mode: Optional[str] = None,
+    price_tiers: Optional[List[dict]] = None,
+    clear_tiers: bool = False
 ) -> Optional[Product]:
-    """Update a product's details in the local DB and Stripe."""
+    """
+    Update a product's details in the local DB and Stripe. Passing tiers
+    replaces the product's tiers; ``clear_tiers`` goes back to flat pricing.
+    """
     product = db.query(Product).filter(
         Product.user_id == user_id,
         Product.id == product_id
@@ -79,6 +95,7 @@ def update_product(
 
     # Store old price for comparison
     old_price = product.price_per_unit
+    old_tiers = (product.tiers_mode, product.price_tiers)
 
     # Update local database
     if name is not None:
@@ -87,23 +104,34 @@ def update_product(
         product.unit_name = unit_name
     if price_per_unit is not None:
         product.price_per_unit = price_per_unit
+    if clear_tiers:
+        product.tiers_mode, product.price_tiers = None, None
+    elif tiers_mode is not None:
+        product.tiers_mode, product.price_tiers = tiers_mode, price_tiers
+    tiers_changed = (product.tiers_mode, product.price_tiers) != old_tiers
 
     # Update Stripe product
     if product.stripe_product_id:
         if name is not None:
             stripe.Product.modify(product.stripe_product_id, name=product.name)
         
-        if price_per_unit is not None and price_per_unit != old_price:
+        if (price_per_unit is not None and price_per_unit != old_price) or tiers_changed:
             from api.services.stripe_service import update_stripe_product_price
 
             new_stripe_price = update_stripe_product_price(
                 stripe_product_id=product.stripe_product_id,
                 old_stripe_price_id=product.stripe_price_id,
-                new_price_per_unit=price_per_unit,
+                new_price_per_unit=product.price_per_unit,
+                tiers_mode=product.tiers_mode,
+                tiers=product.price_tiers,
             )
             product.stripe_price_id = new_stripe_price.id
-            product.price_per_unit = new_stripe_price.unit_amount / 100
 
+    if product.price_per_unit != old_price or tiers_changed:
+        product.price_version += 1
+        record_price(db, product)
+
+    bump_products_version(db, user_id)
     db.commit()
     db.refresh(product)
     return product
@@ -130,6 +158,62 @@ def get_products(
         Product.user_id == user_id
     ).offset(skip).limit(limit).all()
 
+def get_existing_product_codes(db: Session, user_id: str, codes: List[str]) -> set:
+    """The codes among ``codes`` the user already has products for, in one query"""
+    if not codes:
+        return set()
+    rows = db.query(Product.code).filter(Product.user_id == user_id, Product.code.in_(codes)).all()
+    return {code for code, in rows}
+
+def add_products(db: Session, user_id: str, products: List[dict]) -> List[Product]:
+    """
+    Add products (column dicts) with their price history and bump the
+    catalog version, in the caller's transaction; the caller commits
+    """
+    added = []
+    for values in products:
+        # IDs set up front, so record_price needs no flush per product
+        product = Product(id=generate_uuid(), user_id=user_id, price_version=1, **values)
+        db.add(product)
+        record_price(db, product)
+        added.append(product)
+    bump_products_version(db, user_id)
+    return added
+
+def get_products_by_ids(db: Session, user_id: str, product_ids) -> List[Product]:
+    """The user's products with the given IDs, in one query"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    return db.query(Product).filter(
+        Product.user_id == user_id,
+        Product.id.in_(product_ids)
+    ).all()
+
+# Field names of ProductResponse, in the column order of get_product_rows
+PRODUCT_FIELDS = ("id", "name", "code", "unit_name", "price_per_unit", "tiers_mode", "price_tiers", "created_at")
+
+
+def get_product_rows(
+    db: Session,
+    user_id: str,
+    skip: int = 0,
+    limit: int = 100
+) -> List[tuple]:
+    """Get products for a user as plain tuples for the fast serialization path"""
+    return db.query(
+        Product.id,
+        Product.name,
+        Product.code,
+        Product.unit_name,
+        Product.price_per_unit,
+        Product.tiers_mode,
+        Product.price_tiers,
+        Product.created_at,
+    ).filter(
+        Product.user_id == user_id
+    ).offset(skip).limit(limit).all()
+
 def delete_product(
     db: Session,
     user_id: str,
@@ -148,7 +232,9 @@ def delete_product(
             except stripe.error.InvalidRequestError:
                 # Product might have been already archived in Stripe
                 pass
+        delete_price_history(db, product.id)
         db.delete(product)
+        bump_products_version(db, user_id)
         db.commit()
         return True
     
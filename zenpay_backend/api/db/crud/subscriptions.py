@@ -1,10 +1,11 @@
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Callable, Dict, List, Optional
 import stripe
 import time
 
 from ..models import Subscription, Customer, Product
 from core.exceptions import CustomerNotFoundError, ProductNotFoundError
+from api.services.subscription_cache import CachedSubscription, subscription_cache
 
 def create_subscription(
     db: Session,
@@ -44,12 +45,16 @@ def create_subscription(
         product_id=product.id,
         stripe_subscription_id=stripe_subscription.id,
         stripe_subscription_item_id=stripe_subscription_item_id,
+        stripe_customer_id=customer.stripe_customer_id,
+        stripe_price_id=product.stripe_price_id,
         status=stripe_subscription.status
     )
     db.add(db_subscription)
     db.commit()
     db.refresh(db_subscription)
 
+    cache_subscription_rows([db_subscription])
+
     return db_subscription
 
 def get_subscription_by_customer_and_product(
@@ -80,3 +85,155 @@ def get_subscription_by_stripe_item_id(
         Subscription.user_id == user_id,
         Subscription.stripe_subscription_item_id == stripe_subscription_item_id
     ).first()
+
+
+def resolve_subscription(
+    db: Session,
+    user_id: str,
+    customer_id: str,
+    product_id: str
+) -> Optional[CachedSubscription]:
+    """
+    Subscription state for usage reporting, served from the subscription
+    cache. A miss costs one query, which loads the customer's Stripe ID and
+    its active subscription item together.
+
+    Returns None if the customer does not exist, and an inactive entry if it
+    has no active subscription to the product. Only active subscriptions are
+    cached, so a subscription created on another worker is seen right away.
+    """
+    key = (user_id, customer_id, product_id)
+    cached = subscription_cache.get(key)
+    if cached is not None:
+        return cached
+
+    row = db.query(
+        Customer.stripe_customer_id,
+        Subscription.stripe_subscription_item_id,
+    ).outerjoin(
+        Subscription,
+        (Subscription.user_id == Customer.user_id)
+        & (Subscription.customer_id == Customer.id)
+        & (Subscription.product_id == product_id)
+        & (Subscription.status == "active"),
+    ).filter(
+        Customer.user_id == user_id,
+        Customer.id == customer_id
+    ).first()
+
+    if row is None:
+        return None
+    stripe_customer_id, item_id = row
+    entry = CachedSubscription(
+        active=item_id is not None,
+        stripe_customer_id=stripe_customer_id,
+        stripe_subscription_item_id=item_id,
+    )
+    if entry.active:
+        subscription_cache.put(key, entry)
+    return entry
+
+def cache_subscription_rows(rows: List[Subscription]) -> None:
+    for row in rows:
+        subscription_cache.put(
+            (row.user_id, row.customer_id, row.product_id),
+            CachedSubscription(
+                active=row.status == "active",
+                stripe_customer_id=row.stripe_customer_id,
+                stripe_subscription_item_id=row.stripe_subscription_item_id,
+            ),
+        )
+
+def apply_stripe_subscription(
+    db: Session,
+    stripe_subscription,
+    items,
+    customer: Customer,
+    existing: Dict[str, Subscription],
+    product_for_price: Callable[[str], Optional[Product]]
+) -> List[Subscription]:
+    """
+    Upsert the local rows (one per item) of a Stripe subscription.
+
+    ``existing`` maps item IDs to already loaded rows of this subscription;
+    items no longer on the subscription are marked canceled. Items whose
+    price is not a ZenPay product are skipped. Does not commit.
+    """
+    status = stripe_subscription["status"]
+    synced = []
+    seen = set()
+    for item in items:
+        item_id = item["id"]
+        price_id = item["price"]["id"]
+        seen.add(item_id)
+        row = existing.get(item_id)
+        if row is None:
+            product = product_for_price(price_id)
+            if product is None:
+                continue
+            row = Subscription(
+                user_id=customer.user_id,
+                customer_id=customer.id,
+                product_id=product.id,
+                stripe_subscription_id=stripe_subscription["id"],
+                stripe_subscription_item_id=item_id,
+            )
+            db.add(row)
+            existing[item_id] = row
+        row.status = status
+        row.stripe_customer_id = customer.stripe_customer_id
+        row.stripe_price_id = price_id
+        synced.append(row)
+
+    for item_id, row in existing.items():
+        if row.stripe_subscription_id == stripe_subscription["id"] and item_id not in seen:
+            row.status = "canceled"
+            synced.append(row)
+    return synced
+
+def sync_subscription_from_stripe(db: Session, stripe_subscription) -> List[Subscription]:
+    """
+    Apply a Stripe subscription object (from a ``customer.subscription.*``
+    webhook) to the local table and the subscription cache.
+
+    Items are matched to local rows by item ID; items of subscriptions
+    created outside ZenPay (e.g. through Checkout) are added when their
+    customer and price are known locally.
+    """
+    customer = db.query(Customer).filter(
+        Customer.stripe_customer_id == stripe_subscription["customer"]
+    ).first()
+    if customer is None:
+        return []
+
+    items = list(stripe_subscription["items"]["data"])
+    existing = {
+        row.stripe_subscription_item_id: row
+        for row in db.query(Subscription).filter(
+            (Subscription.stripe_subscription_id == stripe_subscription["id"])
+            | Subscription.stripe_subscription_item_id.in_([item["id"] for item in items])
+        )
+    }
+
+    def product_for_price(price_id: str) -> Optional[Product]:
+        return db.query(Product).filter(
+            Product.user_id == customer.user_id,
+            Product.stripe_price_id == price_id
+        ).first()
+
+    synced = apply_stripe_subscription(db, stripe_subscription, items, customer, existing, product_for_price)
+    db.commit()
+    cache_subscription_rows(synced)
+    return synced
+
+def get_subscription_item_id_by_price(
+    db: Session,
+    stripe_customer_id: str,
+    stripe_price_id: str
+) -> Optional[str]:
+    """Active subscription item of a Stripe customer for a price, from the local mirror"""
+    return db.query(Subscription.stripe_subscription_item_id).filter(
+        Subscription.stripe_customer_id == stripe_customer_id,
+        Subscription.stripe_price_id == stripe_price_id,
+        Subscription.status == "active"
+    ).limit(1).scalar()
@@ -1,13 +1,22 @@
 # zenpay_backend/db/crud/usage.py
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 
 import stripe
 
-from ..models import UsageEvent, Product, Customer
+from ..models import UsageEvent, Product, Customer, Subscription
 from core.exceptions import CustomerNotFoundError, ProductNotFoundError, InsufficientCreditsError
-from .credits import get_credit_balance, use_credits
+from .credits import get_credit_balance_micros, use_credits
+from .credit_leases import charge_credit_lease
+from api.core import metrics
+from api.core.money import from_micros
+from api.services.pricing import period_start, product_tier_table
+
+# Stripe meter that usage events are reported to
+METER_EVENT_NAME = "zenpay_tokens"
+METER_VALUE_KEY = "value"
 
 def track_usage(
     db: Session,
@@ -16,10 +25,13 @@ def track_usage(
     product_code: str,
     quantity: float,
     idempotency_key: Optional[str] = None,
-    use_customer_credits: bool = True
+    use_customer_credits: bool = True,
+    lease_id: Optional[str] = None,
+    report_to_stripe: bool = True
 ) -> UsageEvent:
     """
-    Track usage of a product and optionally deduct credits
+    Track usage of a product and optionally deduct credits, from the
+    customer's balance or from a credit lease (``lease_id``)
     """
     # Check if customer exists
     customer = db.query(Customer).filter(
@@ -49,14 +61,27 @@ def track_usage(
         if existing:
             return existing
     
-    # Calculate cost
-    cost = quantity * product.price_per_unit
+    # Calculate cost; tiered prices depend on the usage so far this period
+    if product.tiers_mode:
+        period_to_date = get_period_usage(
+            db, user_id, customer_id, product.id, period_start(datetime.utcnow())
+        )
+        cost_micros = product_tier_table(product).rate(period_to_date, quantity)
+    else:
+        cost_micros = round(quantity * product.price_micros)
+    cost = from_micros(cost_micros)
     
-    # Check if using credits and if sufficient credits are available
-    if use_customer_credits:
-        balance = get_credit_balance(db, user_id, customer_id)
-        if balance < cost:
-            raise InsufficientCreditsError(f"Insufficient credits: balance {balance}, required {cost}")
+    # Check if using credits and if sufficient credits are available. A volume
+    # tier change can make the cost negative, which use_credits refunds.
+    if use_customer_credits and lease_id:
+        # Already debited from the ledger when the lease was taken
+        charge_credit_lease(db, user_id, lease_id, customer_id, cost_micros)
+    elif use_customer_credits:
+        balance = get_credit_balance_micros(db, user_id, customer_id)
+        if balance < cost_micros:
+            raise InsufficientCreditsError(
+                f"Insufficient credits: balance {from_micros(balance)}, required {cost}"
+            )
         
         # Deduct credits
         use_credits(
@@ -73,12 +98,17 @@ def track_usage(
         customer_id=customer_id,
         product_id=product.id,
         quantity=int(quantity),
-        idempotency_key=idempotency_key
+        idempotency_key=idempotency_key,
+        cost_micros=cost_micros,
+        price_version=product.price_version,
+        report_to_stripe=report_to_stripe
     )
     
     db.add(usage_event)
     db.commit()
     db.refresh(usage_event)
+
+    metrics.USAGE_EVENTS.inc()
     
     return usage_event
 
@@ -90,39 +120,167 @@ def report_usage_to_stripe(
     quantity: float,
     event_name: str,
     quantity_payload_key: str,
-    timestamp: datetime
+    timestamp: datetime,
+    identifier: Optional[str] = None
 ):
+    """
+    Send one meter event. Pass the usage event ID as ``identifier`` so Stripe
+    drops the duplicate if the same event is reported twice.
+    """
     print(f"[Stripe] Reporting usage: customer_id={stripe_customer_id}, quantity={int(quantity)}, event_name={event_name}, time={timestamp}")
     try:
         payload = {
             "stripe_customer_id": stripe_customer_id,
             quantity_payload_key: int(quantity),
         }
+        params = {}
+        if identifier:
+            params["identifier"] = identifier
         response = stripe.billing.MeterEvent.create(
             event_name=event_name,
             payload=payload,
-            timestamp=int(timestamp.timestamp())
+            timestamp=int(timestamp.timestamp()),
+            **params
         )
         print(f"[Stripe] Meter event response: {response}")
     except Exception as e:
         print(f"[Stripe] Stripe error: {e}")
         raise
 
-     
-def get_usage_events(
+
+def mark_usage_reported(db: Session, event_ids: List[str]) -> None:
+    """Flag events as sent to Stripe; the caller commits"""
+    if event_ids:
+        db.query(UsageEvent).filter(UsageEvent.id.in_(event_ids)).update(
+            {UsageEvent.reported_to_stripe: True}, synchronize_session=False
+        )
+
+
+def _unreported_usage_query(db: Session):
+    """
+    ``(id, quantity, timestamp, stripe_customer_id)`` of events not yet
+    reported to Stripe that ``record_usage`` would have reported: tracked
+    with ``report_to_stripe``, and the customer has a Stripe ID and an active
+    subscription to the product
+    """
+    subscribed = db.query(Subscription.id).filter(
+        Subscription.user_id == UsageEvent.user_id,
+        Subscription.customer_id == UsageEvent.customer_id,
+        Subscription.product_id == UsageEvent.product_id,
+        Subscription.status == "active",
+    ).exists()
+    return db.query(
+        UsageEvent.id,
+        UsageEvent.quantity,
+        UsageEvent.timestamp,
+        Customer.stripe_customer_id,
+    ).join(
+        Customer, (Customer.id == UsageEvent.customer_id) & (Customer.user_id == UsageEvent.user_id)
+    ).filter(
+        UsageEvent.report_to_stripe.is_(True),
+        UsageEvent.reported_to_stripe.is_(False),
+        Customer.stripe_customer_id.isnot(None),
+        subscribed,
+    )
+
+
+def get_unreported_usage_page(
+    db: Session,
+    after_id: Optional[str] = None,
+    limit: int = 500,
+    user_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[tuple]:
+    """
+    One page of unreported events (see ``_unreported_usage_query``), ordered
+    by ID and starting after ``after_id`` (keyset pagination, so every page
+    is an index range scan)
+    """
+    query = _unreported_usage_query(db)
+    if after_id is not None:
+        query = query.filter(UsageEvent.id > after_id)
+    if user_id:
+        query = query.filter(UsageEvent.user_id == user_id)
+    if start_date:
+        query = query.filter(UsageEvent.timestamp >= start_date)
+    if end_date:
+        query = query.filter(UsageEvent.timestamp <= end_date)
+    return query.order_by(UsageEvent.id).limit(limit).all()
+
+
+def get_unreported_usage_by_ids(db: Session, event_ids: List[str]) -> List[tuple]:
+    """The events of ``event_ids`` that are still unreported, ordered by ID"""
+    if not event_ids:
+        return []
+    return _unreported_usage_query(db).filter(UsageEvent.id.in_(event_ids)).order_by(UsageEvent.id).all()
+
+
+def get_daily_usage_totals(
+    db: Session,
+    customer_ids: List[str],
+    start_date: datetime,
+    end_date: datetime,
+) -> List[tuple]:
+    """
+    ``(customer_id, day, reported_quantity, unreported_quantity)`` per
+    customer and UTC day in ``[start_date, end_date)``, in one grouped query
+    """
+    day = func.date(UsageEvent.timestamp)
+    rows = db.query(
+        UsageEvent.customer_id,
+        day,
+        func.sum(case((UsageEvent.reported_to_stripe.is_(True), UsageEvent.quantity), else_=0)),
+        func.sum(case(
+            (UsageEvent.reported_to_stripe.is_(False) & UsageEvent.report_to_stripe.is_(True), UsageEvent.quantity),
+            else_=0,
+        )),
+    ).filter(
+        UsageEvent.customer_id.in_(customer_ids),
+        UsageEvent.timestamp >= start_date,
+        UsageEvent.timestamp < end_date,
+    ).group_by(UsageEvent.customer_id, day).all()
+    # SQLite returns the day as text
+    return [
+        (customer_id, date.fromisoformat(d) if isinstance(d, str) else d, reported or 0, unreported or 0)
+        for customer_id, d, reported, unreported in rows
+    ]
+
+
+def get_usage_totals(
     db: Session,
     user_id: str,
+    start_date: datetime,
+    end_date: datetime,
+    customer_id: Optional[str] = None,
+) -> List[tuple]:
+    """
+    ``(customer_id, product_id, quantity)`` summed over a user's events in
+    ``[start_date, end_date)``, in one grouped query
+    """
+    query = db.query(
+        UsageEvent.customer_id,
+        UsageEvent.product_id,
+        func.sum(UsageEvent.quantity),
+    ).filter(
+        UsageEvent.user_id == user_id,
+        UsageEvent.timestamp >= start_date,
+        UsageEvent.timestamp < end_date,
+    )
+    if customer_id:
+        query = query.filter(UsageEvent.customer_id == customer_id)
+    return query.group_by(UsageEvent.customer_id, UsageEvent.product_id).all()
+
+
+def _filter_usage_events(
+    query,
+    user_id: str,
     customer_id: Optional[str] = None,
     product_id: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    skip: int = 0,
-    limit: int = 100
-) -> List[UsageEvent]:
-    """
-    Get usage events with optional filtering
-    """
-    query = db.query(UsageEvent).filter(UsageEvent.user_id == user_id)
+):
+    query = query.filter(UsageEvent.user_id == user_id)
     
     if customer_id:
         query = query.filter(UsageEvent.customer_id == customer_id)
@@ -135,5 +293,84 @@ def get_usage_events(
     
     if end_date:
         query = query.filter(UsageEvent.timestamp <= end_date)
-    
-    return query.order_by(UsageEvent.timestamp.desc()).offset(skip).limit(limit).all()
\ No newline at end of file
+
+    return query
+
+
+def get_usage_events(
+    db: Session,
+    user_id: str,
+    customer_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> List[UsageEvent]:
+    """
+    Get usage events with optional filtering
+    """
+    query = _filter_usage_events(
+        db.query(UsageEvent), user_id, customer_id, product_id, start_date, end_date
+    )
+    return query.order_by(UsageEvent.timestamp.desc()).offset(skip).limit(limit).all()
+
+
+def get_period_usage(
+    db: Session, user_id: str, customer_id: str, product_id: str, since: datetime
+) -> float:
+    """Quantity a customer used of a product since ``since``"""
+    return db.query(func.coalesce(func.sum(UsageEvent.quantity), 0)).filter(
+        UsageEvent.user_id == user_id,
+        UsageEvent.customer_id == customer_id,
+        UsageEvent.timestamp >= since,
+        UsageEvent.product_id == product_id,
+    ).scalar()
+
+
+def get_usage_cost(
+    db: Session,
+    user_id: str,
+    customer_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> float:
+    """
+    Total rated cost of the matching events, as charged when they were
+    tracked (later price changes do not apply retroactively)
+    """
+    query = _filter_usage_events(
+        db.query(func.coalesce(func.sum(UsageEvent.cost_micros), 0)),
+        user_id, customer_id, product_id, start_date, end_date
+    )
+    return from_micros(query.scalar())
+
+
+# Field names of UsageEventResponse, in the column order of get_usage_event_rows
+USAGE_EVENT_FIELDS = ("id", "customer_id", "product", "quantity", "timestamp")
+
+
+def get_usage_event_rows(
+    db: Session,
+    user_id: str,
+    customer_id: Optional[str] = None,
+    product_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> List[tuple]:
+    """
+    Same filtering as get_usage_events, but returns plain tuples with the
+    product code joined in, for the fast serialization path
+    """
+    query = db.query(
+        UsageEvent.id,
+        UsageEvent.customer_id,
+        Product.code,
+        UsageEvent.quantity,
+        UsageEvent.timestamp,
+    ).join(Product, UsageEvent.product_id == Product.id)
+    query = _filter_usage_events(query, user_id, customer_id, product_id, start_date, end_date)
+    return query.order_by(UsageEvent.timestamp.desc()).offset(skip).limit(limit).all()
@@ -0,0 +1,24 @@
+# zenpay_backend/db/crud/versions.py
+"""
+Version counters behind the HTTP ETags.
+
+Counters live on rows the read paths load anyway (the tenant's ``User`` for
+products, the ``Customer`` for credit balances), so checking
+``If-None-Match`` costs no extra query. Writers bump them in their own
+transaction, so a new version becomes visible together with the write.
+"""
+from sqlalchemy.orm import Session
+
+from ..models import Customer, User
+
+
+def bump_products_version(db: Session, user_id: str) -> None:
+    db.query(User).filter(User.id == user_id).update(
+        {User.products_version: User.products_version + 1}, synchronize_session=False
+    )
+
+
+def bump_credits_version(db: Session, user_id: str, customer_id: str) -> None:
+    db.query(Customer).filter(Customer.user_id == user_id, Customer.id == customer_id).update(
+        {Customer.credits_version: Customer.credits_version + 1}, synchronize_session=False
+    )
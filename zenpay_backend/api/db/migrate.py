@@ -0,0 +1,272 @@
+# db/migrate.py
+"""
+Schema management, run once per deployment rather than on every worker boot:
+
+    python -m api.db.migrate                   # create tables, apply migrations
+    python -m api.db.migrate --seed-test-user  # also create the dev test user
+
+New tables are created from the models. Changes to existing tables go in
+``MIGRATIONS`` as ``(version, description, function)`` entries; applied
+versions are recorded in the ``schema_version`` table.
+"""
+import argparse
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import DateTime, inspect, text
+from sqlalchemy.engine import Connection
+
+from api.core.money import MICROS, to_micros
+from api.db.models import Base, ProductPrice, Subscription, User, generate_uuid
+from api.db.session import engine, SessionLocal
+
+logger = logging.getLogger(__name__)
+
+TEST_USER_EMAIL = "test@example.com"
+TEST_API_KEY = "zp_test_key"
+
+
+def column_names(conn: Connection, table: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    """Add a column unless create_all already made it (fresh databases)"""
+    if column in column_names(conn, table):
+        return
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def drop_column(conn: Connection, table: str, column: str) -> None:
+    """Drop a column the models no longer declare, if the table still has it"""
+    if column not in column_names(conn, table):
+        return
+    if conn.dialect.name == "sqlite" and sqlite3.sqlite_version_info < (3, 35):
+        # No DROP COLUMN before SQLite 3.35. The legacy rename keeps foreign
+        # keys of other tables pointing at the rebuilt table.
+        conn.execute(text("PRAGMA legacy_alter_table = ON"))
+        rebuild_sqlite_table(conn, Base.metadata.tables[table])
+        conn.execute(text("PRAGMA legacy_alter_table = OFF"))
+    else:
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+
+
+def _product_price_sql(conn: Connection) -> str:
+    """Dollar unit price of a products row, before or after migration 8"""
+    if "price_per_unit" in column_names(conn, "products"):
+        return "price_per_unit"
+    return f"price_micros / {float(MICROS)}"
+
+
+def _add_cache_versions(conn: Connection) -> None:
+    add_column(conn, "users", "products_version", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "customers", "credits_version", "INTEGER NOT NULL DEFAULT 0")
+
+
+def _add_tenant_limits(conn: Connection) -> None:
+    add_column(conn, "users", "rate_limit_per_second", "FLOAT")
+    add_column(conn, "users", "rate_limit_burst", "INTEGER")
+    add_column(conn, "users", "max_concurrent_requests", "INTEGER")
+
+
+def _index_subscription_lookup(conn: Connection) -> None:
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_customer_product "
+        "ON subscriptions (user_id, customer_id, product_id)"
+    ))
+
+
+def rebuild_sqlite_table(conn: Connection, table) -> None:
+    """
+    Recreate ``table`` from its model, keeping the rows. SQLite cannot drop
+    constraints, so this is how a constraint the model no longer declares
+    is removed there.
+    """
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    for index in inspect(conn).get_indexes(table.name):
+        if not index["name"].startswith("sqlite_autoindex"):
+            conn.execute(text(f"DROP INDEX IF EXISTS {index['name']}"))
+    conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+    table.create(conn)
+    columns = ", ".join(c.name for c in table.columns if c.name in existing)
+    conn.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old"))
+    conn.execute(text(f"DROP TABLE {table.name}_old"))
+
+
+def _mirror_subscription_items(conn: Connection) -> None:
+    add_column(conn, "subscriptions", "stripe_customer_id", "VARCHAR")
+    add_column(conn, "subscriptions", "stripe_price_id", "VARCHAR")
+
+    # A subscription may now have one row per item
+    uniques = [
+        u for u in inspect(conn).get_unique_constraints("subscriptions")
+        if u["column_names"] == ["stripe_subscription_id"]
+    ]
+    if uniques and conn.dialect.name == "sqlite":
+        rebuild_sqlite_table(conn, Subscription.__table__)
+    else:
+        for unique in uniques:
+            conn.execute(text(f"ALTER TABLE subscriptions DROP CONSTRAINT {unique['name']}"))
+
+    conn.execute(text(
+        "UPDATE subscriptions SET stripe_customer_id = "
+        "(SELECT stripe_customer_id FROM customers WHERE customers.id = subscriptions.customer_id) "
+        "WHERE stripe_customer_id IS NULL"
+    ))
+    conn.execute(text(
+        "UPDATE subscriptions SET stripe_price_id = "
+        "(SELECT stripe_price_id FROM products WHERE products.id = subscriptions.product_id) "
+        "WHERE stripe_price_id IS NULL"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_stripe_customer_price "
+        "ON subscriptions (stripe_customer_id, stripe_price_id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_subscriptions_stripe_subscription_id "
+        "ON subscriptions (stripe_subscription_id)"
+    ))
+
+
+def _rate_usage_events(conn: Connection) -> None:
+    add_column(conn, "products", "price_version", "INTEGER NOT NULL DEFAULT 1")
+    add_column(conn, "usage_events", "cost", "FLOAT")
+    add_column(conn, "usage_events", "price_version", "INTEGER")
+    # Older events were never rated; the current price is the best estimate.
+    # Migration 8 moves cost to cost_micros.
+    conn.execute(text(
+        "UPDATE usage_events SET "
+        f"cost = quantity * (SELECT {_product_price_sql(conn)} FROM products WHERE products.id = usage_events.product_id), "
+        "price_version = (SELECT price_version FROM products WHERE products.id = usage_events.product_id) "
+        "WHERE cost IS NULL"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_usage_events_customer_time "
+        "ON usage_events (user_id, customer_id, timestamp)"
+    ))
+
+
+def _seed_price_history(conn: Connection) -> None:
+    # product_prices itself is created by create_all; start each product's
+    # history with its current price
+    price = _product_price_sql(conn)
+    rows = conn.execute(text(
+        f"SELECT id, {price} AS price, price_version, stripe_price_id, created_at FROM products "
+        f"WHERE {price} IS NOT NULL AND id NOT IN (SELECT product_id FROM product_prices)"
+    ).columns(created_at=DateTime)).all()
+    if rows:
+        conn.execute(ProductPrice.__table__.insert(), [
+            dict(id=generate_uuid(), product_id=product_id, version=version, price_micros=to_micros(price),
+                 stripe_price_id=stripe_price_id, effective_from=created_at or datetime(1970, 1, 1))
+            for product_id, price, version, stripe_price_id, created_at in rows
+        ])
+
+
+def _add_price_tiers(conn: Connection) -> None:
+    for table in ("products", "product_prices"):
+        add_column(conn, table, "tiers_mode", "VARCHAR")
+        add_column(conn, table, "price_tiers", "JSON")
+
+
+# (table, float dollar column, integer micro-dollar column, DDL of the new column)
+MONEY_COLUMNS = (
+    ("credit_transactions", "amount", "amount_micros", "BIGINT NOT NULL DEFAULT 0"),
+    ("products", "price_per_unit", "price_micros", "BIGINT"),
+    ("product_prices", "price_per_unit", "price_micros", "BIGINT NOT NULL DEFAULT 0"),
+    ("usage_events", "cost", "cost_micros", "BIGINT"),
+)
+
+
+def _money_to_micros(conn: Connection) -> None:
+    for table, dollars, micros, ddl in MONEY_COLUMNS:
+        if dollars not in column_names(conn, table):
+            continue
+        add_column(conn, table, micros, ddl)
+        conn.execute(text(
+            f"UPDATE {table} SET {micros} = CAST(ROUND({dollars} * {MICROS}) AS BIGINT) "
+            f"WHERE {dollars} IS NOT NULL"
+        ))
+        drop_column(conn, table, dollars)
+
+
+def _mark_usage_reporting(conn: Connection) -> None:
+    add_column(conn, "usage_events", "reported_to_stripe", "BOOLEAN")
+    add_column(conn, "usage_events", "report_to_stripe", "BOOLEAN NOT NULL DEFAULT TRUE")
+    # Nothing flagged events before the backfill job (python -m
+    # api.services.usage_reporting) existed, and they were metered without an
+    # identifier, so Stripe cannot drop a second report: count them reported
+    conn.execute(
+        text("UPDATE usage_events SET reported_to_stripe = :reported "
+             "WHERE reported_to_stripe IS NULL OR reported_to_stripe = :unreported"),
+        {"reported": True, "unreported": False},
+    )
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "ETag version counters on users and customers", _add_cache_versions),
+    (2, "Per-user rate and concurrency limits", _add_tenant_limits),
+    (3, "Index subscriptions by customer and product", _index_subscription_lookup),
+    (4, "Mirror Stripe subscription items", _mirror_subscription_items),
+    (5, "Rated cost and price version on usage events", _rate_usage_events),
+    (6, "Price history of products", _seed_price_history),
+    (7, "Graduated and volume price tiers", _add_price_tiers),
+    (8, "Money as integer micro-units", _money_to_micros),
+    (9, "Usage reporting state of existing events", _mark_usage_reporting),
+]
+
+
+def current_version(conn: Connection) -> int:
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+    return version or 0
+
+
+def migrate(bind=None) -> int:
+    """Bring the schema up to date and return the resulting version"""
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        version = current_version(conn)
+        for target, description, apply in MIGRATIONS:
+            if target <= version:
+                continue
+            logger.info(f"Applying migration {target}: {description}")
+            apply(conn)
+            conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": target})
+            version = target
+    return version
+
+
+def seed_test_user() -> str:
+    """Create the development test user if it does not exist yet"""
+    db = SessionLocal()
+    try:
+        test_user = db.query(User).filter(User.email == TEST_USER_EMAIL).first()
+        if not test_user:
+            test_user = User(email=TEST_USER_EMAIL, api_key=TEST_API_KEY, company_name="Test Company")
+            db.add(test_user)
+            db.commit()
+            print(f"Test user created with API key: {TEST_API_KEY}")
+        else:
+            print(f"Using existing test user with API key: {test_user.api_key}")
+        return test_user.api_key
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or upgrade the ZenPay database schema")
+    parser.add_argument("--seed-test-user", action="store_true", help="create the zp_test_key development user")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    version = migrate()
+    print(f"Schema is at version {version}")
+    if args.seed_test_user:
+        seed_test_user()
+
+
+if __name__ == "__main__":
+    main()
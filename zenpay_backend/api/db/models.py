@@ -1,10 +1,13 @@
 # db/models.py
-from sqlalchemy import Column, String, Float, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, Float, Boolean, DateTime, ForeignKey, JSON, Integer, BigInteger, Index, UniqueConstraint, true
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 
+from api.core.money import MICROS, from_micros, to_micros
+
 Base = declarative_base()
 
 def generate_uuid():
@@ -16,6 +19,12 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     api_key = Column(String, unique=True, index=True)
     company_name = Column(String, nullable=True)
+    # Bumped on every product write; backs the product ETags
+    products_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Per-user overrides of the RATE_LIMIT_* / TENANT_MAX_CONCURRENCY settings
+    rate_limit_per_second = Column(Float, nullable=True)
+    rate_limit_burst = Column(Integer, nullable=True)
+    max_concurrent_requests = Column(Integer, nullable=True)
     
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -33,6 +42,8 @@ class Customer(Base):
     email = Column(String, nullable=True)
     metadata_json = Column(JSON, nullable=True)
     stripe_customer_id = Column(String, nullable=True)
+    # Bumped on every credit transaction; backs the balance ETag
+    credits_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -48,7 +59,14 @@ class Product(Base):
     name = Column(String)
     code = Column(String)
     unit_name = Column(String)
-    price_per_unit = Column(Float)
+    # Money columns hold integer micro-dollars (api.core.money); the
+    # price_per_unit / cost / amount attributes read and write dollars
+    price_micros = Column(BigInteger)
+    # "graduated" or "volume" with price_tiers (see api.services.pricing); None = flat price_per_unit
+    tiers_mode = Column(String, nullable=True)
+    price_tiers = Column(JSON, nullable=True)
+    # Bumped whenever the price or tiers change; usage events record the version they were rated at
+    price_version = Column(Integer, nullable=False, default=1, server_default="1")
     stripe_price_id = Column(String, nullable=True)
     stripe_product_id = Column(String, nullable=True)
     
@@ -58,6 +76,49 @@ class Product(Base):
     user = relationship("User", back_populates="products")
     usage_events = relationship("UsageEvent", back_populates="product")
 
+    @hybrid_property
+    def price_per_unit(self):
+        return from_micros(self.price_micros)
+
+    @price_per_unit.setter
+    def price_per_unit(self, value):
+        self.price_micros = to_micros(value)
+
+    @price_per_unit.expression
+    def price_per_unit(cls):
+        return cls.price_micros / float(MICROS)
+
+
+class ProductPrice(Base):
+    """One row per price a product has had; the newest matches Product.price_per_unit"""
+    __tablename__ = "product_prices"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    product_id = Column(String, ForeignKey("products.id"), nullable=False)
+    version = Column(Integer, nullable=False)  # Product.price_version it was current as
+    price_micros = Column(BigInteger, nullable=False)
+    tiers_mode = Column(String, nullable=True)
+    price_tiers = Column(JSON, nullable=True)
+    stripe_price_id = Column(String, nullable=True)
+    effective_from = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("product_id", "version"),
+        Index("ix_product_prices_product_effective", "product_id", "effective_from"),
+    )
+
+    @hybrid_property
+    def price_per_unit(self):
+        return from_micros(self.price_micros)
+
+    @price_per_unit.setter
+    def price_per_unit(self, value):
+        self.price_micros = to_micros(value)
+
+    @price_per_unit.expression
+    def price_per_unit(cls):
+        return cls.price_micros / float(MICROS)
+
 
 class UsageEvent(Base):
     __tablename__ = "usage_events"
@@ -69,7 +130,12 @@ class UsageEvent(Base):
     quantity = Column(Float)
     idempotency_key = Column(String, nullable=True)
     reported_to_stripe = Column(Boolean, default=False)
+    # False when tracked with report_to_stripe=false; the backfill skips those
+    report_to_stripe = Column(Boolean, nullable=False, default=True, server_default=true())
     stripe_usage_record_id = Column(String, nullable=True)
+    # Rated at ingest with the product's price_version at the time, in micro-dollars
+    cost_micros = Column(BigInteger, nullable=True)
+    price_version = Column(Integer, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -77,6 +143,23 @@ class UsageEvent(Base):
     customer = relationship("Customer", back_populates="usage_events")
     product = relationship("Product", back_populates="usage_events")  # 🔁 lowercase and consistent
 
+    __table_args__ = (
+        # Revenue and usage aggregates per customer over a time range
+        Index("ix_usage_events_customer_time", "user_id", "customer_id", "timestamp"),
+    )
+
+    @hybrid_property
+    def cost(self):
+        return from_micros(self.cost_micros)
+
+    @cost.setter
+    def cost(self, value):
+        self.cost_micros = to_micros(value)
+
+    @cost.expression
+    def cost(cls):
+        return cls.cost_micros / float(MICROS)
+
 
 class CreditTransaction(Base):
     __tablename__ = "credit_transactions"
@@ -84,11 +167,57 @@ class CreditTransaction(Base):
     id = Column(String, primary_key=True, index=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String)
     customer_id = Column(String, index=True)
-    amount = Column(Float)
+    amount_micros = Column(BigInteger, nullable=False, default=0, server_default="0")
     timestamp = Column(DateTime, default=datetime.utcnow)
     description = Column(String)
     type = Column(String)
 
+    @hybrid_property
+    def amount(self):
+        return from_micros(self.amount_micros)
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_micros = to_micros(value)
+
+    @amount.expression
+    def amount(cls):
+        return cls.amount_micros / float(MICROS)
+
+class CreditLease(Base):
+    """
+    Credits set aside for one customer's usage until ``expires_at``; the
+    amount is debited from the ledger when the lease is taken and the unused
+    rest credited back when it is settled
+    """
+    __tablename__ = "credit_leases"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    customer_id = Column(String, nullable=False)
+    amount_micros = Column(BigInteger, nullable=False)
+    used_micros = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    settled_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_credit_leases_customer", "user_id", "customer_id"),
+        Index("ix_credit_leases_open", "settled_at", "expires_at"),
+    )
+
+    @property
+    def amount(self) -> float:
+        return from_micros(self.amount_micros)
+
+    @property
+    def used(self) -> float:
+        return from_micros(self.used_micros)
+
+    @property
+    def remaining(self) -> float:
+        return from_micros(self.amount_micros - self.used_micros)
+
 class Subscription(Base):
     __tablename__ = "subscriptions"
 
@@ -96,10 +225,38 @@ class Subscription(Base):
     user_id = Column(String, ForeignKey("users.id"))
     customer_id = Column(String, ForeignKey("customers.id"))
     product_id = Column(String, ForeignKey("products.id"))
-    stripe_subscription_id = Column(String, unique=True, nullable=False)
+    # One row per subscription item, so a subscription may span several rows
+    stripe_subscription_id = Column(String, nullable=False, index=True)
     stripe_subscription_item_id = Column(String, unique=True, nullable=False)
+    # Mirrored from Stripe for the (customer, price) -> item lookup
+    stripe_customer_id = Column(String, nullable=True)
+    stripe_price_id = Column(String, nullable=True)
     status = Column(String, default="active") # e.g., active, canceled, past_due
     created_at = Column(DateTime, default=datetime.utcnow)
 
     customer = relationship("Customer")
     product = relationship("Product")
+
+    __table_args__ = (
+        # Usage reporting resolves subscriptions by customer and product
+        Index("ix_subscriptions_customer_product", "user_id", "customer_id", "product_id"),
+        Index("ix_subscriptions_stripe_customer_price", "stripe_customer_id", "stripe_price_id"),
+    )
+
+
+class ImportJob(Base):
+    """Progress of a bulk import running in the background"""
+    __tablename__ = "import_jobs"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    user_id = Column(String, ForeignKey("users.id"), index=True)
+    kind = Column(String, nullable=False)  # e.g., customers, products
+    status = Column(String, nullable=False, default="pending")  # pending, running, completed, failed
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    created = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)  # already existed
+    failed = Column(Integer, nullable=False, default=0)
+    errors = Column(JSON, nullable=True)  # the first problems, as {"line", "id", "error"}
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
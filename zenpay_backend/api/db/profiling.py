@@ -0,0 +1,154 @@
+# db/profiling.py
+"""
+SQLAlchemy statement profiling.
+
+``profile_engine`` hooks an engine so every statement is counted and timed
+against the current request's ``QueryStats``, and statements slower than
+``settings.DB_SLOW_QUERY_MS`` are logged with the shape (not the values) of
+their bound parameters. ``QueryProfilingMiddleware`` opens a stats scope per
+request and can expose the count as an ``X-DB-Query-Count`` header.
+
+For tests, ``assert_max_queries`` checks the number of statements an engine
+executes inside a block, from any thread.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from api.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_LOGGED_STATEMENT = 500
+
+
+class QueryStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# The contextvar is copied into threadpool workers, so sync handlers and
+# dependencies update the same object as the request that started them.
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+@contextmanager
+def query_stats_scope():
+    """Yield the active QueryStats, opening a new scope if none is active"""
+    stats = current_query_stats.get()
+    if stats is not None:
+        yield stats
+        return
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
+
+
+def param_shape(parameters, executemany: bool = False) -> str:
+    """Describe bound parameters by type only, so no customer data hits the logs"""
+    if executemany:
+        rows = list(parameters or [])
+        return f"{len(rows)} x {param_shape(rows[0]) if rows else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in parameters) + ")"
+    return type(parameters).__name__
+
+
+def profile_engine(engine, slow_query_ms: Optional[float] = None) -> None:
+    """Attach statement counting and slow-query logging to an engine"""
+    threshold = (settings.DB_SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms) / 1000.0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._zenpay_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._zenpay_started
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+        if threshold and elapsed >= threshold:
+            logger.warning(
+                f"Slow query ({elapsed * 1000:.1f} ms) params={param_shape(parameters, executemany)}: "
+                f"{' '.join(statement.split())[:MAX_LOGGED_STATEMENT]}"
+            )
+
+
+class QueryProfilingMiddleware:
+    """Pure ASGI middleware scoping QueryStats to each HTTP request"""
+
+    def __init__(self, app, add_header: Optional[bool] = None, query_budget: Optional[int] = None):
+        self.app = app
+        self.add_header = settings.DB_QUERY_COUNT_HEADER if add_header is None else add_header
+        self.query_budget = settings.DB_QUERY_BUDGET if query_budget is None else query_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with query_stats_scope() as stats:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start" and self.add_header:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-query-count", str(stats.queries).encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+            if self.query_budget and stats.queries > self.query_budget:
+                logger.warning(
+                    f"{scope['method']} {scope['path']} ran {stats.queries} queries "
+                    f"(budget {self.query_budget}, {stats.seconds * 1000:.1f} ms in DB)"
+                )
+
+
+# -- test helpers ----------------------------------------------------------------
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(engine):
+    """Record every statement ``engine`` executes inside the block, on any thread"""
+    counter = QueryCounter()
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(engine, "after_cursor_execute", _record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "after_cursor_execute", _record)
+
+
+@contextmanager
+def assert_max_queries(engine, budget: int):
+    """Fail if the block executes more than ``budget`` statements"""
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > budget:
+        listing = "\n".join(f"  {i + 1}. {' '.join(s.split())}" for i, s in enumerate(counter.statements))
+        raise AssertionError(f"Expected at most {budget} queries, got {counter.count}:\n{listing}")
@@ -1,25 +1,86 @@
 # db/session.py
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from api.core.config import settings
+from api.db.profiling import profile_engine
+
 # Database URL
-DATABASE_URL = "sqlite:///./zenpay.db"
+DATABASE_URL = settings.DATABASE_URL
+
+
+def _sqlite_on_connect(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL):
+    """
+    Create an engine for ``url``. Creating an engine does not connect, so this
+    is cheap at import time; connections are opened on first use.
+    """
+    if url.startswith("sqlite") and ":memory:" in url:
+        # In-memory SQLite only exists on one connection, so share it
+        new_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool
+        )
+    elif url.startswith("sqlite"):
+        # One connection per thread; several worker processes share the file,
+        # so wait on the write lock instead of failing, and use WAL so readers
+        # do not block the writer.
+        new_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": 30},
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+        )
+        event.listen(new_engine, "connect", _sqlite_on_connect)
+    else:
+        new_engine = create_engine(
+            url,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+    profile_engine(new_engine)
+    return new_engine
+
 
-# Create engine with thread-safe connection pool
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool
-)
+engine = create_db_engine()
 
 # Create sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _reset_engine_after_fork():
+    """
+    Give a forked worker its own engine and pool.
+
+    Pooled connections inherited from the parent share sockets/file handles
+    with it, so the child must never use them. ``dispose(close=False)`` drops
+    them without closing what the parent still owns.
+    """
+    global engine
+    engine.dispose(close=False)
+    engine = create_db_engine()
+    SessionLocal.configure(bind=engine)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_engine_after_fork)
+
+
 # Function to get a database session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -1,7 +1,11 @@
 # dependencies.py
+import math
+
 from fastapi import Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 
+from api.core.config import settings
+from api.core.rate_limit import TenantLimiter, retry_after_header
 from api.db.session import get_db
 from api.db.models import User
 
@@ -12,4 +16,40 @@ def get_current_user_by_api_key(
     user = db.query(User).filter(User.api_key == api_key).first()
     if not user:
         raise HTTPException(status_code=401, detail="Invalid API key")
-    return user
\ No newline at end of file
+    return user
+
+tenant_limiter = TenantLimiter()
+
+
+async def enforce_tenant_limits(user: User = Depends(get_current_user_by_api_key)):
+    """
+    Router-level dependency applying the per-user rate and concurrency
+    limits. ``get_current_user_by_api_key`` is cached per request, so routes
+    depending on it as well do not look the key up twice.
+    """
+    rate = user.rate_limit_per_second
+    if rate is None:
+        rate = settings.RATE_LIMIT_PER_SECOND
+    burst = user.rate_limit_burst or settings.RATE_LIMIT_BURST or math.ceil(rate)
+    delay = tenant_limiter.acquire_rate(user.api_key, rate, burst)
+    if delay:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": retry_after_header(delay)},
+        )
+
+    limit = user.max_concurrent_requests
+    if limit is None:
+        limit = settings.TENANT_MAX_CONCURRENCY
+    slot = tenant_limiter.acquire_slot(user.id, limit)
+    if slot is None:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many concurrent requests",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        yield
+    finally:
+        slot.release()
@@ -1,58 +1,98 @@
-print("LOADING MAIN.PY")
 # zenpay_backend/main.py
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+import stripe
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from api.routes import customers, usage, credits, webhooks, products, subscriptions
+from api.routes import customers, usage, credits, webhooks, products, subscriptions, invoices
 from .core.config import settings
-from .db.models import Base
-from .db.session import engine
-
-
-with open("main_loaded.log", "w") as f:
-    f.write("main.py has been loaded\n")
-
-Base.metadata.create_all(bind=engine)
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    description="API for usage-based billing with Stripe",
-    version="0.1.0",
-    docs_url="/docs",
-    redoc_url="/redoc",
-)
-
-# Set up CORS
-if settings.BACKEND_CORS_ORIGINS:
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=settings.BACKEND_CORS_ORIGINS,
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
-    )
+from .core import metrics
+from .core.idempotency import IdempotencyMiddleware
+from .core.lanes import shutdown_lanes
+from .core.load_shedding import LoadSheddingMiddleware
+from .db.profiling import QueryProfilingMiddleware
+from .dependencies import enforce_tenant_limits
 
-# Include routers
-app.include_router(usage.router, prefix="/api/v1/usage", tags=["usage"])
-app.include_router(customers.router, prefix="/api/v1/customers", tags=["customers"])
-app.include_router(credits.router, prefix="/api/v1/credits", tags=["credits"])
-app.include_router(webhooks.router, prefix="/api/v1/webhooks", tags=["webhooks"])
-app.include_router(products.router, prefix="/api/v1/products", tags=["products"])
-app.include_router(subscriptions.router, prefix="/api/v1/subscriptions", tags=["subscriptions"])
 
-@app.get("/health", tags=["system"])
-def health_check():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    Health check endpoint
+    Per-worker startup. The schema is managed by ``python -m api.db.migrate``.
     """
-    return {"status": "healthy"}
+    stripe.api_key = settings.STRIPE_API_KEY
+    if settings.METRICS_ENABLED:
+        metrics.instrument_stripe()
+    yield
+    shutdown_lanes()
 
-@app.get("/", tags=["system"])
-def root():
-    """
-    Root endpoint
-    """
-    return {
-        "message": f"Welcome to {settings.PROJECT_NAME} API",
-        "docs": "/docs",
-        "redoc": "/redoc"
-    }
\ No newline at end of file
+
+def create_app() -> FastAPI:
+    app = FastAPI(
+        title=settings.PROJECT_NAME,
+        description="API for usage-based billing with Stripe",
+        version="0.1.0",
+        docs_url="/docs",
+        redoc_url="/redoc",
+        lifespan=lifespan,
+        dependencies=[Depends(metrics.track_in_flight)] if settings.METRICS_ENABLED else [],
+    )
+
+    # Innermost, so replayed responses still show up in metrics
+    app.add_middleware(IdempotencyMiddleware)
+    if settings.SHED_ENABLED:
+        app.add_middleware(LoadSheddingMiddleware)
+    if settings.METRICS_ENABLED:
+        app.add_middleware(metrics.MetricsMiddleware)
+    app.add_middleware(QueryProfilingMiddleware)
+
+    # Set up CORS
+    if settings.BACKEND_CORS_ORIGINS:
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=settings.BACKEND_CORS_ORIGINS,
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+
+    # Include routers; every API router except webhooks is subject to the
+    # per-tenant limits
+    tenant_limits = [Depends(enforce_tenant_limits)]
+    app.include_router(usage.router, prefix="/api/v1/usage", dependencies=tenant_limits, tags=["usage"])
+    app.include_router(customers.router, prefix="/api/v1/customers", dependencies=tenant_limits, tags=["customers"])
+    app.include_router(credits.router, prefix="/api/v1/credits", dependencies=tenant_limits, tags=["credits"])
+    app.include_router(webhooks.router, prefix="/api/v1/webhooks", tags=["webhooks"])
+    app.include_router(products.router, prefix="/api/v1/products", dependencies=tenant_limits, tags=["products"])
+    app.include_router(subscriptions.router, prefix="/api/v1/subscriptions", dependencies=tenant_limits, tags=["subscriptions"])
+    app.include_router(invoices.router, prefix="/api/v1/invoices", dependencies=tenant_limits, tags=["invoices"])
+
+    @app.get("/health", tags=["system"])
+    def health_check():
+        """
+        Health check endpoint
+        """
+        return {"status": "healthy"}
+
+    @app.get("/metrics", tags=["system"], include_in_schema=False)
+    def metrics_endpoint():
+        """
+        Prometheus scrape endpoint
+        """
+        return Response(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
+    @app.get("/", tags=["system"])
+    def root():
+        """
+        Root endpoint
+        """
+        return {
+            "message": f"Welcome to {settings.PROJECT_NAME} API",
+            "docs": "/docs",
+            "redoc": "/redoc"
+        }
+
+    return app
+
+
+app = create_app()
@@ -1,7 +1,10 @@
 # models/request.py
 from datetime import datetime
 from pydantic import BaseModel, validator
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal
+
+from api.core.config import settings
+from api.services.pricing import validate_tiers
 
 class CustomerCreate(BaseModel):
     id: str
@@ -16,12 +19,23 @@ class CustomerUpdate(BaseModel):
     
 # Add these to your models section in app.py or in a separate models/request.py file
 
+class PriceTier(BaseModel):
+    up_to: Optional[int] = None  # None for the last, unbounded tier
+    unit_amount: float = 0
+    flat_amount: float = 0
+
+def _check_tiers(tiers, values):
+    validate_tiers(values.get('tiers_mode'), [t.model_dump() for t in tiers] if tiers else None)
+    return tiers
+
 class ProductCreate(BaseModel):
     name: str
     code: str
     unit_name: str  # e.g., "calls", "GB", "users"
     price_per_unit: float
     meter_id: Optional[str] = None
+    tiers_mode: Optional[Literal["graduated", "volume"]] = None
+    tiers: Optional[List[PriceTier]] = None
 
     @validator('price_per_unit')
     def price_must_be_positive(cls, v):
@@ -29,10 +43,17 @@ class ProductCreate(BaseModel):
             raise ValueError('price_per_unit must be positive')
         return v
 
+    @validator('tiers', always=True)
+    def tiers_must_be_valid(cls, v, values):
+        return _check_tiers(v, values)
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     unit_name: Optional[str] = None
     price_per_unit: Optional[float] = None
+    # Both replace the tiers; "flat" switches back to price_per_unit
+    tiers_mode: Optional[Literal["graduated", "volume", "flat"]] = None
+    tiers: Optional[List[PriceTier]] = None
 
     @validator('price_per_unit')
     def price_must_be_positive(cls, v):
@@ -40,6 +61,14 @@ class ProductUpdate(BaseModel):
             raise ValueError('price_per_unit must be positive')
         return v
 
+    @validator('tiers', always=True)
+    def tiers_must_be_valid(cls, v, values):
+        if values.get('tiers_mode') == "flat":
+            if v:
+                raise ValueError('tiers cannot be given with tiers_mode flat')
+            return v
+        return _check_tiers(v, values)
+
 
 
 class ProductResponse(BaseModel):
@@ -55,6 +84,7 @@ class UsageTrack(BaseModel):
     product: str
     quantity: float
     idempotency_key: Optional[str] = None
+    lease_id: Optional[str] = None  # charge a credit lease instead of the balance
     
 class CreditTopUpRequest(BaseModel):
     customer_id: str
@@ -65,6 +95,49 @@ class CreditAdd(BaseModel):
     amount: float
     description: Optional[str] = None
 
+class CreditGrant(BaseModel):
+    customer_ids: List[str]
+    amount: float
+    description: Optional[str] = None
+
+    @validator('customer_ids')
+    def customer_ids_must_not_be_empty(cls, v):
+        if not v:
+            raise ValueError('customer_ids must not be empty')
+        return v
+
+    @validator('amount')
+    def amount_must_be_positive(cls, v):
+        if v <= 0:
+            raise ValueError('amount must be positive')
+        return v
+
+class CreditBalanceLookup(BaseModel):
+    customer_ids: List[str]
+
+    @validator('customer_ids')
+    def customer_ids_within_limit(cls, v):
+        if len(v) > settings.BALANCE_LOOKUP_MAX_IDS:
+            raise ValueError(f'at most {settings.BALANCE_LOOKUP_MAX_IDS} customer_ids per request')
+        return v
+
+class CreditLeaseCreate(BaseModel):
+    customer_id: str
+    amount: float
+    ttl_seconds: Optional[int] = None  # defaults to CREDIT_LEASE_DEFAULT_TTL_SECONDS
+
+    @validator('amount')
+    def amount_must_be_positive(cls, v):
+        if v <= 0:
+            raise ValueError('amount must be positive')
+        return v
+
+    @validator('ttl_seconds')
+    def ttl_within_limit(cls, v):
+        if v is not None and not 0 < v <= settings.CREDIT_LEASE_MAX_TTL_SECONDS:
+            raise ValueError(f'ttl_seconds must be between 1 and {settings.CREDIT_LEASE_MAX_TTL_SECONDS}')
+        return v
+
 class SubscriptionCreate(BaseModel):
     customer_id: str
     product_code: str
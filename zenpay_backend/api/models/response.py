@@ -23,6 +23,8 @@ class ProductResponse(BaseModel):
     code: str
     unit_name: str
     price_per_unit: float
+    tiers_mode: Optional[str] = None
+    price_tiers: Optional[List[Dict[str, Any]]] = None
     created_at: datetime
 
     class Config:
@@ -43,6 +45,28 @@ class CreditBalance(BaseModel):
     customer_id: str
     balance: float
 
+class CreditBalances(BaseModel):
+    balances: List[CreditBalance]
+    not_found: List[str] = []
+
+class CreditGrantResponse(BaseModel):
+    granted: int
+    amount: float
+    total: float
+
+class CreditLeaseResponse(BaseModel):
+    id: str
+    customer_id: str
+    amount: float
+    used: float
+    remaining: float
+    created_at: datetime
+    expires_at: datetime
+    settled_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class SubscriptionResponse(BaseModel):
     id: str
     customer_id: str
@@ -88,3 +112,35 @@ class CheckoutSessionResponse(BaseModel):
 
 class BillingPortalResponse(BaseModel):
     url: str
+
+class InvoiceLineResponse(BaseModel):
+    product: str
+    quantity: float
+    amount: float
+
+class InvoicePreviewResponse(BaseModel):
+    customer_id: str
+    period_start: datetime
+    period_end: datetime
+    lines: List[InvoiceLineResponse]
+    subtotal: float
+    prepaid: float
+    credit_balance: float
+    credits_applied: float
+    total: float
+
+class ImportJobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    total: int
+    processed: int
+    created: int
+    skipped: int
+    failed: int
+    errors: List[Dict[str, Any]] = []
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
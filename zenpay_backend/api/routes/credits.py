@@ -1,16 +1,27 @@
 # zenpay_backend/api/v1/credits.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, sessionmaker
 from typing import List
 
-from api.db.crud.credits import add_credits, use_credits, get_credit_balance, get_credit_transactions
+from api.db.crud.credits import (
+    add_credits, grant_credits, use_credits, get_credit_balance, get_credit_balances_micros,
+    get_credit_transactions, iter_credit_balances_micros,
+)
+from api.db.crud.credit_leases import create_credit_lease, get_credit_lease, release_credit_lease
 from api.db.crud.customers import get_customer
+from api.core.config import settings
+from api.core.http_cache import make_etag, is_not_modified, not_modified_response
 from api.db.session import get_db
 from api.dependencies import get_current_user_by_api_key
-from models.request import CreditAdd, CreditTopUpRequest
-from models.response import CreditTransactionResponse, CreditBalance
+from api.core.lanes import in_lane, INGEST, REPORTING
+from api.core.money import from_micros, to_micros
+from models.request import CreditAdd, CreditBalanceLookup, CreditGrant, CreditLeaseCreate, CreditTopUpRequest
+from models.response import CreditTransactionResponse, CreditBalance, CreditBalances, CreditGrantResponse, CreditLeaseResponse
 from api.db.models import User
-from core.exceptions import CustomerNotFoundError
+from core.exceptions import CustomerNotFoundError, CreditLeaseNotFoundError, InsufficientCreditsError
 
 router = APIRouter()
 
@@ -35,7 +46,27 @@ def add_customer_credits(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/grant", response_model=CreditGrantResponse)
+def grant_customer_credits(
+    grant_data: CreditGrant,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_by_api_key)
+):
+    """Add the same amount of credits to many customers at once; all or none are credited"""
+    try:
+        granted = grant_credits(
+            db=db,
+            user_id=current_user.id,
+            customer_ids=grant_data.customer_ids,
+            amount=grant_data.amount,
+            description=grant_data.description
+        )
+    except CustomerNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return CreditGrantResponse(granted=granted, amount=grant_data.amount, total=from_micros(granted * to_micros(grant_data.amount)))
+
 @router.post("/use", response_model=CreditTransactionResponse)
+@in_lane(INGEST)
 def use_customer_credits(
     credit_data: CreditAdd,
     db: Session = Depends(get_db),
@@ -58,9 +89,61 @@ def use_customer_credits(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/leases", response_model=CreditLeaseResponse, status_code=status.HTTP_201_CREATED)
+@in_lane(INGEST)
+def lease_customer_credits(
+    lease_data: CreditLeaseCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_by_api_key)
+):
+    """
+    Set credits aside for a short time; usage tracked with the lease's ID is
+    charged against it, and the unused rest returns to the balance on release
+    or expiry
+    """
+    try:
+        return create_credit_lease(
+            db=db,
+            user_id=current_user.id,
+            customer_id=lease_data.customer_id,
+            amount=lease_data.amount,
+            ttl_seconds=lease_data.ttl_seconds or settings.CREDIT_LEASE_DEFAULT_TTL_SECONDS
+        )
+    except CustomerNotFoundError:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    except InsufficientCreditsError as e:
+        raise HTTPException(status_code=402, detail=str(e))
+
+@router.get("/leases/{lease_id}", response_model=CreditLeaseResponse)
+def get_customer_credit_lease(
+    lease_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_by_api_key)
+):
+    """Amount, usage and expiry of a credit lease"""
+    lease = get_credit_lease(db, current_user.id, lease_id)
+    if not lease:
+        raise HTTPException(status_code=404, detail="Credit lease not found")
+    return lease
+
+@router.post("/leases/{lease_id}/release", response_model=CreditLeaseResponse)
+@in_lane(INGEST)
+def release_customer_credit_lease(
+    lease_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_by_api_key)
+):
+    """Return the unused rest of a credit lease to the balance"""
+    try:
+        return release_credit_lease(db, current_user.id, lease_id)
+    except CreditLeaseNotFoundError:
+        raise HTTPException(status_code=404, detail="Credit lease not found")
+
 @router.get("/balance/{customer_id}", response_model=CreditBalance)
 def get_customer_credit_balance(
     customer_id: str,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_by_api_key)
 ):
@@ -69,11 +152,57 @@ def get_customer_credit_balance(
     customer = get_customer(db, current_user.id, customer_id)
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
+
+    etag = make_etag(customer.credits_version)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
     
     balance = get_credit_balance(db, current_user.id, customer_id)
+    if etag:
+        response.headers["ETag"] = etag
     return CreditBalance(customer_id=customer_id, balance=balance)
 
+@router.post("/balances", response_model=CreditBalances)
+@in_lane(REPORTING)
+def get_customer_credit_balances(
+    lookup: CreditBalanceLookup,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_by_api_key)
+):
+    """Current credit balances of many customers; unknown IDs are listed in ``not_found``"""
+    balances = get_credit_balances_micros(db, current_user.id, lookup.customer_ids)
+    customer_ids = list(dict.fromkeys(lookup.customer_ids))
+    return CreditBalances(
+        balances=[
+            CreditBalance(customer_id=customer_id, balance=from_micros(balances[customer_id]))
+            for customer_id in customer_ids if customer_id in balances
+        ],
+        not_found=[customer_id for customer_id in customer_ids if customer_id not in balances],
+    )
+
+@router.get("/balances")
+@in_lane(REPORTING)
+def stream_customer_credit_balances(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_by_api_key)
+):
+    """Credit balance of every customer as newline-delimited JSON, ordered by customer ID"""
+    # The stream outlives the request's session; it opens its own on the same engine
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    user_id = current_user.id
+
+    def lines():
+        session = session_factory()
+        try:
+            for customer_id, balance in iter_credit_balances_micros(session, user_id):
+                yield json.dumps({"customer_id": customer_id, "balance": from_micros(balance)}) + "\n"
+        finally:
+            session.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.get("/transactions/{customer_id}", response_model=List[CreditTransactionResponse])
+@in_lane(REPORTING)
 def get_customer_credit_transactions(
     customer_id: str,
     skip: int = 0,
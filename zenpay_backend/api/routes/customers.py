@@ -1,24 +1,32 @@
 # zenpay_backend/api/v1/customers.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 from typing import List
 
 from api.db.crud.customers import (
     create_customer,
     get_customer,
-    get_customers,
+    get_customer_rows,
     delete_customer,
     update_customer,
+    CUSTOMER_FIELDS,
 )
+from api.core.serialization import rows_response
+from api.db.crud.import_jobs import get_import_job
 from api.db.session import get_db
-from dependencies import get_current_user_by_api_key
+from api.dependencies import get_current_user_by_api_key
+from api.core.lanes import in_lane, STRIPE, REPORTING
 from models.request import CustomerCreate, CustomerUpdate, CheckoutSessionCreate, BillingPortalCreate
-from models.response import CustomerResponse, CheckoutSessionResponse, BillingPortalResponse
+from models.response import CustomerResponse, CheckoutSessionResponse, BillingPortalResponse, ImportJobResponse
 from api.db.models import User
+from api.services.bulk_import import ImportFileError
+from api.services.customer_import import CustomerImport, IMPORT_KIND, start_customer_import
 
 router = APIRouter()
 
 @router.post("", response_model=CustomerResponse)
+@in_lane(STRIPE)
 def create_new_customer(
     customer: CustomerCreate,
     db: Session = Depends(get_db),
@@ -34,6 +42,43 @@ def create_new_customer(
     )
     return db_customer
 
+@router.post("/import", response_model=ImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def import_customers(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user_by_api_key),
+):
+    """
+    Import customers from JSON lines (one CustomerCreate object per line) or,
+    with ``Content-Type: text/csv``, CSV with id, name and email columns.
+    Runs in the background; poll ``GET /import/{job_id}`` for progress.
+    """
+    body = await request.body()
+    user_id = user.id
+    try:
+        job, records = await run_in_threadpool(
+            start_customer_import, db, user_id, body, request.headers.get("content-type")
+        )
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The import outlives this request's session; it opens its own on the same engine
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    background_tasks.add_task(CustomerImport().run, session_factory, user_id, job.id, records)
+    return job
+
+@router.get("/import/{job_id}", response_model=ImportJobResponse)
+def read_customer_import(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_by_api_key),
+):
+    """Progress and errors of a customer import"""
+    job = get_import_job(db, current_user.id, job_id)
+    if job is None or job.kind != IMPORT_KIND:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
 @router.get("/{customer_id}", response_model=CustomerResponse)
 def read_customer(
     customer_id: str,
@@ -47,6 +92,7 @@ def read_customer(
     return db_customer
 
 @router.get("", response_model=List[CustomerResponse])
+@in_lane(REPORTING)
 def read_customers(
     skip: int = 0,
     limit: int = 100,
@@ -54,10 +100,11 @@ def read_customers(
     current_user: User = Depends(get_current_user_by_api_key),
 ):
     """Get all customers for the current user"""
-    customers = get_customers(db=db, user_id=current_user.id, skip=skip, limit=limit)
-    return customers
+    rows = get_customer_rows(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    return rows_response(rows, CUSTOMER_FIELDS)
 
 @router.patch("/{customer_id}", response_model=CustomerResponse)
+@in_lane(STRIPE)
 def update_existing_customer(
     customer_id: str,
     customer: CustomerUpdate,
@@ -78,6 +125,7 @@ def update_existing_customer(
     return updated_customer
 
 @router.delete("/{customer_id}", status_code=status.HTTP_204_NO_CONTENT)
+@in_lane(STRIPE)
 def remove_customer(
     customer_id: str,
     db: Session = Depends(get_db),
@@ -90,6 +138,7 @@ def remove_customer(
     return None
 
 @router.post("/checkout-session", response_model=CheckoutSessionResponse)
+@in_lane(STRIPE)
 def create_customer_checkout_session(
     checkout_session: CheckoutSessionCreate,
     db: Session = Depends(get_db),
@@ -110,6 +159,7 @@ def create_customer_checkout_session(
     return {"url": session.url}
 
 @router.post("/billing-portal", response_model=BillingPortalResponse)
+@in_lane(STRIPE)
 def create_customer_billing_portal(
     billing_portal: BillingPortalCreate,
     db: Session = Depends(get_db),
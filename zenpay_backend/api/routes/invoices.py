@@ -0,0 +1,61 @@
+# zenpay_backend/routes/invoices.py
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+
+from api.core.lanes import in_lane, REPORTING
+from api.core.money import from_micros
+from api.db.crud.customers import get_customer
+from api.db.models import User
+from api.db.session import get_db
+from api.dependencies import get_current_user_by_api_key
+from api.services.invoice_preview import InvoicePreview, invoice_preview_cache
+from models.response import InvoiceLineResponse, InvoicePreviewResponse
+
+router = APIRouter()
+
+
+def _preview_response(preview: InvoicePreview) -> InvoicePreviewResponse:
+    return InvoicePreviewResponse(
+        customer_id=preview.customer_id,
+        period_start=preview.period_start,
+        period_end=preview.period_end,
+        lines=[
+            InvoiceLineResponse(product=line.product_code, quantity=line.quantity,
+                                amount=from_micros(line.amount_micros))
+            for line in preview.lines
+        ],
+        subtotal=from_micros(preview.subtotal_micros),
+        prepaid=from_micros(preview.prepaid_applied_micros),
+        credit_balance=from_micros(preview.credit_balance_micros),
+        credits_applied=from_micros(preview.credits_applied_micros),
+        total=from_micros(preview.total_micros),
+    )
+
+
+@router.get("/preview", response_model=List[InvoicePreviewResponse])
+@in_lane(REPORTING)
+def preview_invoices(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_by_api_key)
+):
+    """
+    Estimated invoices so far this billing period for every customer with
+    usage or credits
+    """
+    previews = invoice_preview_cache.previews(db, current_user.id)
+    return [_preview_response(preview) for preview in previews]
+
+
+@router.get("/preview/{customer_id}", response_model=InvoicePreviewResponse)
+@in_lane(REPORTING)
+def preview_customer_invoice(
+    customer_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_by_api_key)
+):
+    """Estimated invoice so far this billing period for one customer"""
+    if not get_customer(db, current_user.id, customer_id):
+        raise HTTPException(status_code=404, detail="Customer not found")
+    previews = invoice_preview_cache.previews(db, current_user.id, customer_id=customer_id)
+    return _preview_response(previews[0])
@@ -1,7 +1,8 @@
 # api/routes/products.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 from typing import List
 
 from api.db.models import Product, UsageEvent, User
@@ -9,20 +10,28 @@ from api.db.models import Product, UsageEvent, User
 from api.db.crud.products import (
     create_product,
     get_product_by_code,
-    get_products,
+    get_product_rows,
     delete_product,
     update_product,
+    PRODUCT_FIELDS,
 )
+from api.core.http_cache import make_etag, is_not_modified, not_modified_response
+from api.core.serialization import rows_response
+from api.db.crud.import_jobs import get_import_job
 from api.db.session import get_db
 from api.dependencies import get_current_user_by_api_key as get_current_user
+from api.core.lanes import in_lane, STRIPE, REPORTING
 from models.request import ProductCreate, ProductUpdate
-from models.response import ProductResponse
+from models.response import ProductResponse, ImportJobResponse
 from api.db.models import User
+from api.services.bulk_import import ImportFileError
+from api.services.product_import import ProductImport, IMPORT_KIND, start_product_import
 
 router = APIRouter()
 
 
 @router.post("/", response_model=ProductResponse)
+@in_lane(STRIPE)
 def create_new_product(
     product: ProductCreate,
     db: Session = Depends(get_db),
@@ -36,21 +45,72 @@ def create_new_product(
         code=product.code,
         unit_name=product.unit_name,
         price_per_unit=product.price_per_unit,
-        
+        tiers_mode=product.tiers_mode,
+        price_tiers=[tier.model_dump() for tier in product.tiers] if product.tiers else None,
     )
     return db_product
 
 
 @router.get("/", response_model=List[ProductResponse])
+@in_lane(REPORTING)
 def list_products(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     """List all products for the current user"""
-    products = get_products(db=db, user_id=current_user.id, skip=skip, limit=limit)
-    return products
+    etag = make_etag(current_user.products_version)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    rows = get_product_rows(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    response = rows_response(rows, PRODUCT_FIELDS)
+    if etag:
+        response.headers["ETag"] = etag
+    return response
+
+
+@router.post("/import", response_model=ImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def import_products(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Import a product catalog from JSON lines (one ProductCreate object per
+    line) or, with ``Content-Type: text/csv``, CSV with name, code,
+    unit_name, price_per_unit and optionally tiers_mode and tiers (JSON)
+    columns. Runs in the background; poll ``GET /import/{job_id}``. A
+    failed import can be sent again.
+    """
+    body = await request.body()
+    user_id = current_user.id
+    try:
+        job, records = await run_in_threadpool(
+            start_product_import, db, user_id, body, request.headers.get("content-type")
+        )
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The import outlives this request's session; it opens its own on the same engine
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    background_tasks.add_task(ProductImport().run, session_factory, user_id, job.id, records)
+    return job
+
+
+@router.get("/import/{job_id}", response_model=ImportJobResponse)
+def read_product_import(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Progress and errors of a product import"""
+    job = get_import_job(db, current_user.id, job_id)
+    if job is None or job.kind != IMPORT_KIND:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
@@ -74,18 +134,27 @@ def get_product(
 @router.get("/code/{product_code}", response_model=ProductResponse)
 def get_product_by_code_route(
     product_code: str,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
+    etag = make_etag(current_user.products_version)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
     product = get_product_by_code(db, current_user.id, product_code)
 
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
+    if etag:
+        response.headers["ETag"] = etag
     return product
 
 
 @router.patch("/{product_id}", response_model=ProductResponse)
+@in_lane(STRIPE)
 def update_existing_product(
     product_id: str,
     product_data: ProductUpdate,
@@ -99,6 +168,9 @@ def update_existing_product(
         name=product_data.name,
         unit_name=product_data.unit_name,
         price_per_unit=product_data.price_per_unit,
+        tiers_mode=product_data.tiers_mode if product_data.tiers_mode != "flat" else None,
+        price_tiers=[tier.model_dump() for tier in product_data.tiers] if product_data.tiers else None,
+        clear_tiers=product_data.tiers_mode == "flat",
     )
     if not updated_product:
         raise HTTPException(status_code=404, detail="Product not found")
@@ -106,6 +178,7 @@ def update_existing_product(
 
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+@in_lane(STRIPE)
 def delete_existing_product(
     product_id: str,
     db: Session = Depends(get_db),
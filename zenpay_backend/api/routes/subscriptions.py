@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 
 from api.db.session import get_db
 from api.dependencies import get_current_user_by_api_key
+from api.core.lanes import in_lane, STRIPE
 from api.db.models import User
 from api.models.request import SubscriptionCreate
 from api.db.crud.subscriptions import create_subscription
@@ -13,6 +14,7 @@ from api.models.response import CustomerResponse, ProductResponse # Assuming the
 router = APIRouter()
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
+@in_lane(STRIPE)
 def create_new_subscription(
     subscription_data: SubscriptionCreate,
     db: Session = Depends(get_db),
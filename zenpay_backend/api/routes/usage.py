@@ -1,4 +1,6 @@
 # zenpay_backend/routes/usage.py
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from datetime import datetime
@@ -6,19 +8,28 @@ from typing import List, Optional
 
 from api.db.session import get_db
 from api.dependencies import get_current_user_by_api_key
+from api.core.lanes import in_lane, INGEST, REPORTING
 from api.db.models import User
 from api.models.request import UsageTrack
 from models.response import UsageEventResponse
-from api.db.crud.usage import track_usage, get_usage_events, report_usage_to_stripe
-from api.db.crud.subscriptions import get_subscription_by_customer_and_product
-from core.exceptions import CustomerNotFoundError, ProductNotFoundError, InsufficientCreditsError
+from api.db.crud.usage import (
+    track_usage, get_usage_event_rows, report_usage_to_stripe, mark_usage_reported,
+    USAGE_EVENT_FIELDS, METER_EVENT_NAME, METER_VALUE_KEY,
+)
+from api.core.serialization import rows_response
+from api.db.crud.subscriptions import resolve_subscription
+from core.exceptions import (
+    CustomerNotFoundError, ProductNotFoundError, InsufficientCreditsError,
+    CreditLeaseNotFoundError, CreditLeaseExpiredError,
+)
 from api.db.crud.products import get_product_by_code
-from api.db.crud.customers import get_customer
 
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.post("/track", response_model=UsageEventResponse)
+@in_lane(INGEST)
 def record_usage(
     usage_data: UsageTrack,
     use_credits: bool = Query(True, description="Whether to deduct credits for this usage"),
@@ -29,63 +40,78 @@ def record_usage(
     """
     Track usage for a customer's product and optionally report to Stripe
     """
-    print(f"DEBUG: Received quantity in record_usage: {usage_data.quantity}")
+    logger.debug("Received quantity in record_usage: %s", usage_data.quantity)
+    # Read before track_usage commits, which expires the loaded user
+    user_id = current_user.id
     try:
         usage_event = track_usage(
             db=db,
-            user_id=current_user.id,
+            user_id=user_id,
             customer_id=usage_data.customer_id,
             product_code=usage_data.product,
             quantity=usage_data.quantity,
             idempotency_key=usage_data.idempotency_key,
-            use_customer_credits=use_credits
+            use_customer_credits=use_credits,
+            lease_id=usage_data.lease_id,
+            report_to_stripe=report_to_stripe
+        )
+        # Built before the commit below would expire the event
+        response = UsageEventResponse(
+            id=usage_event.id,
+            customer_id=usage_event.customer_id,
+            product=usage_event.product.code,
+            quantity=usage_event.quantity,
+            timestamp=usage_event.timestamp
         )
 
         if report_to_stripe:
-            customer = get_customer(db, current_user.id, usage_data.customer_id)
-            if not customer or not customer.stripe_customer_id:
+            # Served from the subscription cache; no extra reads when warm
+            subscription = resolve_subscription(
+                db=db,
+                user_id=user_id,
+                customer_id=response.customer_id,
+                product_id=usage_event.product_id
+            )
+            if not subscription or not subscription.stripe_customer_id:
                 raise HTTPException(
                     status_code=400,
                     detail="Customer not found or missing Stripe ID. Cannot report usage to Stripe."
                 )
-            subscription = get_subscription_by_customer_and_product(
-                db=db,
-                user_id=current_user.id,
-                customer_id=usage_event.customer_id,
-                product_id=usage_event.product_id
-            )
-            if not subscription:
+            if not subscription.active:
                 raise HTTPException(
                     status_code=400,
                     detail="No active subscription found for this customer and product. Cannot report usage to Stripe."
                 )
             report_usage_to_stripe(
-                stripe_customer_id=customer.stripe_customer_id,
-                quantity=usage_event.quantity,
-                event_name="zenpay_tokens",
-                quantity_payload_key="value",
-                timestamp=usage_event.timestamp
+                stripe_customer_id=subscription.stripe_customer_id,
+                quantity=response.quantity,
+                event_name=METER_EVENT_NAME,
+                quantity_payload_key=METER_VALUE_KEY,
+                timestamp=response.timestamp,
+                identifier=response.id
             )
-        print(f"DEBUG: Quantity from usage_event before reporting to Stripe: {usage_event.quantity}")
+            # Events left unflagged are picked up by python -m api.services.usage_reporting
+            mark_usage_reported(db, [response.id])
+            db.commit()
+        logger.debug("Tracked usage event %s with quantity %s", response.id, response.quantity)
 
-        return UsageEventResponse(
-            id=usage_event.id,
-            customer_id=usage_event.customer_id,
-            product=usage_event.product.code,
-            quantity=usage_event.quantity,
-            timestamp=usage_event.timestamp
-        )
+        return response
 
     except CustomerNotFoundError:
         raise HTTPException(status_code=404, detail="Customer not found")
     except ProductNotFoundError:
         raise HTTPException(status_code=404, detail="Product not found")
+    except CreditLeaseNotFoundError:
+        raise HTTPException(status_code=404, detail="Credit lease not found")
+    except CreditLeaseExpiredError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except InsufficientCreditsError as e:
         raise HTTPException(status_code=402, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/events", response_model=List[UsageEventResponse])
+@in_lane(REPORTING)
 def get_usage_records(
     customer_id: Optional[str] = None,
     product_code: Optional[str] = None,
@@ -109,8 +135,9 @@ def get_usage_records(
         else:
             raise HTTPException(status_code=404, detail=f"Product {product_code} not found")
     
-    # Get usage events
-    events = get_usage_events(
+    # Get usage events as tuples and serialize them directly; the rows
+    # already have the response_model's shape
+    rows = get_usage_event_rows(
         db=db,
         user_id=current_user.id,
         customer_id=customer_id,
@@ -120,14 +147,4 @@ def get_usage_records(
         skip=skip,
         limit=limit
     )
-    
-    # Convert to response models
-    return [
-        UsageEventResponse(
-            id=event.id,
-            customer_id=event.customer_id,
-            product=event.product.code,  # Use product code in response
-            quantity=event.quantity,
-            timestamp=event.timestamp
-        ) for event in events
-    ]
\ No newline at end of file
+    return rows_response(rows, USAGE_EVENT_FIELDS)
@@ -8,6 +8,7 @@ import logging
 from api.db.session import get_db
 from api.db.crud.customers import create_customer, delete_customer
 from api.db.crud.products import create_product, delete_product, update_product
+from api.db.crud.subscriptions import sync_subscription_from_stripe
 from api.db.models import User # Assuming User model is needed for context
 
 router = APIRouter()
@@ -92,6 +93,12 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
             delete_product(db=db, user_id=user_id, product_id=data['id'])
             logger.info(f"Product {data['id']} deleted.")
 
+        elif event_type.startswith('customer.subscription.'):
+            # created / updated / deleted / paused / resumed all carry the
+            # full subscription with its current status
+            synced = sync_subscription_from_stripe(db=db, stripe_subscription=data)
+            logger.info(f"Subscription {data['id']} synced ({len(synced)} items, status {data['status']}).")
+
         # Add more event types as needed (e.g., invoice.paid, checkout.session.completed)
 
     except Exception as e:
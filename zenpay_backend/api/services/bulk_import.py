@@ -0,0 +1,137 @@
+# zenpay_backend/services/bulk_import.py
+"""
+Shared parts of the bulk import endpoints.
+
+An import file is either JSON lines (one object per line) or CSV with a
+header row. ``parse_records`` turns it into ``(line, record)`` pairs and
+per-line errors. A record that fails ``model`` validation is rejected
+there and does not stop the rest of the file.
+
+The upload request only parses the file and creates an ``ImportJob``. The
+rows are imported after the response is sent, by a run that opens its own
+session and records progress on the job after every chunk.
+"""
+import csv
+import io
+import json
+import logging
+from typing import Callable, List, Optional, Sequence, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from api.db.crud.import_jobs import get_import_job, record_import_progress
+
+logger = logging.getLogger(__name__)
+
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+
+
+class ImportFileError(ValueError):
+    """The file as a whole cannot be imported"""
+
+
+def import_error(line: int, record_id: Optional[str], message: str) -> dict:
+    return {"line": line, "id": record_id, "error": message}
+
+
+def _csv_records(text: str, key: str, json_fields: Sequence[str]) -> Tuple[List[Tuple[int, dict]], List[dict]]:
+    reader = csv.DictReader(io.StringIO(text))
+    records, errors = [], []
+    for row in reader:
+        # Empty cells are treated as missing
+        record = {key: value for key, value in row.items() if key and value not in ("", None)}
+        try:
+            for name in json_fields:
+                if name in record:
+                    record[name] = json.loads(record[name])
+        except json.JSONDecodeError as e:
+            errors.append(import_error(reader.line_num, record.get(key), f"{name}: invalid JSON: {e.msg}"))
+            continue
+        records.append((reader.line_num, record))
+    return records, errors
+
+
+def parse_records(
+    body: bytes,
+    content_type: Optional[str],
+    model: Type[BaseModel],
+    key: str,
+    max_rows: int,
+    json_fields: Sequence[str] = (),
+) -> Tuple[List[Tuple[int, BaseModel]], List[dict]]:
+    """
+    ``([(line, validated record)], [error])`` of an import file; a record
+    whose ``key`` field repeats an earlier line's is rejected as a duplicate.
+    CSV cells of ``json_fields`` hold JSON (e.g. a metadata object).
+    """
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFileError("file must be UTF-8")
+
+    errors: List[dict] = []
+    raw: List[Tuple[int, object]] = []
+    if (content_type or "").split(";")[0].strip().lower() in CSV_CONTENT_TYPES:
+        try:
+            raw, errors = _csv_records(text, key, json_fields)
+        except csv.Error as e:
+            raise ImportFileError(f"invalid CSV: {e}")
+    else:
+        for line, content in enumerate(text.splitlines(), start=1):
+            if not content.strip():
+                continue
+            try:
+                raw.append((line, json.loads(content)))
+            except json.JSONDecodeError as e:
+                errors.append(import_error(line, None, f"invalid JSON: {e.msg}"))
+    if len(raw) + len(errors) > max_rows:
+        raise ImportFileError(f"at most {max_rows} rows per import")
+
+    records: List[Tuple[int, BaseModel]] = []
+    seen = set()
+    for line, data in raw:
+        record_id = data.get(key) if isinstance(data, dict) else None
+        try:
+            record = model.model_validate(data)
+        except ValidationError as e:
+            first = e.errors()[0]
+            field = ".".join(str(part) for part in first["loc"])
+            errors.append(import_error(line, record_id, f"{field}: {first['msg']}" if field else first["msg"]))
+            continue
+        if record_id in seen:
+            errors.append(import_error(line, record_id, "duplicate of an earlier line"))
+            continue
+        seen.add(record_id)
+        records.append((line, record))
+    errors.sort(key=lambda error: error["line"])
+    return records, errors
+
+
+def run_import_job(
+    session_factory: Callable,
+    user_id: str,
+    job_id: str,
+    import_chunk: Callable,
+    records: List[Tuple[int, BaseModel]],
+    chunk_size: int,
+) -> None:
+    """
+    Import ``records`` chunk by chunk with ``import_chunk(db, user_id,
+    chunk) -> (created, skipped, errors)``, recording progress on the job
+    """
+    db = session_factory()
+    try:
+        job = get_import_job(db, user_id, job_id)
+        record_import_progress(db, job, status="running")
+        for i in range(0, len(records), chunk_size):
+            created, skipped, errors = import_chunk(db, user_id, records[i:i + chunk_size])
+            record_import_progress(db, job, created=created, skipped=skipped, errors=errors)
+        record_import_progress(db, job, status="completed")
+    except Exception:
+        logger.exception("Import job %s failed", job_id)
+        db.rollback()
+        job = get_import_job(db, user_id, job_id)
+        if job is not None:
+            record_import_progress(db, job, status="failed")
+    finally:
+        db.close()
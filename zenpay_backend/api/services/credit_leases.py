@@ -0,0 +1,56 @@
+# zenpay_backend/services/credit_leases.py
+"""
+Settlement of credit leases that expired without being released.
+
+Until a lease is settled its unused credits stay debited, so this job runs
+every few minutes (cron or a scheduler):
+
+    python -m api.services.credit_leases [--batch-size 500]
+
+Leases are settled in batches, one commit per batch, oldest expiry first.
+Taking a new lease settles the customer's own expired leases as well, so
+the job only matters for customers who stop calling.
+"""
+import argparse
+import logging
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from api.db.crud.credit_leases import settle_expired_credit_leases
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+
+def settle_expired_leases(db: Session, batch_size: int = BATCH_SIZE) -> int:
+    """Settle every lease expired by now; return how many"""
+    now = datetime.utcnow()
+    settled = 0
+    while True:
+        batch = settle_expired_credit_leases(db, now, limit=batch_size)
+        db.commit()
+        settled += batch
+        if batch < batch_size:
+            return settled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Settle credit leases that expired unreleased")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="leases per commit")
+    args = parser.parse_args()
+
+    from api.db.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        settled = settle_expired_leases(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    logger.info("Settled %d expired credit leases", settled)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# zenpay_backend/services/customer_import.py
+"""
+Bulk customer import (``POST /api/v1/customers/import``).
+
+Each chunk of the file costs one query for the IDs that already exist, then
+creates the new customers in Stripe from a bounded pool of threads and
+inserts the local rows with one executemany. Stripe calls share a token
+bucket and are retried with backoff like the usage backfill.
+
+Customers of the tenant that already exist are skipped, so a failed or
+interrupted import can be sent again. The Stripe idempotency key is derived
+from the customer ID, so a customer created in Stripe just before an
+interruption is not created twice (Stripe keeps keys for 24 hours).
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.core.config import settings
+from api.db.crud.customers import get_customer_owners, insert_customers
+from api.db.crud.import_jobs import create_import_job
+from api.db.models import ImportJob
+from api.models.request import CustomerCreate
+from api.services.bulk_import import import_error, parse_records, run_import_job
+from api.services.stripe_service import create_stripe_customer
+from api.services.usage_reporting import MAX_RETRIES, StripeCallFailed, StripeThrottle
+
+IMPORT_KIND = "customers"
+
+Record = Tuple[int, CustomerCreate]
+
+
+def start_customer_import(
+    db: Session, user_id: str, body: bytes, content_type: Optional[str]
+) -> Tuple[ImportJob, List[Record]]:
+    """Parse the file and create its job; raises ImportFileError for unusable files"""
+    records, errors = parse_records(
+        body, content_type, CustomerCreate, "id", settings.IMPORT_MAX_ROWS, json_fields=("metadata",)
+    )
+    job = create_import_job(db, user_id, IMPORT_KIND, len(records) + len(errors), errors)
+    return job, records
+
+
+class CustomerImport:
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        rate: Optional[float] = None,
+        chunk_size: Optional[int] = None,
+        max_retries: int = MAX_RETRIES,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        """Unset sizes come from the IMPORT_* settings"""
+        self.workers = workers or settings.IMPORT_STRIPE_WORKERS
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        rate = settings.IMPORT_STRIPE_RATE if rate is None else rate
+        self._throttle = StripeThrottle(rate, max_retries, clock, sleep)
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def run(self, session_factory: Callable, user_id: str, job_id: str, records: List[Record]) -> None:
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="customer-import") as pool:
+            self._pool = pool
+            run_import_job(session_factory, user_id, job_id, self.import_chunk, records, self.chunk_size)
+
+    def _provision(self, user_id: str, record: CustomerCreate) -> Tuple[Optional[str], Optional[str]]:
+        """``(stripe_customer_id, None)`` or ``(None, error)``"""
+        try:
+            stripe_customer, _ = self._throttle.call(
+                create_stripe_customer,
+                name=record.name,
+                email=record.email,
+                metadata={"user_id": user_id, "customer_id": record.id},
+                idempotency_key=f"customer-import:{user_id}:{record.id}",
+            )
+            return stripe_customer.id, None
+        except StripeCallFailed as e:
+            return None, f"Stripe: {e.error}"
+
+    def import_chunk(self, db: Session, user_id: str, chunk: List[Record]) -> Tuple[int, int, List[dict]]:
+        """Import one chunk; returns ``(created, skipped, errors)``"""
+        owners = get_customer_owners(db, [record.id for _, record in chunk])
+        skipped, errors, new = 0, [], []
+        for line, record in chunk:
+            owner = owners.get(record.id)
+            if owner == user_id:
+                skipped += 1
+            elif owner is not None:
+                errors.append(import_error(line, record.id, "customer ID is already in use"))
+            else:
+                new.append((line, record))
+
+        provisioned = self._pool.map(lambda item: self._provision(user_id, item[1]), new)
+        rows = []
+        for (line, record), (stripe_customer_id, error) in zip(new, provisioned):
+            if error is not None:
+                errors.append(import_error(line, record.id, error))
+                continue
+            rows.append(dict(
+                id=record.id, user_id=user_id, name=record.name, email=record.email,
+                metadata_json=record.metadata, stripe_customer_id=stripe_customer_id,
+            ))
+
+        try:
+            insert_customers(db, rows)
+            db.commit()
+        except IntegrityError:
+            # Another request created some of the IDs meanwhile; insert the rest
+            db.rollback()
+            taken = get_customer_owners(db, [row["id"] for row in rows])
+            remaining = [row for row in rows if row["id"] not in taken]
+            skipped += sum(1 for row in rows if taken.get(row["id"]) == user_id)
+            errors.extend(
+                import_error(line, record.id, "customer ID is already in use")
+                for line, record in new if taken.get(record.id) not in (None, user_id)
+            )
+            insert_customers(db, remaining)
+            db.commit()
+            rows = remaining
+        return len(rows), skipped, sorted(errors, key=lambda error: error["line"])
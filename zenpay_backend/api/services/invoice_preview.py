@@ -0,0 +1,207 @@
+# zenpay_backend/services/invoice_preview.py
+"""
+Estimated invoices for the current billing period, for one customer or for
+every customer of a tenant at once, without Stripe's upcoming-invoice API.
+
+A preview prices each customer's period-to-date quantity of each product at
+the product's current price (tiers included), the way Stripe prices a
+metered period total. Usage tracked with credits was already paid when it
+was tracked: the period's ``usage`` debits and what was charged to credit
+leases taken in the period are subtracted as ``prepaid``. The customer's
+remaining credit balance is then applied to the rest.
+
+The inputs are grouped queries: usage quantities per customer and product
+(``crud.usage.get_usage_totals``), credit balances and usage debits per
+customer (``crud.credits.get_credit_balance_changes``) and lease usage per
+customer (``crud.credit_leases.get_lease_usage``). ``InvoicePreviewCache``
+keeps the usage, balance and debit sums per tenant and billing period and,
+on later requests, only adds the rows written since the last one. Lease
+counters keep moving while a lease is open, so lease usage is read on every
+request. Rows newer than
+``INVOICE_PREVIEW_SETTLE_SECONDS`` are read on every request and never
+cached, so a transaction that commits late with an earlier timestamp is
+still counted. Pricing runs per product over all of its customers at once
+(``TierTable.costs``, int64 arrays when numpy is installed); prices are not
+cached, so a price change shows up immediately.
+
+Every worker process has its own cache, so the first request of a tenant
+and period in each process scans the period so far.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from api.core.config import settings
+from api.db.crud.credit_leases import get_lease_usage
+from api.db.crud.credits import get_credit_balance_changes
+from api.db.crud.products import get_products_by_ids
+from api.db.crud.usage import get_usage_totals
+from api.services.pricing import period_end, period_start, product_tier_table
+
+
+@dataclass
+class InvoiceLine:
+    product_id: str
+    product_code: str
+    quantity: float
+    amount_micros: int
+
+
+@dataclass
+class InvoicePreview:
+    customer_id: str
+    period_start: datetime
+    period_end: datetime
+    lines: List[InvoiceLine] = field(default_factory=list)
+    credit_balance_micros: int = 0
+    # Credits already debited for this period's usage, directly or from leases
+    prepaid_micros: int = 0
+
+    @property
+    def subtotal_micros(self) -> int:
+        return sum(line.amount_micros for line in self.lines)
+
+    @property
+    def prepaid_applied_micros(self) -> int:
+        return max(0, min(self.prepaid_micros, self.subtotal_micros))
+
+    @property
+    def credits_applied_micros(self) -> int:
+        return max(0, min(self.credit_balance_micros, self.subtotal_micros - self.prepaid_applied_micros))
+
+    @property
+    def total_micros(self) -> int:
+        return self.subtotal_micros - self.prepaid_applied_micros - self.credits_applied_micros
+
+
+class _PeriodTotals:
+    """Usage, credit and usage debit sums of one tenant, complete up to ``watermark``"""
+    __slots__ = ("watermark", "usage", "credits", "debits", "lock")
+
+    def __init__(self):
+        self.watermark: Optional[datetime] = None  # nothing loaded yet
+        self.usage: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.credits: Dict[str, int] = defaultdict(int)
+        self.debits: Dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, usage_rows: Iterable[tuple], credit_rows: Iterable[tuple], debit_rows: Iterable[tuple]) -> None:
+        for customer_id, product_id, quantity in usage_rows:
+            self.usage[customer_id, product_id] += quantity or 0
+        for customer_id, micros in credit_rows:
+            self.credits[customer_id] += int(micros or 0)
+        for customer_id, micros in debit_rows:
+            self.debits[customer_id] -= int(micros or 0)
+
+
+class InvoicePreviewCache:
+    def __init__(self, settle_seconds: float, max_tenants: int, now=datetime.utcnow):
+        self.settle = timedelta(seconds=settle_seconds)
+        self.max_tenants = max_tenants
+        self._now = now
+        self._entries: "OrderedDict[Tuple[str, datetime], _PeriodTotals]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, user_id: str, start: datetime) -> _PeriodTotals:
+        with self._lock:
+            entry = self._entries.get((user_id, start))
+            if entry is not None:
+                self._entries.move_to_end((user_id, start))
+                return entry
+            entry = self._entries[user_id, start] = _PeriodTotals()
+            while len(self._entries) > self.max_tenants:
+                self._entries.popitem(last=False)
+            return entry
+
+    def previews(self, db: Session, user_id: str, customer_id: Optional[str] = None) -> List[InvoicePreview]:
+        """
+        Previews of the current period for every customer of ``user_id`` with
+        usage or credits (or just ``customer_id``), ordered by customer ID
+        """
+        now = self._now()
+        start, end = period_start(now), period_end(now)
+        cutoff = max(start, now - self.settle)
+        entry = self._entry(user_id, start)
+
+        with entry.lock:
+            if entry.watermark is None or cutoff > entry.watermark:
+                entry.add(
+                    get_usage_totals(db, user_id, entry.watermark or start, cutoff),
+                    # Balances span all periods, so the first load reads them all
+                    get_credit_balance_changes(db, user_id, start=entry.watermark, end=cutoff),
+                    get_credit_balance_changes(db, user_id, start=entry.watermark or start, end=cutoff,
+                                               transaction_type="usage"),
+                )
+                entry.watermark = cutoff
+            usage = dict(entry.usage)
+            credits = dict(entry.credits)
+            prepaid = dict(entry.debits)
+
+        # Not yet settled: read on every request, never cached
+        for customer, product, quantity in get_usage_totals(db, user_id, cutoff, end, customer_id):
+            usage[customer, product] = usage.get((customer, product), 0) + (quantity or 0)
+        for customer, micros in get_credit_balance_changes(db, user_id, start=cutoff, customer_id=customer_id):
+            credits[customer] = credits.get(customer, 0) + int(micros or 0)
+        for customer, micros in get_credit_balance_changes(
+            db, user_id, start=cutoff, end=end, customer_id=customer_id, transaction_type="usage"
+        ):
+            prepaid[customer] = prepaid.get(customer, 0) - int(micros or 0)
+        for customer, micros in get_lease_usage(db, user_id, start, end, customer_id):
+            prepaid[customer] = prepaid.get(customer, 0) + int(micros or 0)
+
+        if customer_id is not None:
+            usage = {key: quantity for key, quantity in usage.items() if key[0] == customer_id}
+            credits = {customer_id: credits.get(customer_id, 0)}
+            prepaid = {customer_id: prepaid.get(customer_id, 0)}
+        return price_previews(db, user_id, start, end, usage, credits, prepaid)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def price_previews(
+    db: Session,
+    user_id: str,
+    start: datetime,
+    end: datetime,
+    usage: Dict[Tuple[str, str], float],
+    credits: Dict[str, int],
+    prepaid: Optional[Dict[str, int]] = None,
+) -> List[InvoicePreview]:
+    """Price period usage totals per product, over all customers at once"""
+    by_product: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+    for (customer_id, product_id), quantity in usage.items():
+        by_product[product_id].append((customer_id, quantity))
+
+    previews: Dict[str, InvoicePreview] = {}
+
+    def preview(customer_id: str) -> InvoicePreview:
+        found = previews.get(customer_id)
+        if found is None:
+            found = previews[customer_id] = InvoicePreview(customer_id, start, end)
+        return found
+
+    for product in get_products_by_ids(db, user_id, by_product):
+        customers = by_product[product.id]
+        amounts = product_tier_table(product).costs([quantity for _, quantity in customers])
+        for (customer_id, quantity), amount in zip(customers, amounts):
+            preview(customer_id).lines.append(InvoiceLine(product.id, product.code, quantity, int(amount)))
+
+    for customer_id, micros in credits.items():
+        preview(customer_id).credit_balance_micros = micros
+    for customer_id, micros in (prepaid or {}).items():
+        if micros:
+            preview(customer_id).prepaid_micros = micros
+    for found in previews.values():
+        found.lines.sort(key=lambda line: line.product_code)
+    return [previews[customer_id] for customer_id in sorted(previews)]
+
+
+invoice_preview_cache = InvoicePreviewCache(
+    settings.INVOICE_PREVIEW_SETTLE_SECONDS, settings.INVOICE_PREVIEW_MAX_TENANTS
+)
@@ -0,0 +1,107 @@
+# zenpay_backend/services/price_index.py
+"""
+In-memory as-of lookup over product price history.
+
+Re-rating historical usage needs the price that was in effect when each
+event happened. ``PriceIndex`` loads the history once and keeps, per
+product, the effective-from times in a sorted list next to the prices, so
+each lookup is a binary search with no query:
+
+    index = PriceIndex.load(db, user_id=user_id)
+    for product_id, quantity, timestamp in events:
+        cost_micros, version = index.rate(product_id, quantity, timestamp)
+"""
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from api.db.crud.prices import get_price_history_rows
+from api.services.pricing import TierTable, tier_table
+
+
+class PricePoint(NamedTuple):
+    effective_from: datetime
+    price_micros: int
+    version: int
+    tiers: Optional[TierTable] = None
+
+
+class _ProductPrices:
+    __slots__ = ("times", "points")
+
+    def __init__(self):
+        self.times: List[datetime] = []
+        self.points: List[PricePoint] = []
+
+
+class PriceIndex:
+    def __init__(self, rows: Iterable[tuple] = ()):
+        """
+        ``rows`` of ``(product_id, effective_from, price_micros, version[,
+        tiers_mode, price_tiers])``, in any order
+        """
+        self._products: Dict[str, _ProductPrices] = {}
+        for row in rows:
+            self.add(*row)
+
+    @classmethod
+    def load(cls, db: Session, user_id: Optional[str] = None, product_ids: Optional[Iterable[str]] = None) -> "PriceIndex":
+        """Build the index from one query"""
+        return cls(get_price_history_rows(db, user_id=user_id, product_ids=product_ids))
+
+    def add(
+        self,
+        product_id: str,
+        effective_from: datetime,
+        price_micros: int,
+        version: int,
+        tiers_mode: Optional[str] = None,
+        price_tiers: Optional[list] = None,
+    ) -> None:
+        prices = self._products.get(product_id)
+        if prices is None:
+            prices = self._products[product_id] = _ProductPrices()
+        tiers = tier_table(price_micros, tiers_mode, price_tiers) if tiers_mode else None
+        point = PricePoint(effective_from, price_micros, version, tiers)
+        if not prices.times or effective_from >= prices.times[-1]:
+            # History comes sorted from the database, so this is the usual case
+            prices.times.append(effective_from)
+            prices.points.append(point)
+        else:
+            position = bisect_right(prices.times, effective_from)
+            prices.times.insert(position, effective_from)
+            prices.points.insert(position, point)
+
+    def price_at(self, product_id: str, when: datetime) -> Optional[PricePoint]:
+        """The price in effect at ``when``, or None before the product's first price"""
+        prices = self._products.get(product_id)
+        if prices is None:
+            return None
+        position = bisect_right(prices.times, when)
+        if position == 0:
+            return None
+        return prices.points[position - 1]
+
+    def rate(
+        self, product_id: str, quantity: float, when: datetime, period_to_date: float = 0
+    ) -> Tuple[Optional[int], Optional[int]]:
+        """
+        ``(cost in micro-dollars, price version)`` of usage at ``when``,
+        after ``period_to_date`` units in the billing period (only tiered
+        prices depend on it);
+        ``(None, None)`` if no price applies
+        """
+        point = self.price_at(product_id, when)
+        if point is None:
+            return None, None
+        if point.tiers is not None:
+            return point.tiers.rate(period_to_date, quantity), point.version
+        return round(quantity * point.price_micros), point.version
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._products
+
+    def __len__(self) -> int:
+        return len(self._products)
@@ -0,0 +1,159 @@
+# zenpay_backend/services/pricing.py
+"""
+Graduated and volume tier pricing.
+
+Tiers are given like Stripe's: a list of ``{"up_to", "unit_amount",
+"flat_amount"}`` sorted by ``up_to``, the last one with ``up_to`` None
+(unbounded), amounts in dollars. ``TierTable`` turns them into sorted
+boundary arrays and integer micro-dollar amounts (see api.core.money) plus,
+for graduated pricing, the cumulative cost at each boundary, so the cost of
+any period total is one binary search and a multiply, exact for whole
+quantities:
+
+* graduated: each unit is charged at the tier it falls in, and the flat
+  amount of every tier reached is added;
+* volume: all units are charged at the tier the total falls in, plus that
+  tier's flat amount.
+
+Rating an event is the difference between the cost of the period total
+after it and before it. With volume pricing that difference is negative
+when an event moves the total into a cheaper tier.
+
+``rate_batch`` rates many events at once and uses numpy (int64 arrays) when
+installed. Costs are returned in micro-dollars.
+"""
+from bisect import bisect_left
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional, Sequence
+
+from api.core.money import MICROS, to_micros
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional speedup
+    numpy = None
+
+GRADUATED = "graduated"
+VOLUME = "volume"
+TIERS_MODES = (GRADUATED, VOLUME)
+
+INFINITY = float("inf")
+
+
+def validate_tiers(mode: Optional[str], tiers: Optional[Sequence[dict]]) -> None:
+    """Raise ValueError unless ``mode`` and ``tiers`` describe a usable tier table"""
+    if mode is None and not tiers:
+        return
+    if mode not in TIERS_MODES:
+        raise ValueError(f"tiers_mode must be one of {', '.join(TIERS_MODES)}")
+    if not tiers:
+        raise ValueError("tiers are required with tiers_mode")
+    bounds = [tier.get("up_to") for tier in tiers]
+    if bounds[-1] is not None:
+        raise ValueError("the last tier must have up_to null")
+    finite = bounds[:-1]
+    if any(bound is None or bound <= 0 for bound in finite) or finite != sorted(set(finite)):
+        raise ValueError("up_to must be positive and increasing")
+    for tier in tiers:
+        if (tier.get("unit_amount") or 0) < 0 or (tier.get("flat_amount") or 0) < 0:
+            raise ValueError("tier amounts must not be negative")
+
+
+class TierTable:
+    __slots__ = ("mode", "upper", "lower", "unit", "flat", "base")
+
+    def __init__(self, mode: str, tiers: Sequence[dict]):
+        validate_tiers(mode, tiers)
+        self.mode = mode
+        self.upper: List[float] = [INFINITY if t.get("up_to") is None else int(t["up_to"]) for t in tiers]
+        self.lower: List[int] = [0] + self.upper[:-1]
+        # Micro-dollars
+        self.unit: List[int] = [to_micros(t.get("unit_amount") or 0) for t in tiers]
+        self.flat: List[int] = [to_micros(t.get("flat_amount") or 0) for t in tiers]
+        # Graduated: cost of filling every tier below i completely
+        self.base: List[int] = [0]
+        for i in range(len(tiers) - 1):
+            self.base.append(self.base[i] + (self.upper[i] - self.lower[i]) * self.unit[i] + self.flat[i])
+
+    @classmethod
+    def flat_rate(cls, price_micros: int) -> "TierTable":
+        return cls(GRADUATED, [{"up_to": None, "unit_amount": Decimal(price_micros) / MICROS}])
+
+    def cost(self, total: float) -> int:
+        """Charge in micro-dollars for a period total of ``total`` units"""
+        if total <= 0:
+            return 0
+        i = bisect_left(self.upper, total)
+        if self.mode == VOLUME:
+            return round(total * self.unit[i]) + self.flat[i]
+        return self.base[i] + self.flat[i] + round((total - self.lower[i]) * self.unit[i])
+
+    def rate(self, period_to_date: float, quantity: float) -> int:
+        """Cost of ``quantity`` more units after ``period_to_date`` units this period"""
+        return self.cost(period_to_date + quantity) - self.cost(period_to_date)
+
+    def costs(self, totals: Sequence[float]) -> List[int]:
+        """``cost`` of each total"""
+        if numpy is None:
+            return [self.cost(total) for total in totals]
+        totals = numpy.asarray(totals)
+        whole = totals.dtype.kind in "iub"
+        if whole:
+            totals = totals.astype(numpy.int64)
+        i = numpy.searchsorted(numpy.asarray(self.upper, dtype=float), totals, side="left")
+        unit = numpy.asarray(self.unit, dtype=numpy.int64)[i]
+        charged = numpy.asarray(self.flat, dtype=numpy.int64)[i]
+        if self.mode == VOLUME:
+            variable = totals * unit
+        else:
+            charged = charged + numpy.asarray(self.base, dtype=numpy.int64)[i]
+            variable = (totals - numpy.asarray(self.lower, dtype=numpy.int64)[i]) * unit
+        if not whole:
+            variable = numpy.rint(variable).astype(numpy.int64)
+        return numpy.where(totals > 0, charged + variable, 0).tolist()
+
+    def rate_batch(self, quantities: Sequence[float], period_to_date: float = 0) -> List[int]:
+        """
+        Rate consecutive events of one customer and product, starting from
+        ``period_to_date`` units already used in the period
+        """
+        totals = [period_to_date]
+        for quantity in quantities:
+            totals.append(totals[-1] + quantity)
+        costs = self.costs(totals)
+        return [after - before for before, after in zip(costs, costs[1:])]
+
+
+def tier_table(price_micros: Optional[int], tiers_mode: Optional[str], tiers: Optional[Sequence[dict]]) -> TierTable:
+    """The table for a product's (or price history entry's) pricing columns"""
+    if tiers_mode:
+        return TierTable(tiers_mode, tiers)
+    return TierTable.flat_rate(price_micros or 0)
+
+
+_product_tables = {}
+_PRODUCT_TABLES_MAX = 10000
+
+
+def product_tier_table(product) -> TierTable:
+    """``tier_table`` of a Product, cached per product and price version"""
+    key = (product.id, product.price_version)
+    table = _product_tables.get(key)
+    if table is None:
+        if len(_product_tables) >= _PRODUCT_TABLES_MAX:
+            _product_tables.clear()
+        table = _product_tables[key] = tier_table(product.price_micros, product.tiers_mode, product.price_tiers)
+    return table
+
+
+def period_start(when: datetime) -> datetime:
+    """Start of the billing period containing ``when``; periods are calendar months (UTC)"""
+    return datetime(when.year, when.month, 1)
+
+
+def period_end(when: datetime) -> datetime:
+    """End (exclusive) of the billing period containing ``when``"""
+    if when.month == 12:
+        return datetime(when.year + 1, 1, 1)
+    return datetime(when.year, when.month + 1, 1)
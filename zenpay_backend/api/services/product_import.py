@@ -0,0 +1,155 @@
+# zenpay_backend/services/product_import.py
+"""
+Bulk product catalog import (``POST /api/v1/products/import``).
+
+Creating products one by one looks the meter up and creates the Stripe
+product and price in sequence for each of them. The import instead
+resolves the meter once, creates the Stripe products and prices from a
+bounded pool of threads, and adds all local products, with their price
+history, in one transaction at the end.
+
+An import that fails part-way can be sent again:
+
+* products the tenant already has (by code) are skipped;
+* Stripe prices are found by their lookup key before anything is
+  created, so products created in Stripe by the failed run are reused
+  instead of duplicated;
+* Stripe requests carry idempotency keys derived from the product code,
+  which also covers a product created in Stripe whose price was not.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from api.core.config import settings
+from api.db.crud.import_jobs import create_import_job, get_import_job, record_import_progress
+from api.db.crud.products import add_products, get_existing_product_codes
+from api.db.crud.usage import METER_EVENT_NAME, METER_VALUE_KEY
+from api.db.models import ImportJob
+from api.models.request import ProductCreate
+from api.services.bulk_import import import_error, parse_records
+from api.services.stripe_service import (
+    _get_or_create_meter, create_stripe_product_and_price, get_stripe_prices_by_lookup_key, price_lookup_key,
+)
+from api.services.usage_reporting import MAX_RETRIES, StripeCallFailed, StripeThrottle
+
+logger = logging.getLogger(__name__)
+
+IMPORT_KIND = "products"
+
+Record = Tuple[int, ProductCreate]
+
+
+def start_product_import(
+    db: Session, user_id: str, body: bytes, content_type: Optional[str]
+) -> Tuple[ImportJob, List[Record]]:
+    """Parse the file and create its job; raises ImportFileError for unusable files"""
+    records, errors = parse_records(
+        body, content_type, ProductCreate, "code", settings.IMPORT_MAX_ROWS, json_fields=("tiers",)
+    )
+    job = create_import_job(db, user_id, IMPORT_KIND, len(records) + len(errors), errors)
+    return job, records
+
+
+class ProductImport:
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        rate: Optional[float] = None,
+        chunk_size: Optional[int] = None,
+        max_retries: int = MAX_RETRIES,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        """Unset sizes come from the IMPORT_* settings"""
+        self.workers = workers or settings.IMPORT_STRIPE_WORKERS
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        rate = settings.IMPORT_STRIPE_RATE if rate is None else rate
+        self._throttle = StripeThrottle(rate, max_retries, clock, sleep)
+
+    def run(self, session_factory: Callable, user_id: str, job_id: str, records: List[Record]) -> None:
+        db = session_factory()
+        try:
+            job = get_import_job(db, user_id, job_id)
+            record_import_progress(db, job, status="running")
+
+            existing = get_existing_product_codes(db, user_id, [record.code for _, record in records])
+            new = [(line, record) for line, record in records if record.code not in existing]
+            record_import_progress(db, job, skipped=len(records) - len(new))
+
+            products = self._provision(db, job, user_id, new) if new else []
+            add_products(db, user_id, products)
+            # The products and the job's completion commit together
+            record_import_progress(db, job, created=len(products), status="completed")
+        except Exception:
+            logger.exception("Import job %s failed", job_id)
+            db.rollback()
+            job = get_import_job(db, user_id, job_id)
+            if job is not None:
+                record_import_progress(db, job, status="failed")
+        finally:
+            db.close()
+
+    def _provision(self, db: Session, job: ImportJob, user_id: str, new: List[Record]) -> List[dict]:
+        """Column values of the products whose Stripe product and price exist"""
+        meter, _ = self._throttle.call(_get_or_create_meter, METER_EVENT_NAME, "ZenPay Usage")
+        if meter is None:
+            raise RuntimeError(f"No Stripe meter for event {METER_EVENT_NAME}")
+        keys = [price_lookup_key(METER_EVENT_NAME, record.code) for _, record in new]
+        # Prices a previous, interrupted run already created
+        found, _ = self._throttle.call(get_stripe_prices_by_lookup_key, keys)
+
+        products = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="product-import") as pool:
+            for i in range(0, len(new), self.chunk_size):
+                chunk = new[i:i + self.chunk_size]
+                errors = []
+                results = pool.map(lambda item: self._create(user_id, item[1], meter, found), chunk)
+                for (line, record), (values, error) in zip(chunk, results):
+                    if error is None:
+                        products.append(values)
+                    else:
+                        errors.append(import_error(line, record.code, error))
+                # Created products count once they are added, at the end
+                record_import_progress(db, job, errors=errors)
+        return products
+
+    def _create(self, user_id: str, record: ProductCreate, meter, found: Dict[str, object]) -> Tuple[Optional[dict], Optional[str]]:
+        """``(product column values, None)`` or ``(None, error)``"""
+        tiers = [tier.model_dump() for tier in record.tiers] if record.tiers else None
+        price = found.get(price_lookup_key(METER_EVENT_NAME, record.code))
+        if price is not None:
+            if (price.product.metadata or {}).get("user_id") != user_id:
+                return None, "Stripe price lookup key is used by another product"
+            stripe_product_id, stripe_price_id = price.product.id, price.id
+        else:
+            try:
+                (stripe_product, stripe_price), _ = self._throttle.call(
+                    create_stripe_product_and_price,
+                    product_name=record.name,
+                    price_per_unit=record.price_per_unit,
+                    product_code=record.code,
+                    event_name=METER_EVENT_NAME,
+                    quantity_payload_key=METER_VALUE_KEY,
+                    tiers_mode=record.tiers_mode,
+                    tiers=tiers,
+                    meter=meter,
+                    metadata={"user_id": user_id, "product_code": record.code},
+                    idempotency_key=f"product-import:{user_id}:{record.code}",
+                )
+            except StripeCallFailed as e:
+                return None, f"Stripe: {e.error}"
+            stripe_product_id, stripe_price_id = stripe_product.id, stripe_price.id
+        return dict(
+            name=record.name,
+            code=record.code,
+            unit_name=record.unit_name,
+            price_per_unit=record.price_per_unit,
+            tiers_mode=record.tiers_mode,
+            price_tiers=tiers,
+            stripe_product_id=stripe_product_id,
+            stripe_price_id=stripe_price_id,
+        ), None
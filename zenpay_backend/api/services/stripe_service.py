@@ -1,12 +1,17 @@
 # zenpay_backend/services/stripe.py
 
-from typing import Optional
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
 import stripe
 from sqlalchemy.orm import Session
 
 from api.core.config import settings
+from api.core.money import stripe_decimal_cents, to_micros
 from api.db.crud import usage as usage_crud
+from api.db.crud.subscriptions import get_subscription_item_id_by_price
+from api.db.session import SessionLocal
 from api.db.models import UsageEvent, Customer
+from api.services.subscription_cache import subscription_cache
 from sqlalchemy.orm import Session
 
 import logging
@@ -16,16 +21,25 @@ logger = logging.getLogger(__name__)
 # Initialize Stripe with our API key
 stripe.api_key = settings.STRIPE_API_KEY
 
+def get_meter(event_name: str):
+    """
+    Find the Stripe Meter for an event name, or None.
+    """
+    meters = stripe.billing.Meter.list(limit=100) # Fetch a reasonable number of meters
+    for meter in meters.data:
+        if meter.event_name == event_name:
+            return meter
+    return None
+
 def _get_or_create_meter(event_name: str, display_name: str):
     """
     Helper to get or create a Stripe Meter.
     """
     try:
         # Try to retrieve an existing meter
-        meters = stripe.billing.Meter.list(limit=100) # Fetch a reasonable number of meters
-        for meter in meters.data:
-            if meter.event_name == event_name:
-                return meter
+        meter = get_meter(event_name)
+        if meter is not None:
+            return meter
     except stripe.error.StripeError as e:
         logger.warning(f"Could not retrieve meter {event_name}: {e}")
 
@@ -58,50 +72,107 @@ def ensure_stripe_customer(db: Session, db_customer: Customer) -> Customer:
         db_customer.stripe_customer_id = stripe_customer.id
         db.commit()
         db.refresh(db_customer)
+        subscription_cache.invalidate_customer(db_customer.user_id, db_customer.id)
     return db_customer
 
 
 def create_stripe_customer(
-    name: str, email: str, metadata: dict
+    name: str, email: str, metadata: dict, idempotency_key: Optional[str] = None
 ):
     return stripe.Customer.create(
         name=name,
         email=email,
         metadata=metadata,
+        idempotency_key=idempotency_key,
     )
 
 
+def _tiered_price_data(tiers_mode: str, tiers: list) -> dict:
+    """Stripe price fields for graduated/volume tiers given in dollars"""
+    def cents(amount) -> str:
+        return stripe_decimal_cents(to_micros(amount or 0))
+
+    return {
+        "billing_scheme": "tiered",
+        "tiers_mode": tiers_mode,
+        "tiers": [
+            {
+                "up_to": "inf" if tier.get("up_to") is None else int(tier["up_to"]),
+                "unit_amount_decimal": cents(tier.get("unit_amount")),
+                "flat_amount_decimal": cents(tier.get("flat_amount")),
+            }
+            for tier in tiers
+        ],
+    }
+
+
+def price_lookup_key(event_name: str, product_code: str) -> str:
+    return f"{event_name}_{product_code}"
+
+
+def metered_price_data(
+    stripe_product_id: str, meter_id: str, price_per_unit: float, product_code: str, event_name: str,
+    tiers_mode: Optional[str] = None, tiers: Optional[list] = None
+) -> dict:
+    """Parameters of the monthly metered Stripe price of a product"""
+    price_data = {
+        "product": stripe_product_id,
+        # Decimal cents, so sub-cent unit prices survive the round trip
+        "unit_amount_decimal": stripe_decimal_cents(to_micros(price_per_unit)),
+        "currency": "usd",
+        "recurring": {"interval": "month", "usage_type": "metered", "meter": meter_id},
+        "billing_scheme": "per_unit",
+        "lookup_key": price_lookup_key(event_name, product_code), # Use a unique lookup key
+    }
+    if tiers_mode:
+        del price_data["unit_amount_decimal"]
+        price_data.update(_tiered_price_data(tiers_mode, tiers))
+    return price_data
+
+
 def create_stripe_product_and_price(
-    product_name: str, price_per_unit: float, product_code: str, event_name: str, quantity_payload_key: str
+    product_name: str, price_per_unit: float, product_code: str, event_name: str, quantity_payload_key: str,
+    tiers_mode: Optional[str] = None, tiers: Optional[list] = None,
+    meter=None, metadata: Optional[dict] = None, idempotency_key: Optional[str] = None
 ):
     """
-    Create a product and metered price in Stripe
+    Create a product and metered price in Stripe. Bulk callers pass the
+    ``meter`` they resolved once; ``idempotency_key`` is suffixed per request.
     """
     # Ensure the meter exists
-    meter = _get_or_create_meter(event_name=event_name, display_name=product_name + " Usage")
+    if meter is None:
+        meter = _get_or_create_meter(event_name=event_name, display_name=product_name + " Usage")
 
     # Create product
     product = stripe.Product.create(
-        name=product_name
+        name=product_name,
+        metadata=metadata,
+        idempotency_key=f"{idempotency_key}:product" if idempotency_key else None,
     )
 
     # Create metered price
-    price_data = {
-        "product": product.id,
-        "unit_amount": int(price_per_unit * 100),  # Convert to cents
-        "currency": "usd",
-        "recurring": {"interval": "month", "usage_type": "metered", "meter": meter.id},
-        "billing_scheme": "per_unit",
-        "lookup_key": f"{event_name}_{product_code}", # Use a unique lookup key
-    }
-
-    price = stripe.Price.create(**price_data)
+    price = stripe.Price.create(
+        **metered_price_data(product.id, meter.id, price_per_unit, product_code, event_name, tiers_mode, tiers),
+        idempotency_key=f"{idempotency_key}:price" if idempotency_key else None,
+    )
 
     return product, price
 
 
+def get_stripe_prices_by_lookup_key(lookup_keys: List[str]) -> Dict[str, object]:
+    """Active prices with the given lookup keys, their products expanded"""
+    prices = {}
+    # Stripe filters on at most 10 lookup keys per request
+    for i in range(0, len(lookup_keys), 10):
+        found = stripe.Price.list(lookup_keys=lookup_keys[i:i + 10], active=True, expand=["data.product"], limit=10)
+        for price in found.data:
+            prices[price.lookup_key] = price
+    return prices
+
+
 def update_stripe_product_price(
-    stripe_product_id: str, old_stripe_price_id: str, new_price_per_unit: float
+    stripe_product_id: str, old_stripe_price_id: str, new_price_per_unit: float,
+    tiers_mode: Optional[str] = None, tiers: Optional[list] = None
 ):
     """
     Deactivates the old price and creates a new price for a Stripe product.
@@ -118,10 +189,13 @@ def update_stripe_product_price(
     # Create a new price
     price_data = {
         "product": stripe_product_id,
-        "unit_amount": int(new_price_per_unit * 100),  # Convert to cents
+        "unit_amount_decimal": stripe_decimal_cents(to_micros(new_price_per_unit)),
         "currency": "usd",
         "recurring": {"interval": "month"},
     }
+    if tiers_mode:
+        del price_data["unit_amount_decimal"]
+        price_data.update(_tiered_price_data(tiers_mode, tiers))
 
     new_price = stripe.Price.create(**price_data)
 
@@ -133,20 +207,24 @@ def update_product_name(product_id: str, new_name: str):
     """
     stripe.Product.modify(product_id, name=new_name)
 
-def get_subscription_item_id(stripe_customer_id: str, stripe_price_id: str) -> Optional[str]:
+def get_subscription_item_id(
+    stripe_customer_id: str, stripe_price_id: str, db: Optional[Session] = None
+) -> Optional[str]:
     """
-    Retrieves the subscription item ID for a given customer and price.
+    Retrieves the active subscription item ID for a given customer and price.
+
+    Served from the local subscription mirror (kept current by webhooks and
+    ``python -m api.services.subscription_sync``) through an index, instead
+    of listing the customer's subscriptions from Stripe.
     """
+    if db is not None:
+        return get_subscription_item_id_by_price(db, stripe_customer_id, stripe_price_id)
+
+    db = SessionLocal()
     try:
-        subscriptions = stripe.Subscription.list(customer=stripe_customer_id, status='active')
-        for subscription in subscriptions.auto_paging_iter():
-            for item in subscription.items.data:
-                if item.price.id == stripe_price_id:
-                    return item.id
-        return None
-    except Exception as e:
-        logger.error(f"Error getting subscription item ID: {e}")
-        return None
+        return get_subscription_item_id_by_price(db, stripe_customer_id, stripe_price_id)
+    finally:
+        db.close()
 
 
 def report_usage_to_stripe(
@@ -178,6 +256,26 @@ def report_usage_to_stripe(
         logger.error(f"Error reporting usage to Stripe for customer {db_customer.id}: {e}")
         raise
 
+def get_daily_meter_usage(
+    meter_id: str, stripe_customer_id: str, start_time: int, end_time: int
+) -> Dict[date, float]:
+    """
+    Aggregated meter value per UTC day for one customer, from Stripe's meter
+    event summaries. ``start_time`` and ``end_time`` must fall on midnight UTC.
+    """
+    summaries = stripe.billing.Meter.list_event_summaries(
+        meter_id,
+        customer=stripe_customer_id,
+        start_time=start_time,
+        end_time=end_time,
+        value_grouping_window="day",
+        limit=100,
+    )
+    return {
+        datetime.fromtimestamp(summary["start_time"], tz=timezone.utc).date(): summary["aggregated_value"]
+        for summary in summaries.auto_paging_iter()
+    }
+
 def create_stripe_subscription(
     stripe_customer_id: str, stripe_price_id: str
 ):
@@ -0,0 +1,69 @@
+# zenpay_backend/services/subscription_cache.py
+"""
+In-process cache of subscription state for usage reporting.
+
+Keyed by ``(user_id, customer_id, product_id)``, each entry holds what the
+reporting path needs: whether the subscription is active, the customer's
+Stripe ID and the subscription item. ``create_subscription`` and the
+``customer.subscription.*`` webhooks write entries; reads that miss fall
+back to one query (see ``crud.subscriptions.resolve_subscription``).
+
+Every worker process has its own cache and a webhook only reaches one of
+them, so entries expire after ``SUBSCRIPTION_CACHE_TTL_SECONDS``.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from api.core.config import settings
+
+SubscriptionKey = Tuple[str, str, str]
+
+
+@dataclass(frozen=True)
+class CachedSubscription:
+    active: bool
+    stripe_customer_id: Optional[str]
+    stripe_subscription_item_id: Optional[str]
+
+
+class SubscriptionCache:
+    def __init__(self, ttl: float, max_entries: int, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[SubscriptionKey, Tuple[CachedSubscription, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: SubscriptionKey) -> Optional[CachedSubscription]:
+        with self._lock:
+            found = self._entries.get(key)
+            if found is None:
+                return None
+            entry, expires_at = found
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            return entry
+
+    def put(self, key: SubscriptionKey, entry: CachedSubscription) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (entry, self._clock() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_customer(self, user_id: str, customer_id: str) -> None:
+        """Drop all entries of a customer, e.g. after its Stripe ID changed"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == user_id and k[1] == customer_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+subscription_cache = SubscriptionCache(settings.SUBSCRIPTION_CACHE_TTL_SECONDS, settings.SUBSCRIPTION_CACHE_MAX_ENTRIES)
@@ -0,0 +1,113 @@
+# zenpay_backend/services/subscription_sync.py
+"""
+Bulk sync of Stripe subscriptions into the local ``subscriptions`` mirror.
+
+Webhooks keep the mirror current incrementally; this job (re)builds it, e.g.
+on first deployment or after missed webhooks:
+
+    python -m api.services.subscription_sync
+
+Customers, products and existing rows are loaded once up front, so the job
+issues one query per table plus one commit per page of subscriptions,
+whatever the number of subscriptions.
+"""
+import argparse
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import stripe
+from sqlalchemy.orm import Session
+
+from api.core.config import settings
+from api.db.crud.subscriptions import cache_subscription_rows, apply_stripe_subscription
+from api.db.models import Customer, Product, Subscription
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+
+
+@dataclass
+class SyncStats:
+    subscriptions: int = 0
+    items: int = 0
+    skipped_customers: int = 0
+
+
+def _subscription_items(stripe_subscription):
+    """All items of a subscription; only the first page is embedded in it"""
+    items = stripe_subscription["items"]
+    if not items["has_more"]:
+        return list(items["data"])
+    return list(stripe.SubscriptionItem.list(
+        subscription=stripe_subscription["id"], limit=PAGE_SIZE
+    ).auto_paging_iter())
+
+
+def sync_subscriptions(db: Session, user_id: Optional[str] = None) -> SyncStats:
+    """Pull every Stripe subscription (all statuses) into the local mirror"""
+    customers_query = db.query(Customer).filter(Customer.stripe_customer_id.isnot(None))
+    products_query = db.query(Product).filter(Product.stripe_price_id.isnot(None))
+    rows_query = db.query(Subscription)
+    if user_id:
+        customers_query = customers_query.filter(Customer.user_id == user_id)
+        products_query = products_query.filter(Product.user_id == user_id)
+        rows_query = rows_query.filter(Subscription.user_id == user_id)
+
+    customers: Dict[str, Customer] = {c.stripe_customer_id: c for c in customers_query}
+    products: Dict[tuple, Product] = {(p.user_id, p.stripe_price_id): p for p in products_query}
+    rows_by_subscription: Dict[str, Dict[str, Subscription]] = {}
+    for row in rows_query:
+        rows_by_subscription.setdefault(row.stripe_subscription_id, {})[row.stripe_subscription_item_id] = row
+
+    stats = SyncStats()
+    pending = []
+    subscriptions = stripe.Subscription.list(status="all", limit=PAGE_SIZE)
+    for stripe_subscription in subscriptions.auto_paging_iter():
+        customer = customers.get(stripe_subscription["customer"])
+        if customer is None:
+            stats.skipped_customers += 1
+            continue
+        existing = rows_by_subscription.setdefault(stripe_subscription["id"], {})
+        synced = apply_stripe_subscription(
+            db,
+            stripe_subscription,
+            _subscription_items(stripe_subscription),
+            customer,
+            existing,
+            lambda price_id: products.get((customer.user_id, price_id)),
+        )
+        stats.subscriptions += 1
+        stats.items += len(synced)
+        pending.extend(synced)
+        if len(pending) >= PAGE_SIZE:
+            db.commit()
+            cache_subscription_rows(pending)
+            pending = []
+
+    db.commit()
+    cache_subscription_rows(pending)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync Stripe subscriptions into the local mirror")
+    parser.add_argument("--user-id", help="only sync customers and products of this user")
+    args = parser.parse_args()
+
+    from api.db.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    stripe.api_key = settings.STRIPE_API_KEY
+    db = SessionLocal()
+    try:
+        stats = sync_subscriptions(db, user_id=args.user_id)
+    finally:
+        db.close()
+    print(f"Synced {stats.items} items of {stats.subscriptions} subscriptions "
+          f"({stats.skipped_customers} subscriptions of unknown customers skipped)")
+
+
+if __name__ == "__main__":
+    main()
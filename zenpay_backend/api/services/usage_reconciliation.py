@@ -0,0 +1,219 @@
+# zenpay_backend/services/usage_reconciliation.py
+"""
+Reconciliation of local usage against what Stripe metered.
+
+For every customer linked to Stripe and every UTC day in a range, the
+quantity of usage events flagged ``reported_to_stripe`` is compared with the
+day's aggregated value in Stripe's meter event summaries; days that differ
+are written out as CSV:
+
+    python -m api.services.usage_reconciliation --since 2026-01-01 [--until 2026-02-01] [--output drift.csv]
+
+All products report to the one ``METER_EVENT_NAME`` meter, so a customer's
+day is compared across all of its products. Stripe aggregates meter events
+asynchronously, so the most recent minutes may show as drift.
+
+Customers are processed in chunks (keyset pagination): per chunk, the local
+totals come from one grouped query while the customers' summaries are
+fetched concurrently from a bounded pool, paced like the usage backfill.
+Only one chunk is held in memory, and discrepancies are written as they are
+found.
+"""
+import argparse
+import csv
+import logging
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional
+
+import stripe
+from sqlalchemy.orm import Session
+
+from api.core.config import settings
+from api.db.crud.customers import get_stripe_customer_page
+from api.db.crud.usage import get_daily_usage_totals, METER_EVENT_NAME
+from api.services.stripe_service import get_daily_meter_usage, get_meter
+from api.services.usage_reporting import MAX_RETRIES, StripeCallFailed, StripeThrottle
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 200
+WORKERS = 8
+RATE_PER_SECOND = 50.0  # summaries are read requests; leave room for live traffic
+REPORT_FIELDS = (
+    "customer_id", "stripe_customer_id", "meter", "day",
+    "local_quantity", "stripe_quantity", "difference", "unreported_quantity",
+)
+
+
+@dataclass
+class Discrepancy:
+    customer_id: str
+    stripe_customer_id: str
+    day: date
+    local_quantity: float
+    stripe_quantity: float
+    unreported_quantity: float
+
+    @property
+    def difference(self) -> float:
+        """Positive when Stripe has less usage than reported locally"""
+        return self.local_quantity - self.stripe_quantity
+
+    def row(self) -> tuple:
+        return (
+            self.customer_id, self.stripe_customer_id, METER_EVENT_NAME, self.day.isoformat(),
+            self.local_quantity, self.stripe_quantity, self.difference, self.unreported_quantity,
+        )
+
+
+@dataclass
+class ReconciliationStats:
+    customers: int = 0
+    days: int = 0
+    discrepancies: int = 0
+    failed_customers: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        errors = ", ".join(f"{name}={count}" for name, count in sorted(self.errors.items())) or "none"
+        return (f"Compared {self.days} customer-days of {self.customers} customers in {self.elapsed:.1f}s: "
+                f"{self.discrepancies} discrepancies, {self.failed_customers} customers failed; errors: {errors}")
+
+
+def _midnight(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+class UsageReconciliation:
+    def __init__(
+        self,
+        db: Session,
+        meter_id: str,
+        start: date,
+        end: date,
+        workers: int = WORKERS,
+        rate: float = RATE_PER_SECOND,
+        chunk_size: int = CHUNK_SIZE,
+        tolerance: float = 0.0,
+        max_retries: int = MAX_RETRIES,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        """Compare the days ``start`` (inclusive) to ``end`` (exclusive)"""
+        self.db = db
+        self.meter_id = meter_id
+        self.start = start
+        self.end = end
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.tolerance = tolerance
+        self.stats = ReconciliationStats()
+        self._clock = clock
+        self._throttle = StripeThrottle(rate, max_retries, clock, sleep)
+        self._errors = Counter()
+        self._errors_lock = threading.Lock()
+
+    def _fetch(self, stripe_customer_id: str) -> Optional[Dict[date, float]]:
+        start_time = int(_midnight(self.start).replace(tzinfo=timezone.utc).timestamp())
+        end_time = int(_midnight(self.end).replace(tzinfo=timezone.utc).timestamp())
+        try:
+            usage, _ = self._throttle.call(
+                get_daily_meter_usage, self.meter_id, stripe_customer_id, start_time, end_time
+            )
+            return usage
+        except StripeCallFailed as e:
+            logger.warning("Could not fetch meter summaries of %s: %s", stripe_customer_id, e.error)
+            with self._errors_lock:
+                self._errors[type(e.error).__name__] += 1
+            return None
+
+    def run(self, user_id: Optional[str] = None) -> Iterator[Discrepancy]:
+        """Yield discrepancies as they are found; ``stats`` is final once exhausted"""
+        started = self._clock()
+        after_id = None
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="usage-reconcile") as pool:
+            while True:
+                customers = get_stripe_customer_page(self.db, after_id, self.chunk_size, user_id)
+                if not customers:
+                    break
+                after_id = customers[-1][0]
+                # Stripe calls run while the grouped query does
+                remote = pool.map(self._fetch, [stripe_id for _, stripe_id in customers])
+
+                local = defaultdict(dict)
+                for customer_id, day, reported, unreported in get_daily_usage_totals(
+                    self.db, [customer_id for customer_id, _ in customers],
+                    _midnight(self.start), _midnight(self.end),
+                ):
+                    local[customer_id][day] = (reported, unreported)
+
+                for (customer_id, stripe_customer_id), stripe_days in zip(customers, remote):
+                    self.stats.customers += 1
+                    if stripe_days is None:
+                        self.stats.failed_customers += 1
+                        continue
+                    yield from self._compare(customer_id, stripe_customer_id, local.get(customer_id, {}), stripe_days)
+
+                with self._errors_lock:
+                    self.stats.errors = dict(self._errors)
+                self.stats.elapsed = self._clock() - started
+        self.stats.elapsed = self._clock() - started
+
+    def _compare(self, customer_id, stripe_customer_id, local_days, stripe_days) -> Iterator[Discrepancy]:
+        for day in sorted(set(local_days) | set(stripe_days)):
+            reported, unreported = local_days.get(day, (0, 0))
+            metered = stripe_days.get(day, 0)
+            self.stats.days += 1
+            if abs(reported - metered) > self.tolerance:
+                self.stats.discrepancies += 1
+                yield Discrepancy(customer_id, stripe_customer_id, day, reported, metered, unreported)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare local usage with Stripe meter event summaries")
+    parser.add_argument("--since", type=date.fromisoformat, required=True, help="first UTC day (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="day after the last one; defaults to tomorrow")
+    parser.add_argument("--user-id", help="only customers of this user")
+    parser.add_argument("--output", help="CSV file for the discrepancies; defaults to stdout")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="ignore differences up to this quantity")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="concurrent Stripe requests")
+    parser.add_argument("--rate", type=float, default=RATE_PER_SECOND, help="max Stripe requests per second; 0 = unlimited")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="customers per grouped query")
+    args = parser.parse_args()
+
+    from api.db.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    stripe.api_key = settings.STRIPE_API_KEY
+    meter = get_meter(METER_EVENT_NAME)
+    if meter is None:
+        sys.exit(f"No Stripe meter for event {METER_EVENT_NAME}")
+    until = args.until or datetime.now(timezone.utc).date() + timedelta(days=1)
+
+    db = SessionLocal()
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        reconciliation = UsageReconciliation(
+            db, meter.id, args.since, until, workers=args.workers, rate=args.rate,
+            chunk_size=args.chunk_size, tolerance=args.tolerance,
+        )
+        writer = csv.writer(output)
+        writer.writerow(REPORT_FIELDS)
+        for discrepancy in reconciliation.run(user_id=args.user_id):
+            writer.writerow(discrepancy.row())
+    finally:
+        db.close()
+        if output is not sys.stdout:
+            output.close()
+    print(reconciliation.stats.summary(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# zenpay_backend/services/usage_reporting.py
+"""
+Backfill of usage events that never reached Stripe.
+
+``record_usage`` flags an event ``reported_to_stripe`` once its meter event
+is sent; events whose report failed keep the flag unset. This job finds them
+and reports them again:
+
+    python -m api.services.usage_reporting [--checkpoint backfill.json]
+
+Events are read in pages ordered by ID (keyset pagination) and each page is
+sent from a bounded pool of worker threads, paced by a token bucket and
+retried with backoff on Stripe rate-limit and connection errors. After a page
+the reported events are flagged in one UPDATE and the last ID is written to
+the checkpoint file, so an interrupted run resumes after the last finished
+page. Meter events carry the usage event ID as Stripe ``identifier``, so
+events of a page that was in flight when a run stopped are not counted twice.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import stripe
+from sqlalchemy.orm import Session
+
+from api.core.config import settings
+from api.core.rate_limit import TokenBucket
+from api.db.crud.usage import (
+    get_unreported_usage_by_ids, get_unreported_usage_page, mark_usage_reported, report_usage_to_stripe,
+    METER_EVENT_NAME, METER_VALUE_KEY,
+)
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 500
+WORKERS = 8
+RATE_PER_SECOND = 100.0  # Stripe's default live-mode limit for write requests
+MAX_RETRIES = 5
+RETRYABLE_ERRORS = (stripe.error.RateLimitError, stripe.error.APIConnectionError)
+
+
+@dataclass
+class BackfillStats:
+    reported: int = 0
+    failed: int = 0  # events whose report failed and were not retried successfully
+    retries: int = 0
+    pages: int = 0
+    last_id: Optional[str] = None
+    errors: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+    # The run's filters, as ISO timestamps
+    user_id: Optional[str] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
+    failed_ids: List[str] = field(default_factory=list)
+
+    def filters(self) -> tuple:
+        return self.user_id, self.since, self.until
+
+    def summary(self) -> str:
+        rate = self.reported / self.elapsed if self.elapsed else 0.0
+        errors = ", ".join(f"{name}={count}" for name, count in sorted(self.errors.items())) or "none"
+        return (f"Reported {self.reported} events in {self.elapsed:.1f}s ({rate:.1f}/s); "
+                f"{self.failed} failed, {self.retries} retries; errors: {errors}")
+
+
+def load_checkpoint(path: Optional[str]) -> BackfillStats:
+    """Stats of a previous run, or empty stats if there is no checkpoint"""
+    if not path or not os.path.exists(path):
+        return BackfillStats()
+    with open(path) as f:
+        return BackfillStats(**json.load(f))
+
+
+def save_checkpoint(path: Optional[str], stats: BackfillStats) -> None:
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(asdict(stats), f)
+    os.replace(tmp, path)
+
+
+class CheckpointMismatchError(ValueError):
+    """Raised when a checkpoint is resumed with other filters than it was written with"""
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+class StripeCallFailed(Exception):
+    def __init__(self, error: Exception, retries: int):
+        super().__init__(str(error))
+        self.error = error
+        self.retries = retries
+
+
+class StripeThrottle:
+    """
+    Paces Stripe calls from any number of threads with one token bucket and
+    retries rate-limit and connection errors with exponential backoff
+    """
+
+    def __init__(self, rate: float, max_retries: int = MAX_RETRIES, clock=time.monotonic, sleep=time.sleep):
+        self.max_retries = max_retries
+        self._clock = clock
+        self._sleep = sleep
+        self._bucket = TokenBucket(rate, max(rate, 1.0), clock()) if rate > 0 else None
+
+    def wait(self) -> None:
+        if self._bucket is None:
+            return
+        delay = self._bucket.acquire(self._clock())
+        while delay > 0:
+            self._sleep(delay)
+            delay = self._bucket.acquire(self._clock())
+
+    def call(self, fn: Callable, *args, **kwargs) -> tuple:
+        """Return ``(result, retries)``; raise ``StripeCallFailed`` once retries run out"""
+        for attempt in range(self.max_retries + 1):
+            self.wait()
+            try:
+                return fn(*args, **kwargs), attempt
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise StripeCallFailed(e, attempt)
+                self._sleep(min(2 ** attempt * 0.5, 30.0))
+            except Exception as e:
+                raise StripeCallFailed(e, attempt)
+
+
+class UsageBackfill:
+    def __init__(
+        self,
+        db: Session,
+        workers: int = WORKERS,
+        rate: float = RATE_PER_SECOND,
+        page_size: int = PAGE_SIZE,
+        max_retries: int = MAX_RETRIES,
+        checkpoint: Optional[str] = None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.db = db
+        self.workers = workers
+        self.page_size = page_size
+        self.checkpoint = checkpoint
+        self._clock = clock
+        self._throttle = StripeThrottle(rate, max_retries, clock, sleep)
+
+    def _report(self, event) -> tuple:
+        """Send one event; return ``(error name or None, retries)``"""
+        event_id, quantity, timestamp, stripe_customer_id = event
+        try:
+            _, retries = self._throttle.call(
+                report_usage_to_stripe,
+                stripe_customer_id=stripe_customer_id,
+                quantity=quantity,
+                event_name=METER_EVENT_NAME,
+                quantity_payload_key=METER_VALUE_KEY,
+                timestamp=timestamp,
+                identifier=event_id,
+            )
+            return None, retries
+        except StripeCallFailed as e:
+            logger.warning("Could not report usage event %s: %s", event_id, e.error)
+            return type(e.error).__name__, e.retries
+
+    def _send(self, pool: ThreadPoolExecutor, events: List[tuple], stats: BackfillStats, errors: Counter) -> List[str]:
+        """Report ``events``, flag the reported ones and return the IDs that failed"""
+        reported, failed = [], []
+        for event, (error, retries) in zip(events, pool.map(self._report, events)):
+            stats.retries += retries
+            if error is None:
+                reported.append(event[0])
+            else:
+                failed.append(event[0])
+                errors[error] += 1
+        mark_usage_reported(self.db, reported)
+        self.db.commit()
+        stats.reported += len(reported)
+        return failed
+
+    def run(
+        self,
+        user_id: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        max_events: Optional[int] = None,
+    ) -> BackfillStats:
+        resumed = bool(self.checkpoint) and os.path.exists(self.checkpoint)
+        stats = load_checkpoint(self.checkpoint)
+        filters = (user_id, _iso(start_date), _iso(end_date))
+        if resumed and stats.filters() != filters:
+            raise CheckpointMismatchError(
+                f"Checkpoint {self.checkpoint} is for user_id={stats.user_id} since={stats.since} "
+                f"until={stats.until}; resume it with the same filters"
+            )
+        stats.user_id, stats.since, stats.until = filters
+        errors = Counter(stats.errors)
+        started = self._clock() - stats.elapsed
+        processed = 0
+
+        def checkpoint():
+            stats.failed = len(stats.failed_ids)
+            stats.errors = dict(errors)
+            stats.elapsed = self._clock() - started
+            save_checkpoint(self.checkpoint, stats)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="usage-backfill") as pool:
+            # Failures of earlier runs first; events reported meanwhile drop out
+            retry, still_failed = stats.failed_ids, []
+            while retry and (max_events is None or processed < max_events):
+                limit = self.page_size if max_events is None else min(self.page_size, max_events - processed)
+                batch, retry = retry[:limit], retry[limit:]
+                events = get_unreported_usage_by_ids(self.db, batch)
+                still_failed.extend(self._send(pool, events, stats, errors))
+                processed += len(batch)
+                # IDs not retried yet stay in the checkpoint
+                stats.failed_ids = still_failed + retry
+                checkpoint()
+                logger.info("Retried %d failed events", len(events))
+
+            while max_events is None or processed < max_events:
+                limit = self.page_size if max_events is None else min(self.page_size, max_events - processed)
+                page = get_unreported_usage_page(
+                    self.db, after_id=stats.last_id, limit=limit,
+                    user_id=user_id, start_date=start_date, end_date=end_date,
+                )
+                if not page:
+                    break
+
+                failed = self._send(pool, page, stats, errors)
+                stats.failed_ids.extend(failed)
+                processed += len(page)
+                stats.pages += 1
+                stats.last_id = page[-1][0]
+                checkpoint()
+                logger.info("Page %d: %d reported, %d failed", stats.pages, len(page) - len(failed), len(failed))
+
+        stats.failed = len(stats.failed_ids)
+        stats.errors = dict(errors)
+        stats.elapsed = self._clock() - started
+        return stats
+
+
+def _parse_date(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report usage events that never reached Stripe")
+    parser.add_argument("--checkpoint", help="file recording progress; an existing one is resumed")
+    parser.add_argument("--user-id", help="only events of this user")
+    parser.add_argument("--since", type=_parse_date, help="only events at or after this ISO timestamp")
+    parser.add_argument("--until", type=_parse_date, help="only events at or before this ISO timestamp")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="concurrent Stripe requests")
+    parser.add_argument("--rate", type=float, default=RATE_PER_SECOND, help="max Stripe requests per second; 0 = unlimited")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--max-events", type=int, help="stop after this many events")
+    args = parser.parse_args()
+
+    from api.db.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    stripe.api_key = settings.STRIPE_API_KEY
+    db = SessionLocal()
+    backfill = UsageBackfill(
+        db, workers=args.workers, rate=args.rate, page_size=args.page_size, checkpoint=args.checkpoint
+    )
+    try:
+        stats = backfill.run(user_id=args.user_id, start_date=args.since, end_date=args.until,
+                             max_events=args.max_events)
+    except CheckpointMismatchError as e:
+        sys.exit(str(e))
+    except KeyboardInterrupt:
+        stats = load_checkpoint(args.checkpoint)
+        print("Interrupted; rerun with the same --checkpoint to resume")
+    finally:
+        db.close()
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
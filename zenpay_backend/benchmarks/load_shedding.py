@@ -0,0 +1,161 @@
+# benchmarks/load_shedding.py
+"""
+Goodput under 2x overload with and without load shedding.
+
+A single worker is started against a scratch database. Its capacity for a
+50/50 mix of /usage/track and a heavy reporting call (5000 usage events) is measured
+with a closed loop, then requests are sent open-loop at ``--overload`` times
+that rate. A request counts towards goodput only if it succeeds within the
+client deadline.
+
+    python benchmarks/load_shedding.py [--seconds 10] [--overload 2] [--deadline 1.0]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+from scaling import API_KEY, BACKEND_DIR, CUSTOMER_ID, PRODUCT_CODE, free_port, seed, wait_healthy
+
+HEADERS = {"api-key": API_KEY}
+TRACK = "track"
+REPORT = "report"
+
+
+async def send(client: httpx.AsyncClient, kind: str, deadline: float) -> str:
+    try:
+        if kind == TRACK:
+            response = await client.post(
+                "/api/v1/usage/track?report_to_stripe=false",
+                json={"customer_id": CUSTOMER_ID, "product": PRODUCT_CODE, "quantity": 1,
+                      "idempotency_key": uuid.uuid4().hex},
+                timeout=deadline,
+            )
+        else:
+            response = await client.get("/api/v1/usage/events?limit=5000", timeout=deadline)
+    except httpx.TimeoutException:
+        return "timeout"
+    except httpx.HTTPError:
+        return "error"
+    if response.status_code == 200:
+        return "ok"
+    return "shed" if response.status_code == 503 else str(response.status_code)
+
+
+async def measure_capacity(port: int, seconds: float, concurrency: int) -> float:
+    done = 0
+    stop = time.perf_counter() + seconds
+
+    async def worker(client, i):
+        nonlocal done
+        kinds = (TRACK, REPORT)
+        while time.perf_counter() < stop:
+            if await send(client, kinds[(done + i) % 2], 30) == "ok":
+                done += 1
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", headers=HEADERS) as client:
+        await asyncio.gather(*(worker(client, i) for i in range(concurrency)))
+    return done / seconds
+
+
+async def open_loop(port: int, rate: float, seconds: float, deadline: float) -> dict:
+    results = {TRACK: Counter(), REPORT: Counter()}
+    limits = httpx.Limits(max_connections=2000, max_keepalive_connections=2000)
+
+    async def one(client, kind):
+        results[kind][await send(client, kind, deadline)] += 1
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", headers=HEADERS, limits=limits) as client:
+        tasks = []
+        start = time.perf_counter()
+        for i in range(int(rate * seconds)):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(one(client, TRACK if i % 2 == 0 else REPORT)))
+        await asyncio.gather(*tasks)
+    return results
+
+
+def seed_events(env, count: int) -> None:
+    """Give the reporting call enough rows to make it the expensive request"""
+    code = f"""
+from api.db.session import SessionLocal
+from api.db.models import Customer, Product, UsageEvent
+db = SessionLocal()
+customer = db.query(Customer).filter(Customer.id == {CUSTOMER_ID!r}).one()
+product = db.query(Product).filter(Product.code == {PRODUCT_CODE!r}).one()
+db.bulk_insert_mappings(UsageEvent, [
+    dict(user_id=customer.user_id, customer_id=customer.id, product_id=product.id, quantity=1)
+    for _ in range({count})
+])
+db.commit()
+db.close()
+"""
+    subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, check=True)
+
+
+def start_server(env, shedding: bool):
+    port = free_port()
+    server_env = dict(env, SHED_ENABLED=str(shedding).lower(), TENANT_MAX_CONCURRENCY="0")
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", "1", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=server_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    wait_healthy(port)
+    return server, port
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--overload", type=float, default=2.0)
+    parser.add_argument("--deadline", type=float, default=1.0, help="client timeout in seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop clients for the capacity run")
+    parser.add_argument("--events", type=int, default=20000, help="usage events seeded for the reporting call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        seed(env)
+        seed_events(env, args.events)
+
+        server, port = start_server(env, shedding=False)
+        try:
+            asyncio.run(measure_capacity(port, 2, args.concurrency))
+            capacity = asyncio.run(measure_capacity(port, args.seconds / 2, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+        rate = capacity * args.overload
+        print(f"capacity {capacity:.0f} req/s, offering {rate:.0f} req/s for {args.seconds:.0f}s, "
+              f"deadline {args.deadline:.1f}s")
+        print(f"{'shedding':<9} {'route':<7} {'sent':>6} {'ok':>6} {'shed':>6} {'timeout':>8} {'other':>6} {'goodput/s':>10}")
+        for shedding in (False, True):
+            server, port = start_server(env, shedding)
+            try:
+                results = asyncio.run(open_loop(port, rate, args.seconds, args.deadline))
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+            for kind in (TRACK, REPORT):
+                counts = results[kind]
+                other = sum(v for k, v in counts.items() if k not in ("ok", "shed", "timeout"))
+                print(f"{'on' if shedding else 'off':<9} {kind:<7} {sum(counts.values()):>6} {counts['ok']:>6} "
+                      f"{counts['shed']:>6} {counts['timeout']:>8} {other:>6} {counts['ok'] / args.seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
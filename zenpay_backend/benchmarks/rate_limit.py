@@ -0,0 +1,65 @@
+# benchmarks/rate_limit.py
+"""
+Per-request overhead of the tenant limits: the token bucket and concurrency
+slot checks done by ``enforce_tenant_limits`` for an admitted request.
+
+    python benchmarks/rate_limit.py [--iterations 200000] [--tenants 100]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "api")]
+
+from api import dependencies
+from api.core.rate_limit import TenantLimiter
+
+
+def bench_limiter(iterations: int, tenants: int) -> float:
+    limiter = TenantLimiter()
+    keys = [f"zp_{i}" for i in range(tenants)]
+    started = time.perf_counter()
+    for i in range(iterations):
+        key = keys[i % tenants]
+        limiter.acquire_rate(key, 1e9, 1_000_000)
+        limiter.acquire_slot(key, 16).release()
+    return (time.perf_counter() - started) / iterations
+
+
+def bench_dependency(iterations: int, tenants: int) -> float:
+    dependencies.tenant_limiter = TenantLimiter()
+    users = [
+        SimpleNamespace(id=f"user_{i}", api_key=f"zp_{i}", rate_limit_per_second=1e9,
+                        rate_limit_burst=1_000_000, max_concurrent_requests=16)
+        for i in range(tenants)
+    ]
+
+    async def run():
+        started = time.perf_counter()
+        for i in range(iterations):
+            gen = dependencies.enforce_tenant_limits(users[i % tenants])
+            await gen.__anext__()
+            await gen.aclose()
+        return (time.perf_counter() - started) / iterations
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--tenants", type=int, default=100)
+    args = parser.parse_args()
+
+    limiter = bench_limiter(args.iterations, args.tenants)
+    dependency = bench_dependency(args.iterations, args.tenants)
+    print(f"limiter checks     {limiter * 1e6:6.2f} us/request")
+    print(f"dependency overall {dependency * 1e6:6.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# benchmarks/scaling.py
+"""
+Throughput of /usage/track and /credits/balance as the worker count grows.
+
+For each worker count, serve.py is started against a scratch database and
+hammered by client processes over keep-alive connections for a fixed time.
+
+    python benchmarks/scaling.py [--workers 1,2,4] [--seconds 10] [--clients-per-worker 4]
+
+Set DATABASE_URL to benchmark a server database; the default is a SQLite file
+in a temporary directory. SQLite serialises writers, so /usage/track cannot
+scale past one core on it — use PostgreSQL to see write scaling.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "zp_test_key"
+CUSTOMER_ID = "bench_customer"
+PRODUCT_CODE = "bench_product"
+
+
+def seed(env):
+    code = f"""
+from api.db.migrate import migrate, seed_test_user
+from api.db.session import SessionLocal
+from api.db.models import User, Customer, Product, CreditTransaction
+migrate()
+seed_test_user()
+db = SessionLocal()
+user = db.query(User).filter(User.api_key == {API_KEY!r}).first()
+if not db.query(Customer).filter(Customer.id == {CUSTOMER_ID!r}).first():
+    db.add(Customer(id={CUSTOMER_ID!r}, user_id=user.id, stripe_customer_id="cus_bench"))
+    db.add(Product(user_id=user.id, name="Bench", code={PRODUCT_CODE!r}, unit_name="call",
+                   price_per_unit=0.0001, stripe_product_id="prod_bench", stripe_price_id="price_bench"))
+    db.add(CreditTransaction(user_id=user.id, customer_id={CUSTOMER_ID!r}, amount=1e9, type="topup"))
+    db.commit()
+db.close()
+"""
+    subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_healthy(port: int, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not become healthy")
+
+
+def client_loop(args):
+    port, endpoint, seconds = args
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"api-key": API_KEY, "Content-Type": "application/json"}
+    ok = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        if endpoint == "track":
+            body = json.dumps({
+                "customer_id": CUSTOMER_ID,
+                "product": PRODUCT_CODE,
+                "quantity": 1,
+                "idempotency_key": uuid.uuid4().hex,
+            })
+            conn.request("POST", "/api/v1/usage/track?report_to_stripe=false", body, headers)
+        else:
+            conn.request("GET", f"/api/v1/credits/balance/{CUSTOMER_ID}", headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status == 200:
+            ok += 1
+        else:
+            errors += 1
+    conn.close()
+    return ok, errors
+
+
+def run(workers: int, seconds: float, clients_per_worker: int, env) -> dict:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_healthy(port)
+        results = {}
+        clients = workers * clients_per_worker
+        with multiprocessing.Pool(clients) as pool:
+            for endpoint in ("balance", "track"):
+                counts = pool.map(client_loop, [(port, endpoint, seconds)] * clients)
+                ok = sum(c[0] for c in counts)
+                results[endpoint] = (ok / seconds, sum(c[1] for c in counts))
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+
+def main():
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    default_workers = ",".join(str(n) for n in (1, 2, 4, 8, 16) if n <= cores) or "1"
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", default=default_workers, help="comma-separated worker counts")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--clients-per-worker", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        seed(env)
+
+        print(f"{cores} cores available, database {env['DATABASE_URL'].split('://')[0]}")
+        print(f"{'workers':>8} {'balance req/s':>14} {'x':>6} {'track req/s':>12} {'x':>6} {'errors':>7}")
+        base = None
+        for workers in (int(n) for n in args.workers.split(",")):
+            results = run(workers, args.seconds, args.clients_per_worker, env)
+            balance, track = results["balance"][0], results["track"][0]
+            base = base or (balance, track)
+            errors = results["balance"][1] + results["track"][1]
+            print(f"{workers:>8} {balance:>14.0f} {balance / base[0]:>6.2f} {track:>12.0f} {track / base[1]:>6.2f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/serialization.py
+"""
+List endpoint serialization: ORM objects validated against response_model
+(the previous path) versus column tuples encoded straight to JSON.
+
+Both variants run the same query shape against an in-memory database and go
+through the full FastAPI stack via TestClient.
+
+    python benchmarks/serialization.py [--rows 5000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "api")]
+
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from api.db.crud.customers import get_customers
+from api.db.crud.products import get_products
+from api.db.crud.usage import get_usage_events
+from api.db.models import Base, Customer, Product, UsageEvent, User
+from api.db.session import get_db
+from api.dependencies import get_current_user_by_api_key
+from api.routes.customers import router as customers_router
+from api.routes.products import router as products_router
+from api.routes.usage import router as usage_router
+from models.response import CustomerResponse, ProductResponse, UsageEventResponse
+
+API_KEY = "zp_bench"
+PAGE_SIZES = (10, 100, 1000, 5000)
+
+
+def legacy_router() -> APIRouter:
+    """The list handlers as they were before the fast path"""
+    router = APIRouter()
+
+    @router.get("/customers", response_model=List[CustomerResponse])
+    def read_customers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
+                       current_user: User = Depends(get_current_user_by_api_key)):
+        return get_customers(db=db, user_id=current_user.id, skip=skip, limit=limit)
+
+    @router.get("/products", response_model=List[ProductResponse])
+    def list_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
+                      current_user: User = Depends(get_current_user_by_api_key)):
+        return get_products(db=db, user_id=current_user.id, skip=skip, limit=limit)
+
+    @router.get("/usage/events", response_model=List[UsageEventResponse])
+    def get_usage_records(skip: int = 0, limit: int = 100, db: Session = Depends(get_db),
+                          current_user: User = Depends(get_current_user_by_api_key)):
+        events = get_usage_events(db=db, user_id=current_user.id, skip=skip, limit=limit)
+        return [
+            UsageEventResponse(id=e.id, customer_id=e.customer_id, product=e.product.code,
+                               quantity=e.quantity, timestamp=e.timestamp)
+            for e in events
+        ]
+
+    return router
+
+
+def build_client(rows: int) -> TestClient:
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = SessionLocal()
+    user = User(email="bench@example.com", api_key=API_KEY)
+    db.add(user)
+    db.flush()
+    products = [Product(user_id=user.id, name=f"Product {i}", code=f"p{i}", unit_name="call", price_per_unit=0.01)
+                for i in range(rows)]
+    db.add_all(products)
+    db.add_all(Customer(id=f"cust_{i}", user_id=user.id, name=f"Customer {i}", metadata_json={"i": i})
+               for i in range(rows))
+    db.flush()
+    db.add_all(UsageEvent(user_id=user.id, customer_id=f"cust_{i}", product_id=products[i % 20].id, quantity=i)
+               for i in range(rows))
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app = FastAPI()
+    app.include_router(customers_router, prefix="/fast/customers")
+    app.include_router(products_router, prefix="/fast/products")
+    app.include_router(usage_router, prefix="/fast/usage")
+    app.include_router(legacy_router(), prefix="/legacy")
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app, headers={"api-key": API_KEY})
+
+
+def median_ms(client: TestClient, path: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=max(PAGE_SIZES))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    client = build_client(args.rows)
+    endpoints = [("customers", "/legacy/customers", "/fast/customers"),
+                 ("products", "/legacy/products", "/fast/products/"),
+                 ("usage events", "/legacy/usage/events", "/fast/usage/events")]
+
+    print(f"{'endpoint':<14} {'page':>6} {'legacy ms':>10} {'fast ms':>9} {'speedup':>8}")
+    for name, legacy, fast in endpoints:
+        for size in (s for s in PAGE_SIZES if s <= args.rows):
+            query = f"?limit={size}"
+            legacy_ms = median_ms(client, legacy + query, args.repeat)
+            fast_ms = median_ms(client, fast + query, args.repeat)
+            print(f"{name:<14} {size:>6} {legacy_ms:>10.2f} {fast_ms:>9.2f} {legacy_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
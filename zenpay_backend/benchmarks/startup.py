@@ -0,0 +1,67 @@
+# benchmarks/startup.py
+"""
+Measure worker cold-start time: how long a fresh interpreter takes to import
+the application module, as each uvicorn worker does on boot.
+
+Each run uses a fresh working directory, so anything the import does on disk
+(creating ./zenpay.db, seeding users, writing logs) is paid in full. Besides
+the total wall time, the app-owned part is reported separately: third-party
+libraries are preloaded and only the application import itself is timed.
+
+    python benchmarks/startup.py [--runs 10] [--module main]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+THIRD_PARTY = "fastapi, sqlalchemy.orm, stripe, pydantic, pydantic_settings, passlib.context, jose"
+CHILD = (
+    "import time, {preload}\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - started)\n"
+)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_import(module: str, preload: bool = False) -> float:
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    code = CHILD.format(preload=THIRD_PARTY, module=module) if preload else f"import {module}"
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=workdir,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        elapsed = time.perf_counter() - started
+    if preload:
+        return float(result.stdout.strip().splitlines()[-1])
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--module", default="main")
+    args = parser.parse_args()
+
+    total = [time_import(args.module) for _ in range(args.runs)]
+    app_only = [time_import(args.module, preload=True) for _ in range(args.runs)]
+
+    print(f"import {args.module} (cold process): median {statistics.median(total) * 1000:.0f} ms, "
+          f"min {min(total) * 1000:.0f} ms, max {max(total) * 1000:.0f} ms over {args.runs} runs")
+    print(f"import {args.module} (libraries preloaded): median {statistics.median(app_only) * 1000:.1f} ms, "
+          f"min {min(app_only) * 1000:.1f} ms, max {max(app_only) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
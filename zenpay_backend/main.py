@@ -3,99 +3,102 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), "api"))
 
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+
+import stripe
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+
 from api.routes.products import router as products_router
 from api.routes.usage import router as usage_router
 from api.routes.credits import router as credits_router
 from api.routes.subscriptions import router as subscriptions_router
-
-from api.db.models import Base
-from api.db.session import engine
-
-Base.metadata.create_all(bind=engine)
-
-# Import routers
 from api.routes.customers import router as customers_router
-
-import stripe
+from api.routes.invoices import router as invoices_router
 from api.core.config import settings
-
-import stripe
-from api.core.config import settings
-
-# Create the FastAPI app
-app = FastAPI(
-    title="ZenPay API",
-    description="API for usage-based billing with Stripe",
-    version="0.1.0"
-)
-
-# Set Stripe API key
-stripe.api_key = settings.STRIPE_API_KEY
-
-import logging
+from api.core import metrics
+from api.core.idempotency import IdempotencyMiddleware
+from api.core.lanes import shutdown_lanes
+from api.core.load_shedding import LoadSheddingMiddleware
+from api.db.profiling import QueryProfilingMiddleware
+from api.dependencies import enforce_tenant_limits
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-logger.info("✅ LOADING MAIN.PY")
-# Create database tables
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include routers
-app.include_router(customers_router, prefix="/api/v1/customers", tags=["customers"])
-
-# Create a test user for development
-def create_test_user():
-    from api.db.session import SessionLocal
-    from api.db.models import User
-    
-    db = SessionLocal()
-    try:
-        # Check if test user exists
-        test_user = db.query(User).filter(User.email == "test@example.com").first()
-        if not test_user:
-            # Create test user
-            test_api_key = "zp_test_key"
-            test_user = User(
-                email="test@example.com",
-                api_key=test_api_key,
-                company_name="Test Company"
-            )
-            db.add(test_user)
-            db.commit()
-            print(f"Test user created with API key: {test_api_key}")
-        else:
-            print(f"Using existing test user with API key: {test_user.api_key}")
-        return test_user.api_key
-    finally:
-        db.close()
-
-app.include_router(products_router, prefix="/api/v1/products", tags=["products"])
-app.include_router(usage_router, prefix="/api/v1/usage", tags=["usage"])
-app.include_router(credits_router, prefix="/api/v1/credits")
-app.include_router(subscriptions_router, prefix="/api/v1/subscriptions", tags=["subscriptions"])
-
-# Initialize test user
-TEST_API_KEY = create_test_user()
-
-@app.get("/")
-def root():
-    return {
-        "message": "Welcome to ZenPay API",
-        "docs_url": "/docs",
-        "test_api_key": TEST_API_KEY
-    }
-
-@app.get("/health")
-def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Per-worker startup. Schema creation and seeding are not done here; run
+    ``python -m api.db.migrate`` once per deployment instead.
+    """
+    stripe.api_key = settings.STRIPE_API_KEY
+    if settings.METRICS_ENABLED:
+        metrics.instrument_stripe()
+    app.state.test_api_key = None
+    if settings.SEED_TEST_USER:
+        from api.db.migrate import seed_test_user
+        app.state.test_api_key = seed_test_user()
+    logger.info("ZenPay API worker started")
+    yield
+    shutdown_lanes()
+
+
+def create_app() -> FastAPI:
+    """Build the ZenPay API application without touching the database"""
+    app = FastAPI(
+        title="ZenPay API",
+        description="API for usage-based billing with Stripe",
+        version="0.1.0",
+        lifespan=lifespan,
+        dependencies=[Depends(metrics.track_in_flight)] if settings.METRICS_ENABLED else [],
+    )
+
+    # Innermost, so replayed responses still show up in metrics
+    app.add_middleware(IdempotencyMiddleware)
+    if settings.SHED_ENABLED:
+        app.add_middleware(LoadSheddingMiddleware)
+    if settings.METRICS_ENABLED:
+        app.add_middleware(metrics.MetricsMiddleware)
+    app.add_middleware(QueryProfilingMiddleware)
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Include routers; every API router is subject to the per-tenant limits
+    tenant_limits = [Depends(enforce_tenant_limits)]
+    app.include_router(customers_router, prefix="/api/v1/customers", dependencies=tenant_limits, tags=["customers"])
+    app.include_router(products_router, prefix="/api/v1/products", dependencies=tenant_limits, tags=["products"])
+    app.include_router(usage_router, prefix="/api/v1/usage", dependencies=tenant_limits, tags=["usage"])
+    app.include_router(credits_router, prefix="/api/v1/credits", dependencies=tenant_limits)
+    app.include_router(subscriptions_router, prefix="/api/v1/subscriptions", dependencies=tenant_limits, tags=["subscriptions"])
+    app.include_router(invoices_router, prefix="/api/v1/invoices", dependencies=tenant_limits, tags=["invoices"])
+
+    @app.get("/")
+    def root():
+        return {
+            "message": "Welcome to ZenPay API",
+            "docs_url": "/docs",
+            "test_api_key": app.state.test_api_key,
+        }
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "healthy"}
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint():
+        return Response(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
+    return app
+
+
+app = create_app()
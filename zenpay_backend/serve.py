@@ -0,0 +1,55 @@
+# serve.py
+"""
+Production entry point: runs the API in N worker processes.
+
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 8000]
+
+Workers default to WEB_CONCURRENCY, or one per core available to this
+process. Each worker imports the app itself and opens its own database
+engine and pool; nothing is shared between workers except the database, so
+in-process state (metrics, caches) is per worker. On SIGTERM/SIGINT the
+supervisor stops accepting connections and lets in-flight requests finish
+for up to GRACEFUL_SHUTDOWN_SECONDS.
+
+Run ``python -m api.db.migrate`` before starting workers. For development
+with auto-reload use run.py.
+"""
+import argparse
+import os
+import sys
+
+import uvicorn
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+
+from api.core.config import settings
+
+
+def default_workers() -> int:
+    if settings.WEB_CONCURRENCY > 0:
+        return settings.WEB_CONCURRENCY
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ZenPay API with multiple worker processes")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--app", default="main:app", help="ASGI app import string")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_SECONDS,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
+import os
+import sys
+
 import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Route and CRUD modules import ``core.*`` / ``models.*`` relative to api/, as main.py sets up
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "api"))
 
 from zenpay_backend.api.db.models import Base, User, Product
 from api.core.security import get_password_hash, generate_api_key
+from api.db import models
+from api.db.profiling import profile_engine
+from api.db.session import get_db
 
 # Use an in-memory SQLite database for tests
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -61,4 +73,40 @@ def test_products(db_session, test_user):
     db_session.add(product2)
     db_session.commit()
     
-    return [product1, product2]
\ No newline at end of file
+    return [product1, product2]
+
+
+@pytest.fixture
+def engine():
+    """One in-memory database shared by every session of a test, with query counting"""
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    models.Base.metadata.create_all(bind=engine)
+    profile_engine(engine)
+    return engine
+
+
+@pytest.fixture
+def app_client(engine):
+    """
+    Build a TestClient for an app serving ``routers`` (prefix -> router) with
+    ``get_db`` bound to ``engine``. Requests carry ``api_key`` when one is given.
+    """
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def make(routers, api_key=None, dependencies=None):
+        app = FastAPI()
+        for prefix, router in routers.items():
+            app.include_router(router, prefix=prefix, dependencies=dependencies)
+        app.dependency_overrides[get_db] = override_get_db
+        return TestClient(app, headers={"api-key": api_key} if api_key else None)
+
+    return make
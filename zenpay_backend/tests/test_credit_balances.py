@@ -0,0 +1,80 @@
+import json
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from api.core.config import settings
+from api.db.crud.credits import get_credit_balances_micros, iter_credit_balances_micros
+from api.db.models import CreditTransaction, Customer, User
+from api.db.profiling import count_queries
+from api.routes.credits import router as credits_router
+
+API_KEY = "zp_balances_key"
+
+
+@pytest.fixture
+def SessionLocal(engine):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    db.add(User(id="user_1", email="balances@example.com", api_key=API_KEY))
+    db.add(User(id="user_2", email="other@example.com", api_key="zp_other"))
+    db.add_all(Customer(id=f"cust_{i}", user_id="user_1") for i in range(5))
+    db.add(Customer(id="cust_other", user_id="user_2"))
+    db.add_all([
+        CreditTransaction(user_id="user_1", customer_id="cust_0", amount=10, type="topup"),
+        CreditTransaction(user_id="user_1", customer_id="cust_0", amount=-2.5, type="usage"),
+        CreditTransaction(user_id="user_1", customer_id="cust_3", amount=0.1, type="topup"),
+        CreditTransaction(user_id="user_2", customer_id="cust_other", amount=7, type="topup"),
+    ])
+    db.commit()
+    db.close()
+    return SessionLocal
+
+
+@pytest.fixture
+def client(SessionLocal, app_client):
+    return app_client({"/api/v1/credits": credits_router}, api_key=API_KEY)
+
+
+def test_balances_in_one_query(engine, SessionLocal):
+    db = SessionLocal()
+    with count_queries(engine) as counter:
+        balances = get_credit_balances_micros(db, "user_1", ["cust_0", "cust_1", "cust_3", "cust_other", "nope"])
+
+    assert counter.count == 1
+    assert balances == {"cust_0": 7_500_000, "cust_1": 0, "cust_3": 100_000}
+
+
+def test_iter_balances_pages_through_every_customer(engine, SessionLocal):
+    db = SessionLocal()
+    with count_queries(engine) as counter:
+        balances = list(iter_credit_balances_micros(db, "user_1", page_size=2))
+
+    assert balances == [("cust_0", 7_500_000), ("cust_1", 0), ("cust_2", 0), ("cust_3", 100_000), ("cust_4", 0)]
+    assert counter.count == 3
+
+
+def test_balances_route(client):
+    response = client.post("/api/v1/credits/balances", json={"customer_ids": ["cust_3", "cust_other", "cust_0", "cust_3"]})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "balances": [{"customer_id": "cust_3", "balance": 0.1}, {"customer_id": "cust_0", "balance": 7.5}],
+        "not_found": ["cust_other"],
+    }
+
+
+def test_balances_route_limits_ids(client, monkeypatch):
+    monkeypatch.setattr(settings, "BALANCE_LOOKUP_MAX_IDS", 2)
+    response = client.post("/api/v1/credits/balances", json={"customer_ids": ["cust_0", "cust_1", "cust_2"]})
+    assert response.status_code == 422
+
+
+def test_stream_balances_route(client):
+    response = client.get("/api/v1/credits/balances")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["customer_id"] for row in rows] == [f"cust_{i}" for i in range(5)]
+    assert rows[0]["balance"] == 7.5
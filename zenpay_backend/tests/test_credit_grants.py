@@ -0,0 +1,84 @@
+import time
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from api.db.crud.credits import grant_credits, get_credit_balance
+from api.db.models import CreditTransaction, Customer, User
+from api.db.profiling import count_queries
+from api.routes.credits import router as credits_router
+from core.exceptions import CustomerNotFoundError
+
+API_KEY = "zp_grant_key"
+
+
+@pytest.fixture
+def SessionLocal(engine):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    db.add(User(id="user_1", email="grant@example.com", api_key=API_KEY))
+    db.add(User(id="user_2", email="other@example.com", api_key="zp_other"))
+    db.add_all(Customer(id=f"cust_{i}", user_id="user_1") for i in range(3))
+    db.add(Customer(id="cust_other", user_id="user_2"))
+    db.commit()
+    db.close()
+    return SessionLocal
+
+
+@pytest.fixture
+def client(SessionLocal, app_client):
+    return app_client({"/api/v1/credits": credits_router}, api_key=API_KEY)
+
+
+def test_grant_credits_every_customer_once(SessionLocal):
+    db = SessionLocal()
+    granted = grant_credits(db, "user_1", ["cust_0", "cust_1", "cust_0", "cust_2"], 2.5, "Promo")
+
+    assert granted == 3
+    assert [get_credit_balance(db, "user_1", f"cust_{i}") for i in range(3)] == [2.5, 2.5, 2.5]
+    assert {t.description for t in db.query(CreditTransaction)} == {"Promo"}
+    assert [c.credits_version for c in db.query(Customer).filter(Customer.user_id == "user_1")] == [1, 1, 1]
+
+
+def test_grant_credits_rejects_unknown_customers_without_writing(SessionLocal):
+    db = SessionLocal()
+    with pytest.raises(CustomerNotFoundError, match="2 customers not found: cust_missing, cust_other"):
+        grant_credits(db, "user_1", ["cust_0", "cust_missing", "cust_other"], 1)
+
+    db.rollback()
+    assert db.query(CreditTransaction).count() == 0
+    assert db.query(Customer).filter(Customer.credits_version > 0).count() == 0
+
+
+def test_grant_credits_queries_do_not_grow_with_customers(engine, SessionLocal):
+    db = SessionLocal()
+    db.add_all(Customer(id=f"bulk_{i:05d}", user_id="user_1") for i in range(20000))
+    db.commit()
+    ids = [f"bulk_{i:05d}" for i in range(20000)]
+
+    started = time.perf_counter()
+    with count_queries(engine) as counter:
+        assert grant_credits(db, "user_1", ids, 0.01) == 20000
+    elapsed = time.perf_counter() - started
+
+    # Two IN chunks for the check, one executemany, two IN chunks for the versions
+    assert counter.count <= 6
+    assert elapsed < 10
+    assert db.query(CreditTransaction).count() == 20000
+    assert get_credit_balance(db, "user_1", "bulk_19999") == 0.01
+
+
+def test_grant_route(client):
+    response = client.post("/api/v1/credits/grant", json={"customer_ids": ["cust_0", "cust_1"], "amount": 0.1})
+    assert response.status_code == 200
+    assert response.json() == {"granted": 2, "amount": 0.1, "total": 0.2}
+
+    balance = client.get("/api/v1/credits/balance/cust_1")
+    assert balance.json()["balance"] == 0.1
+
+    missing = client.post("/api/v1/credits/grant", json={"customer_ids": ["cust_0", "cust_x"], "amount": 1})
+    assert missing.status_code == 404
+    assert "cust_x" in missing.json()["detail"]
+
+    assert client.post("/api/v1/credits/grant", json={"customer_ids": [], "amount": 1}).status_code == 422
+    assert client.post("/api/v1/credits/grant", json={"customer_ids": ["cust_0"], "amount": 0}).status_code == 422
@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from api.db.crud.credit_leases import (
+    charge_credit_lease, create_credit_lease, release_credit_lease, settle_expired_credit_leases,
+)
+from api.db.crud.credits import get_credit_balance
+from api.db.crud.usage import track_usage
+from api.db.models import CreditLease, CreditTransaction, Customer, Product, User
+from api.db.profiling import count_queries
+from api.routes.credits import router as credits_router
+from api.services.credit_leases import settle_expired_leases
+from core.exceptions import CreditLeaseExpiredError, CreditLeaseNotFoundError, InsufficientCreditsError
+
+API_KEY = "zp_lease_key"
+
+
+@pytest.fixture
+def SessionLocal(engine):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    db.add(User(id="user_1", email="lease@example.com", api_key=API_KEY))
+    db.add(Customer(id="cust_1", user_id="user_1"))
+    db.add(Customer(id="cust_2", user_id="user_1"))
+    db.add(Product(id="prod_1", user_id="user_1", name="Tokens", code="tokens", unit_name="token",
+                   price_per_unit=0.5))
+    db.add(CreditTransaction(user_id="user_1", customer_id="cust_1", amount=10, type="topup"))
+    db.commit()
+    db.close()
+    return SessionLocal
+
+
+@pytest.fixture
+def db(SessionLocal):
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(SessionLocal, app_client):
+    return app_client({"/api/v1/credits": credits_router}, api_key=API_KEY)
+
+
+def test_lease_is_debited_up_front_and_settled_once(db):
+    lease = create_credit_lease(db, "user_1", "cust_1", 4, ttl_seconds=60)
+    assert get_credit_balance(db, "user_1", "cust_1") == 6
+
+    for _ in range(3):
+        track_usage(db, "user_1", "cust_1", "tokens", 2, lease_id=lease.id)
+    assert get_credit_balance(db, "user_1", "cust_1") == 6
+    db.refresh(lease)
+    assert (lease.used, lease.remaining) == (3.0, 1.0)
+
+    with pytest.raises(InsufficientCreditsError, match="lease remaining 1.0"):
+        track_usage(db, "user_1", "cust_1", "tokens", 4, lease_id=lease.id)
+    db.rollback()
+
+    released = release_credit_lease(db, "user_1", lease.id)
+    assert released.settled_at is not None
+    assert get_credit_balance(db, "user_1", "cust_1") == 7
+    release_credit_lease(db, "user_1", lease.id)
+    assert get_credit_balance(db, "user_1", "cust_1") == 7
+    assert [t.type for t in db.query(CreditTransaction).order_by(CreditTransaction.timestamp)] == [
+        "topup", "lease", "lease_settlement",
+    ]
+
+    with pytest.raises(CreditLeaseExpiredError):
+        charge_credit_lease(db, "user_1", lease.id, "cust_1", 1)
+
+
+def test_lease_charge_skips_the_ledger(engine, db):
+    lease = create_credit_lease(db, "user_1", "cust_1", 4, ttl_seconds=60)
+    with count_queries(engine) as counter:
+        charge_credit_lease(db, "user_1", lease.id, "cust_1", 500_000)
+    db.commit()
+
+    assert counter.count == 1
+    assert "credit_transactions" not in counter.statements[0]
+
+
+def test_lease_needs_balance_and_matching_customer(db):
+    with pytest.raises(InsufficientCreditsError):
+        create_credit_lease(db, "user_1", "cust_2", 1, ttl_seconds=60)
+
+    lease = create_credit_lease(db, "user_1", "cust_1", 1, ttl_seconds=60)
+    with pytest.raises(CreditLeaseNotFoundError):
+        charge_credit_lease(db, "user_1", lease.id, "cust_2", 1)
+    with pytest.raises(CreditLeaseNotFoundError):
+        charge_credit_lease(db, "user_1", "missing", "cust_1", 1)
+
+
+def test_expired_leases_are_settled(db):
+    now = datetime.utcnow()
+    lease = create_credit_lease(db, "user_1", "cust_1", 5, ttl_seconds=10, now=now)
+    charge_credit_lease(db, "user_1", lease.id, "cust_1", 2_000_000, now=now)
+    db.commit()
+
+    with pytest.raises(CreditLeaseExpiredError):
+        charge_credit_lease(db, "user_1", lease.id, "cust_1", 1, now=now + timedelta(seconds=10))
+    assert settle_expired_credit_leases(db, now + timedelta(seconds=5)) == 0
+
+    # A new lease of the customer settles the expired one first
+    create_credit_lease(db, "user_1", "cust_1", 8, ttl_seconds=10, now=now + timedelta(seconds=11))
+    assert get_credit_balance(db, "user_1", "cust_1") == 0
+    assert db.get(CreditLease, lease.id).settled_at is not None
+
+
+def test_sweep_settles_in_batches(db):
+    past = datetime.utcnow() - timedelta(minutes=5)
+    for _ in range(5):
+        create_credit_lease(db, "user_1", "cust_1", 1, ttl_seconds=1, now=past)
+    assert get_credit_balance(db, "user_1", "cust_1") == 5
+
+    assert settle_expired_leases(db, batch_size=2) == 5
+    assert get_credit_balance(db, "user_1", "cust_1") == 10
+    assert db.query(CreditLease).filter(CreditLease.settled_at.is_(None)).count() == 0
+
+
+def test_lease_routes(client):
+    response = client.post("/api/v1/credits/leases", json={"customer_id": "cust_1", "amount": 3, "ttl_seconds": 30})
+    assert response.status_code == 201
+    lease = response.json()
+    assert (lease["amount"], lease["used"], lease["remaining"], lease["settled_at"]) == (3, 0, 3, None)
+
+    assert client.get(f"/api/v1/credits/leases/{lease['id']}").json()["id"] == lease["id"]
+    released = client.post(f"/api/v1/credits/leases/{lease['id']}/release").json()
+    assert released["settled_at"] is not None
+    assert client.get("/api/v1/credits/balance/cust_1").json()["balance"] == 10
+
+    assert client.post("/api/v1/credits/leases", json={"customer_id": "cust_2", "amount": 3}).status_code == 402
+    assert client.post("/api/v1/credits/leases", json={"customer_id": "nope", "amount": 3}).status_code == 404
+    assert client.post("/api/v1/credits/leases", json={"customer_id": "cust_1", "amount": 1,
+                                                       "ttl_seconds": 10 ** 6}).status_code == 422
+    assert client.get("/api/v1/credits/leases/missing").status_code == 404
+    assert client.post("/api/v1/credits/leases/missing/release").status_code == 404
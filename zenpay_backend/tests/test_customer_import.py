@@ -0,0 +1,111 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+import stripe
+from sqlalchemy.orm import sessionmaker
+
+from api.db.models import User, Customer
+from api.db.profiling import count_queries
+from api.routes.customers import router as customers_router
+from api.services.bulk_import import ImportFileError, parse_records
+from api.models.request import CustomerCreate
+
+API_KEY = "zp_import_key"
+
+
+@pytest.fixture
+def client(engine, app_client):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    db.add(User(id="user_1", email="import@example.com", api_key=API_KEY))
+    db.add(User(id="user_2", email="other@example.com", api_key="zp_other"))
+    db.add(Customer(id="cust_existing", user_id="user_1", stripe_customer_id="cus_existing"))
+    db.add(Customer(id="cust_taken", user_id="user_2"))
+    db.commit()
+    db.close()
+
+    return app_client({"/api/v1/customers": customers_router}, api_key=API_KEY)
+
+
+def fake_create(**params):
+    if params["email"] == "declined@example.com":
+        raise stripe.error.InvalidRequestError("Invalid email", "email")
+    return SimpleNamespace(id="cus_" + params["metadata"]["customer_id"])
+
+
+def test_parse_reports_bad_lines_and_duplicates():
+    body = b'{"id": "a"}\nnot json\n{"name": "no id"}\n\n{"id": "a"}\n{"id": "b"}\n'
+    records, errors = parse_records(body, "application/x-ndjson", CustomerCreate, "id", max_rows=10)
+    assert [(line, record.id) for line, record in records] == [(1, "a"), (6, "b")]
+    assert [(error["line"], error["id"]) for error in errors] == [(2, None), (3, None), (5, "a")]
+    assert errors[1]["error"].startswith("id:")
+
+    with pytest.raises(ImportFileError):
+        parse_records(body, "application/x-ndjson", CustomerCreate, "id", max_rows=3)
+
+
+def test_csv_import(client, engine):
+    body = "id,name,email\ncust_1,Ada,ada@example.com\ncust_2,,\n"
+    with patch("stripe.Customer.create", side_effect=fake_create) as create:
+        response = client.post("/api/v1/customers/import", content=body, headers={"Content-Type": "text/csv"})
+    assert response.status_code == 202
+
+    job = client.get(f"/api/v1/customers/import/{response.json()['id']}").json()
+    assert (job["status"], job["created"], job["failed"]) == ("completed", 2, 0)
+    assert create.call_args_list[0].kwargs["idempotency_key"] == "customer-import:user_1:cust_1"
+    db = sessionmaker(bind=engine)()
+    assert db.get(Customer, "cust_1").stripe_customer_id == "cus_cust_1"
+    assert db.get(Customer, "cust_2").email is None
+
+
+def test_jsonl_import_skips_existing_and_reports_failures(client, engine):
+    lines = [{"id": f"cust_{i}", "email": f"c{i}@example.com"} for i in range(7)]
+    lines += [
+        {"id": "cust_existing"},
+        {"id": "cust_taken"},
+        {"id": "cust_declined", "email": "declined@example.com"},
+        {"id": "cust_meta", "metadata": {"plan": "pro"}},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+
+    with patch("stripe.Customer.create", side_effect=fake_create) as create, \
+            patch("api.services.customer_import.settings.IMPORT_CHUNK_SIZE", 4), \
+            count_queries(engine) as queries:
+        response = client.post("/api/v1/customers/import", content=body)
+    job = response.json()
+
+    job = client.get(f"/api/v1/customers/import/{job['id']}").json()
+    assert (job["total"], job["processed"], job["created"], job["skipped"], job["failed"]) == (12, 12, 8, 1, 3)
+    assert job["status"] == "completed"
+    assert [(error["line"], error["id"]) for error in job["errors"]] == [
+        (12, None), (9, "cust_taken"), (10, "cust_declined"),
+    ]
+    assert create.call_count == 9
+    # One existence query and one insert per chunk
+    assert len([s for s in queries.statements if s.startswith("INSERT INTO customers")]) == 3
+    assert len([s for s in queries.statements if "WHERE customers.id IN" in s]) == 3
+
+    db = sessionmaker(bind=engine)()
+    assert db.query(Customer).filter(Customer.user_id == "user_1").count() == 9
+    assert db.get(Customer, "cust_meta").metadata_json == {"plan": "pro"}
+    assert db.get(Customer, "cust_taken").user_id == "user_2"
+
+
+def test_reimport_skips_imported_customers(client):
+    body = b'{"id": "cust_1"}\n{"id": "cust_2"}\n'
+    with patch("stripe.Customer.create", side_effect=fake_create):
+        client.post("/api/v1/customers/import", content=body)
+    with patch("stripe.Customer.create", side_effect=fake_create) as create:
+        job = client.post("/api/v1/customers/import", content=body).json()
+
+    job = client.get(f"/api/v1/customers/import/{job['id']}").json()
+    assert (job["created"], job["skipped"]) == (0, 2)
+    assert create.call_count == 0
+
+
+def test_unknown_job_and_bad_file(client):
+    assert client.get("/api/v1/customers/import/missing").status_code == 404
+    response = client.post("/api/v1/customers/import", content=b"\xff\xfe", headers={"Content-Type": "text/csv"})
+    assert response.status_code == 400
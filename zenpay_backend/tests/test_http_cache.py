@@ -0,0 +1,93 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from api.db.crud.credits import add_credits
+from api.db.crud.products import create_product
+from api.db.models import User, Customer
+from api.db.profiling import assert_max_queries
+from api.routes.credits import router as credits_router
+from api.routes.products import router as products_router
+
+API_KEY = "zp_etag_key"
+
+
+@pytest.fixture
+def session_factory(engine):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    user = User(id="user_1", email="etag@example.com", api_key=API_KEY)
+    db.add(user)
+    db.add(Customer(id="cust_1", user_id=user.id, name="ETag Customer"))
+    db.commit()
+    create_product(db, user.id, "Tokens", "tokens", "token", 0.01,
+                   stripe_product_id="prod_1", stripe_price_id="price_1")
+    add_credits(db, user.id, "cust_1", 100)
+    db.close()
+    return SessionLocal
+
+
+@pytest.fixture
+def client(session_factory, app_client):
+    return app_client(
+        {"/api/v1/products": products_router, "/api/v1/credits": credits_router}, api_key=API_KEY
+    )
+
+
+@pytest.mark.parametrize(
+    "path, queries",
+    [
+        ("/api/v1/products/", 1),
+        ("/api/v1/products/code/tokens", 1),
+        ("/api/v1/credits/balance/cust_1", 2),
+    ],
+)
+def test_matching_etag_returns_304_without_loading_data(engine, client, path, queries):
+    first = client.get(path)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    with assert_max_queries(engine, queries):
+        second = client.get(path, headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+    assert second.content == b""
+
+    weak = client.get(path, headers={"If-None-Match": f'"other", W/{etag}'})
+    assert weak.status_code == 304
+
+
+def test_product_write_invalidates_product_etags(session_factory, client):
+    etag = client.get("/api/v1/products/").headers["etag"]
+
+    db = session_factory()
+    create_product(db, "user_1", "Calls", "calls", "call", 0.02,
+                   stripe_product_id="prod_2", stripe_price_id="price_2")
+    db.close()
+
+    response = client.get("/api/v1/products/", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert {p["code"] for p in response.json()} == {"tokens", "calls"}
+
+
+def test_credit_transaction_invalidates_balance_etag(session_factory, client):
+    etag = client.get("/api/v1/credits/balance/cust_1").headers["etag"]
+
+    db = session_factory()
+    add_credits(db, "user_1", "cust_1", 50)
+    db.close()
+
+    response = client.get("/api/v1/credits/balance/cust_1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["balance"] == 150
+
+
+def test_untracked_rows_get_no_etag(session_factory, client):
+    db = session_factory()
+    db.add(Customer(id="cust_2", user_id="user_1"))
+    db.commit()
+    db.close()
+
+    response = client.get("/api/v1/credits/balance/cust_2", headers={"If-None-Match": "*"})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
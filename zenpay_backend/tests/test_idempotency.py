@@ -0,0 +1,128 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from api.core.idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+def build_app(store=None, **kwargs):
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware, store=store or IdempotencyStore(), **kwargs)
+    app.state.calls = 0
+
+    @app.post("/things")
+    async def create_thing(request: Request):
+        app.state.calls += 1
+        payload = await request.json()
+        await asyncio.sleep(payload.get("delay", 0))
+        if payload.get("fail"):
+            return JSONResponse({"detail": "boom"}, status_code=502)
+        return {"call": app.state.calls, "name": payload["name"]}
+
+    return app
+
+
+def post(client, body, key="key-1", api_key="zp_a"):
+    return client.post("/things", json=body, headers={"Idempotency-Key": key, "api-key": api_key})
+
+
+def test_retry_replays_stored_response():
+    app = build_app()
+    client = TestClient(app)
+
+    first = post(client, {"name": "a"})
+    second = post(client, {"name": "a"})
+
+    assert app.state.calls == 1
+    assert second.status_code == first.status_code == 200
+    assert second.json() == first.json() == {"call": 1, "name": "a"}
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+
+def test_keys_are_scoped_per_tenant_and_optional():
+    app = build_app()
+    client = TestClient(app)
+
+    post(client, {"name": "a"}, api_key="zp_a")
+    post(client, {"name": "a"}, api_key="zp_b")
+    client.post("/things", json={"name": "a"}, headers={"api-key": "zp_a"})
+
+    assert app.state.calls == 3
+
+
+def test_reused_key_with_different_body_is_rejected():
+    app = build_app()
+    client = TestClient(app)
+
+    post(client, {"name": "a"})
+    response = post(client, {"name": "b"})
+
+    assert response.status_code == 422
+    assert app.state.calls == 1
+
+
+def test_server_errors_are_not_stored():
+    app = build_app()
+    client = TestClient(app)
+
+    assert post(client, {"name": "a", "fail": True}).status_code == 502
+    assert post(client, {"name": "a", "fail": True}).status_code == 502
+    assert app.state.calls == 2
+
+
+def test_concurrent_duplicates_wait_for_first_request():
+    app = build_app()
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/things", json={"name": "a", "delay": 0.05},
+                            headers={"Idempotency-Key": "key-1", "api-key": "zp_a"})
+                for _ in range(5)
+            ))
+
+    responses = asyncio.run(run())
+
+    assert app.state.calls == 1
+    assert {r.json()["call"] for r in responses} == {1}
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 4
+
+
+def test_duplicate_gives_up_after_wait_timeout():
+    app = build_app(wait_timeout=0.01)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"Idempotency-Key": "key-1", "api-key": "zp_a"}
+            slow = asyncio.ensure_future(client.post("/things", json={"name": "a", "delay": 0.2}, headers=headers))
+            await asyncio.sleep(0.05)
+            duplicate = await client.post("/things", json={"name": "a", "delay": 0.2}, headers=headers)
+            return await slow, duplicate
+
+    first, duplicate = asyncio.run(run())
+
+    assert first.status_code == 200
+    assert duplicate.status_code == 409
+    assert app.state.calls == 1
+
+
+def test_store_evicts_expired_and_excess_entries():
+    now = [0.0]
+    store = IdempotencyStore(max_entries=2, ttl=10, clock=lambda: now[0])
+
+    store.put(("t", "a"), "f", 200, [], b"a")
+    store.put(("t", "b"), "f", 200, [], b"b")
+    store.put(("t", "c"), "f", 200, [], b"c")
+    assert store.get(("t", "a")) is None
+    assert len(store) == 2
+
+    now[0] = 11
+    assert store.get(("t", "b")) is None
+    store.put(("t", "d"), "f", 200, [], b"d")
+    assert len(store) == 1
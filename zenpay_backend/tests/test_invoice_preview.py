@@ -0,0 +1,156 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from api.db.crud.credit_leases import create_credit_lease
+from api.db.crud.usage import track_usage
+from api.db.models import User, Customer, Product, UsageEvent, CreditTransaction
+from api.db.profiling import count_queries
+from api.services.invoice_preview import InvoicePreviewCache
+from api.services.pricing import GRADUATED
+
+TIERS = [{"up_to": 100, "unit_amount": 0.1}, {"up_to": None, "unit_amount": 0.01}]
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(User(id="user_1", email="preview@example.com", api_key="zp_preview"))
+    for customer_id in ("cust_1", "cust_2", "cust_3"):
+        session.add(Customer(id=customer_id, user_id="user_1"))
+    session.add(Product(id="prod_flat", user_id="user_1", name="Calls", code="calls", unit_name="call",
+                        price_per_unit=0.5))
+    session.add(Product(id="prod_tiered", user_id="user_1", name="Tokens", code="tokens", unit_name="token",
+                        price_per_unit=0, tiers_mode=GRADUATED, price_tiers=TIERS))
+    session.add(CreditTransaction(user_id="user_1", customer_id="cust_1", amount=5,
+                                  timestamp=datetime(2025, 12, 20), type="topup"))
+    session.add(CreditTransaction(user_id="user_1", customer_id="cust_3", amount=2,
+                                  timestamp=datetime(2026, 3, 2), type="topup"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_usage(db, customer_id, product_id, quantity, when):
+    db.add(UsageEvent(user_id="user_1", customer_id=customer_id, product_id=product_id,
+                      quantity=quantity, timestamp=when))
+    db.commit()
+
+
+def test_previews_price_period_totals_and_apply_credits(db):
+    add_usage(db, "cust_1", "prod_flat", 4, datetime(2026, 2, 27))  # previous period
+    add_usage(db, "cust_1", "prod_flat", 10, datetime(2026, 3, 1, 8))
+    add_usage(db, "cust_1", "prod_tiered", 60, datetime(2026, 3, 2))
+    add_usage(db, "cust_1", "prod_tiered", 90, datetime(2026, 3, 3))
+    add_usage(db, "cust_2", "prod_tiered", 50, datetime(2026, 3, 3))
+
+    cache = InvoicePreviewCache(settle_seconds=5, max_tenants=10, now=Clock(datetime(2026, 3, 10)))
+    first, second, third = cache.previews(db, "user_1")
+
+    assert (first.period_start, first.period_end) == (datetime(2026, 3, 1), datetime(2026, 4, 1))
+    assert [(line.product_code, line.quantity, line.amount_micros) for line in first.lines] == [
+        ("calls", 10, 5_000_000), ("tokens", 150, 10_500_000),
+    ]
+    assert (first.subtotal_micros, first.credits_applied_micros, first.total_micros) == (
+        15_500_000, 5_000_000, 10_500_000,
+    )
+    assert (second.customer_id, second.total_micros) == ("cust_2", 5_000_000)
+    # Credits alone make a preview; they exceed the (empty) subtotal
+    assert (third.customer_id, third.lines, third.total_micros) == ("cust_3", [], 0)
+
+
+def test_later_requests_only_read_new_rows(engine, db):
+    clock = Clock(datetime(2026, 3, 10))
+    cache = InvoicePreviewCache(settle_seconds=5, max_tenants=10, now=clock)
+    add_usage(db, "cust_1", "prod_flat", 2, datetime(2026, 3, 5))
+    cache.previews(db, "user_1")
+
+    add_usage(db, "cust_1", "prod_flat", 3, datetime(2026, 3, 10, 0, 0, 30))
+    clock.now = datetime(2026, 3, 10, 0, 1)
+    with count_queries(engine) as queries:
+        preview, _ = cache.previews(db, "user_1")
+    assert preview.lines[0].quantity == 5
+    # The rows since the last request, and the unsettled ones
+    usage_windows = [s for s in queries.statements if "FROM usage_events" in s]
+    assert len(usage_windows) == 2
+    assert all("usage_events.timestamp >= ?" in s for s in usage_windows)
+
+    with count_queries(engine) as queries:
+        preview, _ = cache.previews(db, "user_1")
+    assert preview.lines[0].quantity == 5
+    assert len([s for s in queries.statements if "FROM usage_events" in s]) == 1
+
+
+def test_unsettled_rows_are_not_cached(db):
+    clock = Clock(datetime(2026, 3, 10))
+    cache = InvoicePreviewCache(settle_seconds=5, max_tenants=10, now=clock)
+    # Written "now"; visible at once, but left to later reads of the window
+    add_usage(db, "cust_1", "prod_flat", 1, datetime(2026, 3, 9, 23, 59, 58))
+    preview, _ = cache.previews(db, "user_1")
+    assert preview.lines[0].quantity == 1
+
+    clock.now = datetime(2026, 3, 10, 0, 0, 10)
+    preview, _ = cache.previews(db, "user_1")
+    assert preview.lines[0].quantity == 1
+
+
+def test_single_customer_preview(db):
+    add_usage(db, "cust_2", "prod_flat", 2, datetime(2026, 3, 5))
+    cache = InvoicePreviewCache(settle_seconds=5, max_tenants=10, now=Clock(datetime(2026, 3, 10)))
+
+    (preview,) = cache.previews(db, "user_1", customer_id="cust_2")
+    assert (preview.customer_id, preview.total_micros) == ("cust_2", 1_000_000)
+    (empty,) = cache.previews(db, "user_1", customer_id="cust_unknown")
+    assert (empty.lines, empty.total_micros) == ([], 0)
+
+
+def test_new_period_starts_from_zero(db):
+    add_usage(db, "cust_2", "prod_flat", 2, datetime(2026, 3, 5))
+    clock = Clock(datetime(2026, 3, 10))
+    cache = InvoicePreviewCache(settle_seconds=5, max_tenants=10, now=clock)
+    cache.previews(db, "user_1")
+
+    clock.now = datetime(2026, 4, 2)
+    previews = {preview.customer_id: preview for preview in cache.previews(db, "user_1")}
+    assert "cust_2" not in previews
+    assert previews["cust_1"].credit_balance_micros == 5_000_000
+
+
+def test_usage_paid_with_credits_is_not_billed_again(db):
+    db.add(CreditTransaction(user_id="user_1", customer_id="cust_2", amount=10, type="topup"))
+    db.commit()
+    track_usage(db, "user_1", "cust_2", "calls", 16)  # $8 debited from credits
+    cache = InvoicePreviewCache(settle_seconds=5, max_tenants=10)
+
+    (preview,) = cache.previews(db, "user_1", customer_id="cust_2")
+    assert (preview.subtotal_micros, preview.prepaid_applied_micros, preview.credit_balance_micros) == (
+        8_000_000, 8_000_000, 2_000_000,
+    )
+    assert (preview.credits_applied_micros, preview.total_micros) == (0, 0)
+
+    # Usage tracked without credits is billed; the balance left covers $2 of it
+    track_usage(db, "user_1", "cust_2", "calls", 8, use_customer_credits=False)
+    (preview,) = cache.previews(db, "user_1", customer_id="cust_2")
+    assert (preview.subtotal_micros, preview.credits_applied_micros, preview.total_micros) == (
+        12_000_000, 2_000_000, 2_000_000,
+    )
+
+
+def test_usage_charged_to_a_lease_is_not_billed_again(db):
+    lease = create_credit_lease(db, "user_1", "cust_3", 2, ttl_seconds=60)
+    track_usage(db, "user_1", "cust_3", "calls", 2, lease_id=lease.id)  # $1 of the lease
+    cache = InvoicePreviewCache(settle_seconds=5, max_tenants=10)
+
+    (preview,) = cache.previews(db, "user_1", customer_id="cust_3")
+    assert (preview.subtotal_micros, preview.prepaid_applied_micros, preview.total_micros) == (
+        1_000_000, 1_000_000, 0,
+    )
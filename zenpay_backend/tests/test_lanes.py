@@ -0,0 +1,114 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from api.core import lanes, metrics
+from api.core.lanes import Lane, LaneFullError, in_lane
+from api.db.profiling import QueryProfilingMiddleware, profile_engine
+
+
+def test_handler_runs_on_its_lane_and_keeps_query_stats():
+    engine = create_engine("sqlite:///:memory:")
+    profile_engine(engine)
+
+    app = FastAPI()
+    app.add_middleware(QueryProfilingMiddleware, add_header=True)
+
+    @app.get("/report/{name}")
+    @in_lane(lanes.REPORTING)
+    def report(name: str):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return {"name": name, "thread": threading.current_thread().name}
+
+    with TestClient(app) as client:
+        response = client.get("/report/x")
+
+    assert response.status_code == 200
+    assert response.json()["name"] == "x"
+    assert response.json()["thread"].startswith("lane-reporting")
+    assert response.headers["x-db-query-count"] == "1"
+    lanes.shutdown_lanes()
+
+
+def test_full_lane_rejects_instead_of_queueing():
+    lane = Lane("test", threads=1, queue_limit=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    async def run():
+        running = asyncio.ensure_future(lane.run(blocking))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        queued = asyncio.ensure_future(lane.run(lambda: "queued"))
+        await asyncio.sleep(0)
+        assert lane.queued == 1
+        assert metrics.LANE_QUEUE_DEPTH.value("test") == 1
+        with pytest.raises(LaneFullError):
+            await lane.run(lambda: "rejected")
+        release.set()
+        return await running, await queued
+
+    assert asyncio.run(run()) == ("done", "queued")
+    assert lane.queued == lane.active == 0
+    assert metrics.LANE_REJECTED.value("test") == 1
+    assert metrics.LANE_QUEUE_DEPTH.value("test") == 0
+    lane.shutdown()
+
+
+def test_full_lane_returns_503_with_retry_after(monkeypatch):
+    full = Lane(lanes.INGEST, threads=1, queue_limit=0)
+    monkeypatch.setattr(lanes, "get_lane", lambda name: full)
+
+    app = FastAPI()
+
+    @app.post("/track")
+    @in_lane(lanes.INGEST)
+    def track():
+        return {}
+
+    response = TestClient(app).post("/track")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    full.shutdown()
+
+
+def test_unknown_lane_is_rejected_at_import_time():
+    with pytest.raises(ValueError):
+        in_lane("nope")
+
+
+def test_cancelled_queued_call_leaves_the_queue():
+    lane = Lane("test_cancel", threads=1, queue_limit=5)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+
+    async def run():
+        running = asyncio.ensure_future(lane.run(blocking))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        queued = asyncio.ensure_future(lane.run(lambda: "never"))
+        await asyncio.sleep(0)
+        assert lane.queued == 1
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        release.set()
+        await running
+
+    asyncio.run(run())
+    lane.shutdown()
+    assert (lane.queued, lane.active) == (0, 0)
+    assert metrics.LANE_QUEUE_DEPTH.value("test_cancel") == 0
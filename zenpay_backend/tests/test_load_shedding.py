@@ -0,0 +1,115 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.core import lanes, metrics
+from api.core.lanes import in_lane, INGEST, REPORTING
+from api.core.load_shedding import DEFAULT_POOL, LatencyTracker, LoadSheddingMiddleware
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def build_app(**kwargs):
+    app = FastAPI()
+    app.add_middleware(LoadSheddingMiddleware, exempt_paths=["/api/v1/usage/track", "/health"], **kwargs)
+
+    @app.post("/api/v1/usage/track")
+    def track():
+        return {"ok": True}
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    @app.get("/api/v1/customers")
+    def customers():
+        return []
+
+    @app.post("/api/v1/credits/use")
+    @in_lane(INGEST)
+    def use_credits():
+        return {"ok": True}
+
+    @app.get("/api/v1/usage/events")
+    @in_lane(REPORTING)
+    def events():
+        return []
+
+    return app
+
+
+def shedder(client):
+    client.get("/health")  # builds the middleware stack
+    layer = client.app.middleware_stack
+    while not isinstance(layer, LoadSheddingMiddleware):
+        layer = layer.app
+    return layer
+
+
+def test_sheds_low_priority_routes_when_in_flight_limit_is_reached():
+    client = TestClient(build_app(max_in_flight=1, latency_slo_ms=0, lane_queue_fraction=0))
+    middleware = shedder(client)
+    middleware.in_flight[DEFAULT_POOL] = 1
+    before = metrics.SHED_REQUESTS.value(DEFAULT_POOL, "in_flight")
+
+    response = client.get("/api/v1/customers")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert metrics.SHED_REQUESTS.value(DEFAULT_POOL, "in_flight") == before + 1
+
+    assert client.post("/api/v1/usage/track").status_code == 200
+    assert client.get("/health").status_code == 200
+    # Lane routes do not run on the default threadpool
+    assert client.get("/api/v1/usage/events").status_code == 200
+
+    middleware.in_flight[DEFAULT_POOL] = 0
+    assert client.get("/api/v1/customers").status_code == 200
+
+
+def test_backed_up_lane_sheds_only_its_own_routes(monkeypatch):
+    reporting = lanes.get_lane(REPORTING)
+    client = TestClient(build_app(max_in_flight=0, latency_slo_ms=0, lane_queue_fraction=0.5))
+
+    assert client.get("/api/v1/usage/events").status_code == 200
+    monkeypatch.setattr(reporting, "queued", reporting.queue_limit // 2)
+    before = metrics.SHED_REQUESTS.value(REPORTING, "lane_queue")
+
+    assert client.get("/api/v1/usage/events").status_code == 503
+    assert metrics.SHED_REQUESTS.value(REPORTING, "lane_queue") == before + 1
+    assert client.post("/api/v1/credits/use").status_code == 200
+    assert client.get("/api/v1/customers").status_code == 200
+    assert client.post("/api/v1/usage/track").status_code == 200
+
+
+def test_sheds_while_recent_latency_of_the_lane_is_over_slo():
+    clock = FakeClock()
+    client = TestClient(build_app(max_in_flight=0, lane_queue_fraction=0, latency_slo_ms=100, clock=clock))
+    middleware = shedder(client)
+
+    for _ in range(20):
+        middleware.lane_latency(REPORTING).observe(0.5)
+    assert client.get("/api/v1/usage/events").status_code == 503
+    assert client.post("/api/v1/credits/use").status_code == 200
+    assert client.get("/api/v1/customers").status_code == 200
+
+    # Once the slow samples fall out of the window the signal clears
+    clock.now += 60
+    assert client.get("/api/v1/usage/events").status_code == 200
+
+
+def test_latency_tracker_averages_recent_samples():
+    clock = FakeClock()
+    tracker = LatencyTracker(window=5, clock=clock)
+    assert tracker.recent() == 0
+
+    tracker.observe(1.0)
+    tracker.observe(0.0)
+    assert tracker.recent() == 0.8
+
+    clock.now += 6
+    assert tracker.recent() == 0
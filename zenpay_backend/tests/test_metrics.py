@@ -0,0 +1,67 @@
+import pytest
+from fastapi import FastAPI, APIRouter, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from api.core import metrics
+from api.db.profiling import profile_engine
+
+
+@pytest.fixture
+def hist():
+    hist = metrics.Histogram("test_latency_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    yield hist
+    # Keep the test family out of later /metrics renders
+    metrics.REGISTRY.remove(hist)
+
+
+def test_histogram_renders_cumulative_buckets(hist):
+    hist.observe(0.05, "/a")
+    hist.observe(0.5, "/a")
+    hist.observe(5, "/a")
+
+    lines = hist.render()
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{route="/a"} 3' in lines
+
+
+def test_middleware_records_route_and_db_queries():
+    engine = create_engine("sqlite:///:memory:")
+    profile_engine(engine)
+
+    router = APIRouter()
+
+    @router.get("/items/{item_id}")
+    def read_item(item_id: str):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        return {"id": item_id}
+
+    app = FastAPI(dependencies=[Depends(metrics.track_in_flight)])
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(router, prefix="/api")
+
+    client = TestClient(app)
+    assert client.get("/api/items/1").status_code == 200
+    assert client.get("/api/items/2").status_code == 200
+
+    assert metrics.HTTP_REQUESTS.value("GET", "/api/items/{item_id}", "200") == 2
+    assert metrics.HTTP_LATENCY.count("GET", "/api/items/{item_id}") == 2
+    assert metrics.HTTP_IN_FLIGHT.value("/api/items/{item_id}") == 0
+    assert "zenpay_db_queries_per_request_sum{route=\"/api/items/{item_id}\"} 4" in metrics.render_metrics()
+
+
+def test_stripe_operation_normalizes_ids():
+    assert metrics.stripe_operation("post", "https://api.stripe.com/v1/customers/cus_123abc") == "POST /v1/customers/{id}"
+    assert metrics.stripe_operation("get", "https://api.stripe.com/v1/subscriptions?customer=cus_1") == "GET /v1/subscriptions"
+    assert metrics.stripe_operation("post", "https://api.stripe.com/v1/billing/meter_events") == "POST /v1/billing/meter_events"
+    assert metrics.stripe_operation(
+        "post", "https://api.stripe.com/v1/subscription_items/si_123/usage_records"
+    ) == "POST /v1/subscription_items/{id}/usage_records"
+    assert metrics.stripe_operation(
+        "get", "https://api.stripe.com/v1/billing/meters/mtr_test_61Q9/event_summaries"
+    ) == "GET /v1/billing/meters/{id}/event_summaries"
+    assert metrics.stripe_operation("get", "https://api.stripe.com/v1/customers/cus_NffrFeUfNV2Hib") == "GET /v1/customers/{id}"
@@ -0,0 +1,47 @@
+from sqlalchemy import create_engine, inspect, text
+
+from api.db.migrate import migrate
+
+
+def test_migrate_creates_schema_and_is_idempotent():
+    engine = create_engine("sqlite:///:memory:")
+
+    first = migrate(engine)
+    second = migrate(engine)
+
+    assert first == second
+    tables = set(inspect(engine).get_table_names())
+    assert {"users", "customers", "products", "usage_events", "credit_transactions", "schema_version"} <= tables
+
+
+def test_migrate_adds_columns_to_existing_tables():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id VARCHAR PRIMARY KEY, email VARCHAR, api_key VARCHAR)"))
+        conn.execute(text("CREATE TABLE customers (id VARCHAR PRIMARY KEY, user_id VARCHAR)"))
+        conn.execute(text("INSERT INTO users (id, email, api_key) VALUES ('u1', 'old@example.com', 'zp_old')"))
+
+    migrate(engine)
+
+    user_columns = {c["name"] for c in inspect(engine).get_columns("users")}
+    assert {"products_version", "rate_limit_per_second", "max_concurrent_requests"} <= user_columns
+    assert "credits_version" in {c["name"] for c in inspect(engine).get_columns("customers")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT products_version FROM users")).scalar() == 0
+
+
+def test_migrate_marks_existing_usage_reported():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE usage_events (id VARCHAR PRIMARY KEY, user_id VARCHAR, customer_id VARCHAR, "
+            "product_id VARCHAR, quantity FLOAT, reported_to_stripe BOOLEAN, timestamp DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO usage_events (id, quantity, reported_to_stripe) VALUES ('ev_1', 1, 0)"))
+        conn.execute(text("INSERT INTO usage_events (id, quantity) VALUES ('ev_2', 1)"))
+
+    migrate(engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT reported_to_stripe, report_to_stripe FROM usage_events")).all()
+    assert [tuple(row) for row in rows] == [(1, 1), (1, 1)]
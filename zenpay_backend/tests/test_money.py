@@ -0,0 +1,64 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.orm import sessionmaker
+
+from api.core.money import from_micros, stripe_decimal_cents, to_micros
+from api.db.crud.credits import get_credit_balance
+from api.db.migrate import MIGRATIONS, migrate
+from api.db.models import Base, CreditTransaction, Customer, Product, User
+from api.services.stripe_service import update_stripe_product_price
+
+
+def test_conversions():
+    assert to_micros(0.0001) == 100
+    assert to_micros("19.99") == 19_990_000
+    assert to_micros(Decimal("0.0000005")) == 0  # half to even
+    assert to_micros(None) is None
+    assert from_micros(2_500_000) == 2.5
+    assert [stripe_decimal_cents(m) for m in (100, 10_000, 12_345_000, 0)] == ["0.01", "1", "1234.5", "0"]
+
+
+def test_ledger_sums_are_exact():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(id="user_1", email="money@example.com", api_key="zp_money"),
+                Customer(id="cust_1", user_id="user_1")])
+    db.add(CreditTransaction(user_id="user_1", customer_id="cust_1", amount=1, type="topup"))
+    db.add_all(CreditTransaction(user_id="user_1", customer_id="cust_1", amount=-0.1, type="usage") for _ in range(10))
+    db.commit()
+
+    assert get_credit_balance(db, "user_1", "cust_1") == 0
+    assert db.query(func.sum(CreditTransaction.amount_micros)).scalar() == 0
+    assert db.query(CreditTransaction).filter(CreditTransaction.amount < 0).count() == 10
+
+
+def test_stripe_prices_keep_sub_cent_amounts():
+    with patch("stripe.Price.create") as create_price:
+        update_stripe_product_price("prod_s", None, 0.0001)
+    price = create_price.call_args.kwargs
+    assert "unit_amount" not in price
+    assert price["unit_amount_decimal"] == "0.01"
+
+
+def test_migration_converts_float_money_columns():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # Schema as of migration 7, with the dollar columns
+        conn.execute(text("CREATE TABLE schema_version (version INTEGER NOT NULL)"))
+        conn.execute(text("INSERT INTO schema_version VALUES (7)"))
+        conn.execute(text("ALTER TABLE credit_transactions DROP COLUMN amount_micros"))
+        conn.execute(text("ALTER TABLE credit_transactions ADD COLUMN amount FLOAT"))
+        conn.execute(text("ALTER TABLE products DROP COLUMN price_micros"))
+        conn.execute(text("ALTER TABLE products ADD COLUMN price_per_unit FLOAT"))
+        conn.execute(text("INSERT INTO credit_transactions (id, customer_id, amount) VALUES ('tx_1', 'cust_1', 10.1)"))
+        conn.execute(text("INSERT INTO products (id, price_per_unit, price_version) VALUES ('prod_1', 0.0003, 1)"))
+
+    assert migrate(engine) == MIGRATIONS[-1][0]
+
+    db = sessionmaker(bind=engine)()
+    assert db.get(CreditTransaction, "tx_1").amount_micros == 10_100_000
+    assert db.get(Product, "prod_1").price_micros == 300
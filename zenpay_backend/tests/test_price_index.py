@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from api.db.crud.products import create_product, delete_product, update_product
+from api.db.migrate import migrate
+from api.db.models import User, ProductPrice
+from api.db.profiling import count_queries
+from api.services.price_index import PriceIndex
+
+T0 = datetime(2026, 1, 1)
+
+
+def test_price_at_uses_the_price_in_effect():
+    index = PriceIndex([
+        ("prod_1", T0 + timedelta(days=10), 200_000, 2),
+        ("prod_1", T0, 100_000, 1),
+        ("prod_1", T0 + timedelta(days=20), 300_000, 3),
+        ("prod_2", T0, 5_000_000, 1),
+    ])
+
+    assert index.price_at("prod_1", T0 - timedelta(seconds=1)) is None
+    assert index.price_at("prod_1", T0).version == 1
+    assert index.price_at("prod_1", T0 + timedelta(days=10)).price_micros == 200_000
+    assert index.price_at("prod_1", T0 + timedelta(days=15)).version == 2
+    assert index.price_at("prod_1", T0 + timedelta(days=365)).version == 3
+    assert index.price_at("prod_unknown", T0) is None
+    assert index.rate("prod_2", 3, T0) == (15_000_000, 1)
+    assert index.rate("prod_1", 3, T0 - timedelta(days=1)) == (None, None)
+
+
+def test_product_writes_keep_history(engine):
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    db.add(User(id="user_1", email="prices@example.com", api_key="zp_prices"))
+    db.commit()
+    product = create_product(db, "user_1", "Tokens", "tokens", "token", 0.1,
+                             stripe_product_id="prod_s", stripe_price_id="price_1")
+    product_id = product.id
+    new_price = SimpleNamespace(id="price_2")
+    with patch("api.services.stripe_service.update_stripe_product_price", return_value=new_price), \
+            patch("stripe.Product.modify"):
+        update_product(db, "user_1", product_id, price_per_unit=0.2)
+        update_product(db, "user_1", product_id, name="Renamed")
+
+    with count_queries(engine) as queries:
+        index = PriceIndex.load(db, user_id="user_1")
+    assert queries.count == 1
+    first, second = (index.price_at(product_id, datetime(2100, 1, 1)), index.price_at(product_id, datetime(2000, 1, 1)))
+    assert (first.price_micros, first.version) == (200_000, 2)
+    assert second is None
+    assert [p.stripe_price_id for p in db.query(ProductPrice).order_by(ProductPrice.version)] == ["price_1", "price_2"]
+
+    with patch("stripe.Product.modify"):
+        delete_product(db, "user_1", product_id)
+    assert db.query(ProductPrice).count() == 0
+
+
+def test_migration_starts_history_at_current_price():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE products (id VARCHAR PRIMARY KEY, user_id VARCHAR, price_per_unit FLOAT, "
+            "stripe_price_id VARCHAR, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO products VALUES ('prod_1', 'user_1', 0.5, 'price_1', '2025-06-01 00:00:00')"))
+
+    migrate(engine)
+    migrate(engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT product_id, version, price_micros, effective_from FROM product_prices")).all()
+    assert [tuple(r) for r in rows] == [("prod_1", 1, 500_000, "2025-06-01 00:00:00.000000")]
@@ -0,0 +1,114 @@
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from api.db.crud.credits import get_credit_balance
+from api.db.crud.usage import track_usage
+from api.db.models import User, Customer, Product, CreditTransaction
+from api.services import pricing
+from api.services.price_index import PriceIndex
+from api.services.pricing import GRADUATED, VOLUME, TierTable, validate_tiers
+from api.services.stripe_service import create_stripe_product_and_price
+
+TIERS = [
+    {"up_to": 100, "unit_amount": 0.1},
+    {"up_to": 1000, "unit_amount": 0.05, "flat_amount": 2},
+    {"up_to": None, "unit_amount": 0.01},
+]
+
+
+def test_graduated_charges_each_unit_at_its_tier():
+    table = TierTable(GRADUATED, TIERS)
+    assert [table.cost(t) for t in (0, 50, 100, 101, 1000, 2000)] == [
+        0, 5_000_000, 10_000_000, 12_050_000, 57_000_000, 67_000_000,
+    ]
+    assert table.rate(90, 20) == 3_500_000
+
+
+def test_volume_charges_all_units_at_the_reached_tier():
+    table = TierTable(VOLUME, TIERS)
+    assert [table.cost(t) for t in (0, 50, 101, 2000)] == [0, 5_000_000, 7_050_000, 20_000_000]
+    # Crossing into a cheaper tier lowers the period total
+    assert table.rate(99, 2) == 7_050_000 - 9_900_000
+
+
+@pytest.mark.parametrize("mode", [GRADUATED, VOLUME])
+def test_rate_batch_matches_event_by_event_rating(mode):
+    table = TierTable(mode, TIERS)
+    quantities = [30, 70, 1, 500, 600, 5]
+    expected, total = [], 40
+    for quantity in quantities:
+        expected.append(table.rate(total, quantity))
+        total += quantity
+    assert table.rate_batch(quantities, period_to_date=40) == expected
+    assert sum(table.rate_batch(quantities, period_to_date=40)) == table.cost(total) - table.cost(40)
+
+
+def test_rate_batch_without_numpy(monkeypatch):
+    monkeypatch.setattr(pricing, "numpy", None)
+    assert TierTable(GRADUATED, TIERS).rate_batch([100, 1]) == [10_000_000, 2_050_000]
+
+
+def test_fractional_quantities_round_to_whole_micros():
+    table = TierTable.flat_rate(3)
+    assert table.cost(0.5) == 2
+    assert table.rate_batch([0.5, 0.5]) == [2, 1]
+
+
+@pytest.mark.parametrize("mode, tiers, message", [
+    ("stepped", TIERS, "tiers_mode"),
+    (GRADUATED, None, "required"),
+    (GRADUATED, [{"up_to": 10, "unit_amount": 1}], "last tier"),
+    (GRADUATED, [{"up_to": 10}, {"up_to": 5}, {"up_to": None}], "increasing"),
+    (VOLUME, [{"up_to": None, "unit_amount": -1}], "negative"),
+])
+def test_invalid_tiers_are_rejected(mode, tiers, message):
+    with pytest.raises(ValueError, match=message):
+        validate_tiers(mode, tiers)
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(User(id="user_1", email="tiers@example.com", api_key="zp_tiers"))
+    session.add(Customer(id="cust_1", user_id="user_1"))
+    session.add(Product(id="prod_1", user_id="user_1", name="Tokens", code="tokens", unit_name="token",
+                        price_per_unit=0, tiers_mode=GRADUATED, price_tiers=TIERS))
+    session.add(CreditTransaction(user_id="user_1", customer_id="cust_1", amount=100, type="topup"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_track_usage_rates_against_period_to_date_usage(db):
+    first = track_usage(db, "user_1", "cust_1", "tokens", 90)
+    second = track_usage(db, "user_1", "cust_1", "tokens", 20)
+
+    assert (first.cost_micros, second.cost_micros) == (9_000_000, 3_500_000)
+    assert get_credit_balance(db, "user_1", "cust_1") == 100 - 12.5
+
+
+def test_price_index_rates_tiered_history():
+    index = PriceIndex([("prod_1", datetime(2026, 1, 1), 0, 1, GRADUATED, TIERS)])
+    assert index.rate("prod_1", 20, datetime(2026, 1, 5), period_to_date=90) == (3_500_000, 1)
+
+
+def test_stripe_price_uses_tiers():
+    meters = SimpleNamespace(data=[SimpleNamespace(event_name="zenpay_tokens", id="mtr_1")])
+    with patch("stripe.billing.Meter.list", return_value=meters), \
+            patch("stripe.Product.create", return_value=SimpleNamespace(id="prod_s")), \
+            patch("stripe.Price.create") as create_price:
+        create_stripe_product_and_price("Tokens", 0, "tokens", "zenpay_tokens", "value",
+                                        tiers_mode=VOLUME, tiers=TIERS)
+
+    price = create_price.call_args.kwargs
+    assert "unit_amount" not in price
+    assert (price["billing_scheme"], price["tiers_mode"]) == ("tiered", VOLUME)
+    assert price["tiers"] == [
+        {"up_to": 100, "unit_amount_decimal": "10", "flat_amount_decimal": "0"},
+        {"up_to": 1000, "unit_amount_decimal": "5", "flat_amount_decimal": "200"},
+        {"up_to": "inf", "unit_amount_decimal": "1", "flat_amount_decimal": "0"},
+    ]
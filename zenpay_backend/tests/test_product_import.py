@@ -0,0 +1,138 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+import stripe
+from sqlalchemy.orm import sessionmaker
+
+from api.db.models import User, Product, ProductPrice
+from api.db.profiling import count_queries
+from api.routes.products import router as products_router
+
+API_KEY = "zp_catalog_key"
+
+
+@pytest.fixture
+def client(engine, app_client):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    db.add(User(id="user_1", email="catalog@example.com", api_key=API_KEY))
+    db.add(Product(id="prod_existing", user_id="user_1", name="Old", code="old", unit_name="unit",
+                   price_per_unit=1))
+    db.commit()
+    db.close()
+
+    return app_client({"/api/v1/products": products_router}, api_key=API_KEY)
+
+
+class FakeStripe:
+    """Stripe products and prices, with prices findable by lookup key"""
+
+    def __init__(self, fail_codes=()):
+        self.fail_codes = set(fail_codes)
+        self.prices = {}
+        self.meter_lookups = 0
+        self.created = []
+
+    def list_meters(self, **params):
+        self.meter_lookups += 1
+        return SimpleNamespace(data=[SimpleNamespace(event_name="zenpay_tokens", id="mtr_1")])
+
+    def create_product(self, name, metadata=None, idempotency_key=None):
+        if metadata["product_code"] in self.fail_codes:
+            raise stripe.error.APIError("Stripe is down")
+        return SimpleNamespace(id=f"sp_{metadata['product_code']}", metadata=metadata)
+
+    def create_price(self, product, lookup_key, idempotency_key=None, **params):
+        code = product[len("sp_"):]
+        price = SimpleNamespace(id=f"price_{code}", lookup_key=lookup_key,
+                                product=SimpleNamespace(id=product, metadata={"user_id": "user_1"}))
+        self.prices[lookup_key] = price
+        self.created.append((code, params))
+        return price
+
+    def list_prices(self, lookup_keys, **params):
+        assert len(lookup_keys) <= 10
+        return SimpleNamespace(data=[self.prices[key] for key in lookup_keys if key in self.prices])
+
+    def patch(self):
+        return [
+            patch("stripe.billing.Meter.list", side_effect=self.list_meters),
+            patch("stripe.Product.create", side_effect=self.create_product),
+            patch("stripe.Price.create", side_effect=self.create_price),
+            patch("stripe.Price.list", side_effect=self.list_prices),
+        ]
+
+
+def post_import(client, fake, body, content_type="application/x-ndjson"):
+    patches = fake.patch()
+    for p in patches:
+        p.start()
+    try:
+        job = client.post("/api/v1/products/import", content=body, headers={"Content-Type": content_type}).json()
+    finally:
+        for p in patches:
+            p.stop()
+    return client.get(f"/api/v1/products/import/{job['id']}").json()
+
+
+def catalog(count):
+    lines = [{"name": f"Product {i}", "code": f"p{i}", "unit_name": "call", "price_per_unit": 0.001 * i}
+             for i in range(count)]
+    return "\n".join(json.dumps(line) for line in lines)
+
+
+def test_catalog_import_resolves_the_meter_once_and_inserts_in_one_transaction(client, engine):
+    fake = FakeStripe()
+    body = catalog(12) + "\n" + json.dumps({"name": "Old", "code": "old", "unit_name": "unit", "price_per_unit": 1})
+    with count_queries(engine) as queries:
+        job = post_import(client, fake, body)
+
+    assert (job["status"], job["total"], job["created"], job["skipped"], job["failed"]) == ("completed", 13, 12, 1, 0)
+    assert fake.meter_lookups == 1
+    assert len(fake.created) == 12
+    assert all(params["recurring"]["meter"] == "mtr_1" for _, params in fake.created)
+    # Products, their price history and the catalog version commit once
+    inserts = [i for i, s in enumerate(queries.statements) if s.startswith("INSERT INTO products")]
+    assert len(inserts) == 1
+
+    db = sessionmaker(bind=engine)()
+    product = db.query(Product).filter(Product.code == "p5").one()
+    assert (product.stripe_price_id, product.price_micros) == ("price_p5", 5000)
+    assert db.query(ProductPrice).count() == 12
+    assert db.get(User, "user_1").products_version == 1
+
+
+def test_failed_import_can_be_sent_again(client, engine):
+    body = catalog(5)
+    first = post_import(client, FakeStripe(fail_codes={"p3"}), body)
+    assert (first["created"], first["failed"]) == (4, 1)
+    assert first["errors"][0]["id"] == "p3"
+
+    # Stripe already has p0..p4 minus p3; the rerun reuses them
+    fake = FakeStripe()
+    fake.prices = {f"zenpay_tokens_p{i}": SimpleNamespace(
+        id=f"price_p{i}", lookup_key=f"zenpay_tokens_p{i}",
+        product=SimpleNamespace(id=f"sp_p{i}", metadata={"user_id": "user_1"})) for i in (0, 1, 2, 4)}
+    db = sessionmaker(bind=engine)()
+    db.query(Product).filter(Product.code.in_(["p1", "p2"])).delete(synchronize_session=False)
+    db.commit()
+
+    second = post_import(client, fake, body)
+    assert (second["created"], second["skipped"], second["failed"]) == (3, 2, 0)
+    assert [code for code, _ in fake.created] == ["p3"]
+    assert db.query(Product).filter(Product.code == "p1").one().stripe_price_id == "price_p1"
+
+
+def test_csv_catalog_with_tiers(client, engine):
+    tiers = json.dumps([{"up_to": 10, "unit_amount": 0.5}, {"up_to": None, "unit_amount": 0.1}])
+    body = 'name,code,unit_name,price_per_unit,tiers_mode,tiers\n' \
+           f'Tokens,tokens,token,0,graduated,"{tiers.replace(chr(34), chr(34) * 2)}"\n' \
+           'Bad,bad,unit,0,graduated,\n'
+    job = post_import(client, FakeStripe(), body, content_type="text/csv")
+
+    assert (job["created"], job["failed"]) == (1, 1)
+    assert job["errors"][0]["line"] == 3
+    db = sessionmaker(bind=engine)()
+    assert db.query(Product).filter(Product.code == "tokens").one().price_tiers[0]["up_to"] == 10
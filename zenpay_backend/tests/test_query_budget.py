@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from api.db.models import User, Customer, Product, CreditTransaction, UsageEvent
+from api.db.profiling import QueryProfilingMiddleware, assert_max_queries
+from api.routes.credits import router as credits_router
+from api.routes.customers import router as customers_router
+from api.routes.products import router as products_router
+from api.routes.usage import router as usage_router
+
+API_KEY = "zp_budget_key"
+
+
+@pytest.fixture
+def client(engine, app_client):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = SessionLocal()
+    user = User(email="budget@example.com", api_key=API_KEY)
+    db.add(user)
+    db.flush()
+    db.add(Customer(id="cust_1", user_id=user.id, name="Budget Customer"))
+    products = [
+        Product(user_id=user.id, name=f"Product {i}", code=f"p{i}", unit_name="call", price_per_unit=0.01)
+        for i in range(3)
+    ]
+    db.add_all(products)
+    db.flush()
+    db.add(CreditTransaction(user_id=user.id, customer_id="cust_1", amount=100, type="topup"))
+    for i in range(30):
+        db.add(UsageEvent(user_id=user.id, customer_id="cust_1", product_id=products[i % 3].id, quantity=1))
+    db.commit()
+    db.close()
+
+    client = app_client(
+        {
+            "/api/v1/customers": customers_router,
+            "/api/v1/products": products_router,
+            "/api/v1/usage": usage_router,
+            "/api/v1/credits": credits_router,
+        },
+        api_key=API_KEY,
+    )
+    client.app.add_middleware(QueryProfilingMiddleware, add_header=True)
+    return client
+
+
+# One statement is always spent resolving the API key
+@pytest.mark.parametrize(
+    "path, budget",
+    [
+        ("/api/v1/customers/cust_1", 2),
+        ("/api/v1/customers", 2),
+        ("/api/v1/products/", 2),
+        ("/api/v1/products/code/p1", 2),
+        ("/api/v1/credits/balance/cust_1", 3),
+        ("/api/v1/credits/transactions/cust_1", 3),
+        ("/api/v1/usage/events", 2),
+    ],
+)
+def test_endpoint_query_budget(engine, client, path, budget):
+    with assert_max_queries(engine, budget):
+        response = client.get(path)
+    assert response.status_code == 200
+
+
+def test_query_count_header(client):
+    response = client.get("/api/v1/credits/balance/cust_1")
+    assert response.headers["x-db-query-count"] == "3"
+
+
+def test_assert_max_queries_reports_statements(engine, client):
+    with pytest.raises(AssertionError, match="Expected at most 1 queries, got 3"):
+        with assert_max_queries(engine, 1):
+            client.get("/api/v1/credits/balance/cust_1")
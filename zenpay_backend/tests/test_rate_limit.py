@@ -0,0 +1,83 @@
+import pytest
+from fastapi import Depends
+from sqlalchemy.orm import sessionmaker
+
+from api import dependencies
+from api.core.rate_limit import TenantLimiter
+from api.db.models import User, Customer
+from api.routes.customers import router as customers_router
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    limiter = TenantLimiter(clock=clock)
+
+    assert [limiter.acquire_rate("zp_a", rate=2, burst=3) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire_rate("zp_a", rate=2, burst=3) == pytest.approx(0.5)
+    # Other keys have their own bucket
+    assert limiter.acquire_rate("zp_b", rate=2, burst=3) == 0
+
+    clock.now = 0.5
+    assert limiter.acquire_rate("zp_a", rate=2, burst=3) == 0
+    assert limiter.acquire_rate("zp_a", rate=2, burst=3) > 0
+
+
+def test_zero_rate_is_unlimited():
+    limiter = TenantLimiter(clock=FakeClock())
+    assert all(limiter.acquire_rate("zp_a", rate=0, burst=0) == 0 for _ in range(1000))
+
+
+def test_concurrency_limit_per_tenant():
+    limiter = TenantLimiter()
+
+    first = limiter.acquire_slot("user_1", 2)
+    second = limiter.acquire_slot("user_1", 2)
+    assert first and second
+    assert limiter.acquire_slot("user_1", 2) is None
+    assert limiter.acquire_slot("user_2", 2) is not None
+
+    first.release()
+    assert limiter.acquire_slot("user_1", 2) is not None
+
+
+@pytest.fixture
+def client(monkeypatch, engine, app_client):
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = SessionLocal()
+    db.add(User(id="limited", email="limited@example.com", api_key="zp_limited",
+                rate_limit_per_second=0.001, rate_limit_burst=2))
+    db.add(User(id="default", email="default@example.com", api_key="zp_default"))
+    db.add(Customer(id="cust_1", user_id="limited"))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(dependencies, "tenant_limiter", TenantLimiter())
+    return app_client({"/api/v1/customers": customers_router},
+                      dependencies=[Depends(dependencies.enforce_tenant_limits)])
+
+
+def test_per_user_rate_limit_returns_429_with_retry_after(client):
+    headers = {"api-key": "zp_limited"}
+    assert client.get("/api/v1/customers/cust_1", headers=headers).status_code == 200
+    assert client.get("/api/v1/customers/cust_1", headers=headers).status_code == 200
+
+    response = client.get("/api/v1/customers/cust_1", headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+    # The default limits (unlimited rate) still apply to other tenants
+    for _ in range(5):
+        assert client.get("/api/v1/customers", headers={"api-key": "zp_default"}).status_code == 200
+
+
+def test_unknown_api_key_is_still_401(client):
+    assert client.get("/api/v1/customers", headers={"api-key": "zp_nope"}).status_code == 401
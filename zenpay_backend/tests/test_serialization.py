@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import List
+
+from pydantic import TypeAdapter
+
+from api.core.serialization import dumps, rows_to_dicts
+from api.db.crud.customers import CUSTOMER_FIELDS
+from api.db.crud.products import PRODUCT_FIELDS
+from api.db.crud.usage import USAGE_EVENT_FIELDS
+from models.response import CustomerResponse, ProductResponse, UsageEventResponse
+
+
+def _validated_json(model, rows, fields) -> bytes:
+    # What FastAPI produces through response_model validation
+    adapter = TypeAdapter(List[model])
+    return adapter.dump_json(adapter.validate_python(rows_to_dicts(rows, fields)), by_alias=True)
+
+
+def test_fast_path_matches_response_models():
+    ts = datetime(2026, 1, 2, 3, 4, 5, 678901)
+    cases = [
+        (UsageEventResponse, USAGE_EVENT_FIELDS, [("evt_1", "cust_1", "api_calls", 2.0, ts)]),
+        (ProductResponse, PRODUCT_FIELDS, [
+            ("prod_1", "API", "api_calls", "call", 0.1, None, None, ts.replace(microsecond=0)),
+            ("prod_2", "Tiered", "tiered", "call", 0.0, "graduated",
+             [{"up_to": 100, "unit_amount": 0.1, "flat_amount": 0.0}, {"up_to": None, "unit_amount": 0.05, "flat_amount": 0.0}],
+             ts),
+        ]),
+        (CustomerResponse, CUSTOMER_FIELDS, [("cust_1", "Name", None, {"plan": "pro"}, ts)]),
+    ]
+    for model, fields, rows in cases:
+        assert set(fields) == set(model.model_json_schema(by_alias=True)["properties"])
+        assert dumps(rows_to_dicts(rows, fields)) == _validated_json(model, rows, fields)
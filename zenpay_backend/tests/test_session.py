@@ -0,0 +1,18 @@
+import os
+
+from api.db import session
+
+
+def test_forked_worker_gets_its_own_engine():
+    parent_engine = session.engine
+    read_fd, write_fd = os.pipe()
+
+    pid = os.fork()
+    if pid == 0:
+        ok = session.engine is not parent_engine and session.SessionLocal.kw["bind"] is session.engine
+        os.write(write_fd, b"1" if ok else b"0")
+        os._exit(0)
+
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 1) == b"1"
+    assert session.engine is parent_engine
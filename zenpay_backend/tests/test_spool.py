@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+from zenpay.spool import UsageSpool, SpoolReplayer, SpoolFullError
+
+
+def test_spool_replays_in_order_and_survives_reopen(tmp_path):
+    spool = UsageSpool(str(tmp_path), fsync_batch=2)
+    for i in range(5):
+        spool.append({"customer_id": "c1", "quantity": i, "idempotency_key": f"k{i}"})
+    spool.close()
+
+    # Reopening picks up where the previous process left off
+    spool = UsageSpool(str(tmp_path))
+    assert [r["idempotency_key"] for _, r in spool.pending()] == ["k0", "k1", "k2", "k3", "k4"]
+    assert spool.append({"idempotency_key": "k5"}) == 6
+
+
+def test_replayer_acks_and_compacts(tmp_path):
+    spool = UsageSpool(str(tmp_path), segment_bytes=120)
+    for i in range(6):
+        spool.append({"idempotency_key": f"k{i}"})
+
+    sent = []
+    replayer = SpoolReplayer(spool, sent.append)
+    replayer.drain_once()
+
+    assert [r["idempotency_key"] for r in sent] == [f"k{i}" for i in range(6)]
+    assert not spool.has_pending()
+    assert spool.size_bytes == 0
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".seg")]
+
+
+def test_replayer_stops_at_first_failure(tmp_path):
+    spool = UsageSpool(str(tmp_path))
+    for i in range(3):
+        spool.append({"idempotency_key": f"k{i}"})
+
+    sent = []
+
+    def flaky_send(record):
+        if record["idempotency_key"] == "k1":
+            raise ConnectionError("server down")
+        sent.append(record)
+
+    delay = SpoolReplayer(spool, flaky_send, poll_interval=0.5).drain_once()
+
+    assert delay > 0
+    assert [r["idempotency_key"] for r in sent] == ["k0"]
+    assert [r["idempotency_key"] for _, r in spool.pending()] == ["k1", "k2"]
+
+
+def test_spool_size_cap(tmp_path):
+    spool = UsageSpool(str(tmp_path), max_bytes=200)
+    with pytest.raises(SpoolFullError):
+        for i in range(100):
+            spool.append({"idempotency_key": f"k{i}"})
+
+    # Acknowledged records free up space again
+    seq, _ = spool.pending()[-1]
+    spool.ack(seq)
+    spool.append({"idempotency_key": "after-ack"})
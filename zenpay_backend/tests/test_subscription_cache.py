@@ -0,0 +1,104 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from api.db.crud.subscriptions import resolve_subscription, sync_subscription_from_stripe
+from api.db.models import User, Customer, Product, Subscription, CreditTransaction
+from api.db.profiling import count_queries
+from api.routes.usage import router as usage_router
+from api.services.subscription_cache import CachedSubscription, SubscriptionCache, subscription_cache
+
+API_KEY = "zp_subs_key"
+
+
+@pytest.fixture
+def db(engine):
+    subscription_cache.clear()
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(User(id="user_1", email="subs@example.com", api_key=API_KEY))
+    session.add(Customer(id="cust_1", user_id="user_1", stripe_customer_id="cus_1"))
+    session.add(Product(id="prod_1", user_id="user_1", name="Tokens", code="tokens", unit_name="token",
+                        price_per_unit=0.01, stripe_product_id="sp_1", stripe_price_id="price_1"))
+    session.add(Subscription(user_id="user_1", customer_id="cust_1", product_id="prod_1",
+                             stripe_subscription_id="sub_1", stripe_subscription_item_id="si_1", status="active"))
+    session.add(CreditTransaction(user_id="user_1", customer_id="cust_1", amount=100, type="topup"))
+    session.commit()
+    yield session
+    session.close()
+    subscription_cache.clear()
+
+
+def stripe_subscription(status, item_id="si_1", price_id="price_1", sub_id="sub_1"):
+    return {
+        "id": sub_id,
+        "status": status,
+        "customer": "cus_1",
+        "items": {"data": [{"id": item_id, "price": {"id": price_id}}]},
+    }
+
+
+def test_resolve_is_served_from_cache_after_first_lookup(engine, db):
+    with count_queries(engine) as first:
+        entry = resolve_subscription(db, "user_1", "cust_1", "prod_1")
+    assert entry == CachedSubscription(True, "cus_1", "si_1")
+    assert first.count == 1
+
+    with count_queries(engine) as second:
+        assert resolve_subscription(db, "user_1", "cust_1", "prod_1") == entry
+    assert second.count == 0
+
+
+def test_resolve_distinguishes_missing_customer_and_inactive_subscription(db):
+    assert resolve_subscription(db, "user_1", "nope", "prod_1") is None
+    inactive = resolve_subscription(db, "user_1", "cust_1", "other_product")
+    assert inactive.stripe_customer_id == "cus_1"
+    assert not inactive.active
+
+
+def test_webhook_sync_updates_status_and_cache(db):
+    resolve_subscription(db, "user_1", "cust_1", "prod_1")
+
+    synced = sync_subscription_from_stripe(db, stripe_subscription("canceled"))
+
+    assert [s.stripe_subscription_item_id for s in synced] == ["si_1"]
+    assert db.query(Subscription).one().status == "canceled"
+    assert not subscription_cache.get(("user_1", "cust_1", "prod_1")).active
+
+
+def test_webhook_sync_adds_subscriptions_created_outside_zenpay(db):
+    db.query(Subscription).delete()
+    db.commit()
+
+    synced = sync_subscription_from_stripe(db, stripe_subscription("active", item_id="si_2", sub_id="sub_2"))
+    assert len(synced) == 1
+    assert subscription_cache.get(("user_1", "cust_1", "prod_1")) == CachedSubscription(True, "cus_1", "si_2")
+
+    # Prices that are not ZenPay products are ignored
+    assert sync_subscription_from_stripe(db, stripe_subscription("active", "si_3", "price_x", "sub_3")) == []
+
+
+def test_cache_entries_expire():
+    now = [0.0]
+    cache = SubscriptionCache(ttl=10, max_entries=10, clock=lambda: now[0])
+    cache.put(("u", "c", "p"), CachedSubscription(True, "cus", "si"))
+    now[0] = 11
+    assert cache.get(("u", "c", "p")) is None
+
+
+def test_reporting_adds_no_reads_once_cache_is_warm(engine, db, app_client):
+    client = app_client({"/api/v1/usage": usage_router}, api_key=API_KEY)
+    body = {"customer_id": "cust_1", "product": "tokens", "quantity": 1}
+
+    with patch("api.routes.usage.report_usage_to_stripe") as report:
+        client.post("/api/v1/usage/track?report_to_stripe=true", json=body)
+        with count_queries(engine) as reported:
+            response = client.post("/api/v1/usage/track?report_to_stripe=true", json=body)
+    assert response.status_code == 200
+    assert report.call_args.kwargs["stripe_customer_id"] == "cus_1"
+
+    with count_queries(engine) as unreported:
+        client.post("/api/v1/usage/track?report_to_stripe=false", json=body)
+    # The only extra statement flags the event as reported
+    assert reported.count == unreported.count + 1
+    assert reported.statements[-1].startswith("UPDATE usage_events SET reported_to_stripe")
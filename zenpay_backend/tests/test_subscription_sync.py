@@ -0,0 +1,124 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from api.db.migrate import migrate
+from api.db.models import User, Customer, Product, Subscription
+from api.db.profiling import count_queries
+from api.services import subscription_sync
+from api.services.stripe_service import get_subscription_item_id
+from api.services.subscription_cache import subscription_cache
+
+
+@pytest.fixture
+def db(engine):
+    subscription_cache.clear()
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(User(id="user_1", email="sync@example.com", api_key="zp_sync"))
+    session.add(Customer(id="cust_1", user_id="user_1", stripe_customer_id="cus_1"))
+    for code in ("a", "b"):
+        session.add(Product(id=f"prod_{code}", user_id="user_1", name=code, code=code, unit_name="unit",
+                            price_per_unit=0.01, stripe_product_id=f"sp_{code}", stripe_price_id=f"price_{code}"))
+    session.commit()
+    yield session
+    session.close()
+    subscription_cache.clear()
+
+
+def stripe_subscription(sub_id, status, *items, customer="cus_1"):
+    return {
+        "id": sub_id,
+        "status": status,
+        "customer": customer,
+        "items": {"data": [{"id": item_id, "price": {"id": price_id}} for item_id, price_id in items],
+                  "has_more": False},
+    }
+
+
+def stripe_list(*objects):
+    listing = MagicMock()
+    listing.auto_paging_iter.return_value = iter(objects)
+    return listing
+
+
+def test_sync_mirrors_all_items_of_all_subscriptions(engine, db):
+    subscriptions = stripe_list(
+        stripe_subscription("sub_1", "active", ("si_1", "price_a"), ("si_2", "price_b")),
+        stripe_subscription("sub_2", "canceled", ("si_3", "price_a")),
+        stripe_subscription("sub_3", "active", ("si_4", "price_unknown")),
+        stripe_subscription("sub_4", "active", ("si_5", "price_a"), customer="cus_other"),
+    )
+    with patch("stripe.Subscription.list", return_value=subscriptions) as list_call:
+        stats = subscription_sync.sync_subscriptions(db)
+
+    assert list_call.call_args.kwargs["status"] == "all"
+    assert (stats.subscriptions, stats.items, stats.skipped_customers) == (3, 3, 1)
+    rows = {r.stripe_subscription_item_id: r for r in db.query(Subscription)}
+    assert set(rows) == {"si_1", "si_2", "si_3"}
+    assert rows["si_2"].product_id == "prod_b"
+    assert rows["si_3"].status == "canceled"
+
+    with count_queries(engine) as lookup:
+        assert get_subscription_item_id("cus_1", "price_b", db=db) == "si_2"
+    assert lookup.count == 1
+    # The canceled subscription's item is not returned
+    db.query(Subscription).filter(Subscription.stripe_subscription_item_id == "si_1").delete()
+    assert get_subscription_item_id("cus_1", "price_a", db=db) is None
+
+
+def test_resync_updates_status_and_cancels_removed_items(db):
+    first = stripe_list(stripe_subscription("sub_1", "active", ("si_1", "price_a"), ("si_2", "price_b")))
+    second = stripe_list(stripe_subscription("sub_1", "past_due", ("si_1", "price_a")))
+    with patch("stripe.Subscription.list", side_effect=[first, second]):
+        subscription_sync.sync_subscriptions(db)
+        subscription_sync.sync_subscriptions(db)
+
+    rows = {r.stripe_subscription_item_id: r.status for r in db.query(Subscription)}
+    assert rows == {"si_1": "past_due", "si_2": "canceled"}
+    assert not subscription_cache.get(("user_1", "cust_1", "prod_b")).active
+
+
+def test_items_beyond_first_page_are_listed(db):
+    subscription = stripe_subscription("sub_1", "active", ("si_1", "price_a"))
+    subscription["items"]["has_more"] = True
+    more_items = stripe_list({"id": "si_1", "price": {"id": "price_a"}}, {"id": "si_2", "price": {"id": "price_b"}})
+    with patch("stripe.Subscription.list", return_value=stripe_list(subscription)), \
+            patch("stripe.SubscriptionItem.list", return_value=more_items):
+        stats = subscription_sync.sync_subscriptions(db)
+
+    assert stats.items == 2
+
+
+def test_migration_allows_several_items_per_subscription():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE customers (id VARCHAR PRIMARY KEY, user_id VARCHAR, stripe_customer_id VARCHAR)"))
+        conn.execute(text(
+            "CREATE TABLE products (id VARCHAR PRIMARY KEY, user_id VARCHAR, price_per_unit FLOAT, stripe_price_id VARCHAR, "
+            "created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE subscriptions (id VARCHAR PRIMARY KEY, user_id VARCHAR, customer_id VARCHAR, "
+            "product_id VARCHAR, stripe_subscription_id VARCHAR NOT NULL UNIQUE, "
+            "stripe_subscription_item_id VARCHAR NOT NULL UNIQUE, status VARCHAR, created_at DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO customers VALUES ('cust_1', 'user_1', 'cus_1')"))
+        conn.execute(text("INSERT INTO products VALUES ('prod_a', 'user_1', 0.01, 'price_a', NULL)"))
+        conn.execute(text(
+            "INSERT INTO subscriptions (id, user_id, customer_id, product_id, stripe_subscription_id, "
+            "stripe_subscription_item_id, status) VALUES ('s1', 'user_1', 'cust_1', 'prod_a', 'sub_1', 'si_1', 'active')"
+        ))
+
+    migrate(engine)
+
+    uniques = inspect(engine).get_unique_constraints("subscriptions")
+    assert [u["column_names"] for u in uniques] == [["stripe_subscription_item_id"]]
+    with engine.begin() as conn:
+        row = conn.execute(text("SELECT stripe_customer_id, stripe_price_id FROM subscriptions")).one()
+        assert tuple(row) == ("cus_1", "price_a")
+        conn.execute(text(
+            "INSERT INTO subscriptions (id, user_id, customer_id, product_id, stripe_subscription_id, "
+            "stripe_subscription_item_id, status) VALUES ('s2', 'user_1', 'cust_1', 'prod_a', 'sub_1', 'si_2', 'active')"
+        ))
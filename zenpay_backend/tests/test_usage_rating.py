@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from api.db.crud.products import update_product
+from api.db.crud.usage import get_usage_cost, track_usage
+from api.db.migrate import migrate
+from api.db.models import User, Customer, Product, CreditTransaction
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(User(id="user_1", email="rating@example.com", api_key="zp_rating"))
+    session.add(Customer(id="cust_1", user_id="user_1"))
+    session.add(Product(id="prod_1", user_id="user_1", name="Tokens", code="tokens", unit_name="token",
+                        price_per_unit=0.5))
+    session.add(CreditTransaction(user_id="user_1", customer_id="cust_1", amount=100, type="topup"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_events_keep_the_cost_they_were_rated_at(db):
+    first = track_usage(db, "user_1", "cust_1", "tokens", 4)
+    assert (first.cost, first.price_version) == (2.0, 1)
+
+    update_product(db, "user_1", "prod_1", price_per_unit=0.25)
+    update_product(db, "user_1", "prod_1", name="Renamed")
+    second = track_usage(db, "user_1", "cust_1", "tokens", 4)
+
+    assert (second.cost, second.price_version) == (1.0, 2)
+    assert db.get(Product, "prod_1").price_version == 2
+    assert get_usage_cost(db, "user_1", customer_id="cust_1") == 3.0
+    assert get_usage_cost(db, "user_1", start_date=datetime(2100, 1, 1)) == 0
+
+
+def test_migration_rates_existing_events():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE products (id VARCHAR PRIMARY KEY, user_id VARCHAR, price_per_unit FLOAT, "
+            "stripe_price_id VARCHAR, created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE usage_events (id VARCHAR PRIMARY KEY, user_id VARCHAR, customer_id VARCHAR, "
+            "product_id VARCHAR, quantity FLOAT, timestamp DATETIME)"
+        ))
+        conn.execute(text("INSERT INTO products (id, user_id, price_per_unit) VALUES ('prod_1', 'user_1', 0.5)"))
+        conn.execute(text("INSERT INTO usage_events (id, product_id, quantity) VALUES ('ev_1', 'prod_1', 3)"))
+
+    migrate(engine)
+
+    with engine.connect() as conn:
+        assert tuple(conn.execute(text("SELECT cost_micros, price_version FROM usage_events")).one()) == (1_500_000, 1)
@@ -0,0 +1,96 @@
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+import stripe
+from sqlalchemy.orm import sessionmaker
+
+from api.db.models import User, Customer, Product, UsageEvent
+from api.db.profiling import count_queries
+from api.services.stripe_service import get_daily_meter_usage
+from api.services.usage_reconciliation import UsageReconciliation
+
+JAN_1, JAN_2, JAN_3 = date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 3)
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(User(id="user_1", email="reconcile@example.com", api_key="zp_reconcile"))
+    for i in range(5):
+        session.add(Customer(id=f"cust_{i}", user_id="user_1", stripe_customer_id=f"cus_{i}"))
+    session.add(Customer(id="cust_local_only", user_id="user_1"))
+    for code in ("a", "b"):
+        session.add(Product(id=f"prod_{code}", user_id="user_1", name=code, code=code, unit_name="unit",
+                            price_per_unit=0.01))
+
+    def event(customer_id, product_id, quantity, day, reported=True):
+        session.add(UsageEvent(user_id="user_1", customer_id=customer_id, product_id=product_id, quantity=quantity,
+                               reported_to_stripe=reported, timestamp=datetime(day.year, day.month, day.day, 12)))
+
+    for i in range(5):
+        event(f"cust_{i}", "prod_a", 10, JAN_1)
+        event(f"cust_{i}", "prod_b", 5, JAN_1)
+    event("cust_1", "prod_a", 7, JAN_2)
+    event("cust_1", "prod_a", 3, JAN_2, reported=False)
+    event("cust_2", "prod_a", 100, JAN_3)  # outside the range
+    session.commit()
+    yield session
+    session.close()
+
+
+def stripe_usage(meter_id, stripe_customer_id, start_time, end_time):
+    return {
+        "cus_0": {JAN_1: 15},
+        "cus_1": {JAN_1: 15},  # JAN_2 never reached Stripe
+        "cus_2": {JAN_1: 15, JAN_2: 4},  # extra usage in Stripe
+        "cus_3": {JAN_1: 14},
+        "cus_4": {JAN_1: 15},
+    }[stripe_customer_id]
+
+
+def test_reconciliation_reports_drift_per_customer_and_day(engine, db):
+    reconciliation = UsageReconciliation(db, "mtr_1", JAN_1, JAN_3, rate=0, chunk_size=2)
+    with patch("api.services.usage_reconciliation.get_daily_meter_usage", side_effect=stripe_usage) as fetch, \
+            count_queries(engine) as queries:
+        found = list(reconciliation.run())
+
+    assert [(d.customer_id, d.day, d.local_quantity, d.stripe_quantity, d.unreported_quantity) for d in found] == [
+        ("cust_1", JAN_2, 7, 0, 3),
+        ("cust_2", JAN_2, 0, 4, 0),
+        ("cust_3", JAN_1, 15, 14, 0),
+    ]
+    assert found[0].difference == 7
+    assert fetch.call_args.args[2:] == (1767225600, 1767398400)
+    stats = reconciliation.stats
+    assert (stats.customers, stats.days, stats.discrepancies, stats.failed_customers) == (5, 7, 3, 0)
+    # Per chunk of two customers: one page query and one grouped query, plus the final empty page
+    assert queries.count == 3 * 2 + 1
+
+
+def test_tolerance_and_failed_customers(db):
+    def fetch(meter_id, stripe_customer_id, start_time, end_time):
+        if stripe_customer_id == "cus_2":
+            raise stripe.error.APIError("down")
+        return stripe_usage(meter_id, stripe_customer_id, start_time, end_time)
+
+    reconciliation = UsageReconciliation(db, "mtr_1", JAN_1, JAN_3, rate=0, tolerance=1)
+    with patch("api.services.usage_reconciliation.get_daily_meter_usage", side_effect=fetch):
+        found = list(reconciliation.run())
+
+    assert [d.customer_id for d in found] == ["cust_1"]
+    assert reconciliation.stats.failed_customers == 1
+    assert reconciliation.stats.errors == {"APIError": 1}
+
+
+def test_daily_meter_usage_keys_summaries_by_utc_day():
+    summaries = MagicMock()
+    summaries.auto_paging_iter.return_value = iter([
+        {"start_time": 1767225600, "aggregated_value": 15.0},
+        {"start_time": 1767312000, "aggregated_value": 4.0},
+    ])
+    with patch("stripe.billing.Meter.list_event_summaries", return_value=summaries) as list_summaries:
+        usage = get_daily_meter_usage("mtr_1", "cus_1", 1767225600, 1767398400)
+
+    assert usage == {JAN_1: 15.0, JAN_2: 4.0}
+    assert list_summaries.call_args.kwargs["value_grouping_window"] == "day"
@@ -0,0 +1,127 @@
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+import stripe
+from sqlalchemy.orm import sessionmaker
+
+from api.db.models import User, Customer, Product, Subscription, UsageEvent
+from api.services.usage_reporting import CheckpointMismatchError, UsageBackfill
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    session.add(User(id="user_1", email="backfill@example.com", api_key="zp_backfill"))
+    session.add(Customer(id="cust_1", user_id="user_1", stripe_customer_id="cus_1"))
+    session.add(Customer(id="cust_2", user_id="user_1"))
+    session.add(Product(id="prod_1", user_id="user_1", name="Tokens", code="tokens", unit_name="token",
+                        price_per_unit=0.01))
+    session.add(Subscription(user_id="user_1", customer_id="cust_1", product_id="prod_1",
+                             stripe_subscription_id="sub_1", stripe_subscription_item_id="si_1"))
+    for i in range(7):
+        session.add(UsageEvent(id=f"ev_{i}", user_id="user_1", customer_id="cust_1", product_id="prod_1",
+                               quantity=i + 1, timestamp=datetime(2026, 1, 1, 0, i)))
+    session.add(UsageEvent(id="ev_reported", user_id="user_1", customer_id="cust_1", product_id="prod_1",
+                           quantity=1, reported_to_stripe=True))
+    session.add(UsageEvent(id="ev_no_stripe_id", user_id="user_1", customer_id="cust_2", product_id="prod_1",
+                           quantity=1))
+    session.add(UsageEvent(id="ev_opted_out", user_id="user_1", customer_id="cust_1", product_id="prod_1",
+                           quantity=1, report_to_stripe=False))
+    session.commit()
+    yield session
+    session.close()
+
+
+def unreported(db):
+    return sorted(e.id for e in db.query(UsageEvent).filter(UsageEvent.reported_to_stripe.is_(False)))
+
+
+def test_backfill_reports_unreported_events_once(db, tmp_path):
+    checkpoint = tmp_path / "backfill.json"
+    with patch("stripe.billing.MeterEvent.create") as create:
+        stats = UsageBackfill(db, workers=3, rate=0, page_size=3, checkpoint=str(checkpoint)).run()
+
+    assert (stats.reported, stats.failed, stats.pages) == (7, 0, 3)
+    assert sorted(c.kwargs["identifier"] for c in create.call_args_list) == [f"ev_{i}" for i in range(7)]
+    first = next(c.kwargs for c in create.call_args_list if c.kwargs["identifier"] == "ev_2")
+    assert first["payload"] == {"stripe_customer_id": "cus_1", "value": 3}
+    assert unreported(db) == ["ev_no_stripe_id", "ev_opted_out"]
+    assert json.loads(checkpoint.read_text())["last_id"] == "ev_6"
+
+
+def test_failures_are_counted_and_left_unreported(db):
+    def create(**kwargs):
+        if kwargs["identifier"] == "ev_1":
+            raise stripe.error.InvalidRequestError("timestamp too old", None)
+
+    with patch("stripe.billing.MeterEvent.create", side_effect=create):
+        stats = UsageBackfill(db, rate=0).run()
+
+    assert (stats.reported, stats.failed) == (6, 1)
+    assert stats.errors == {"InvalidRequestError": 1}
+    assert unreported(db) == ["ev_1", "ev_no_stripe_id", "ev_opted_out"]
+    assert stats.failed_ids == ["ev_1"]
+
+
+def test_rate_limit_errors_are_retried(db):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs["identifier"])
+        if calls.count(kwargs["identifier"]) == 1 and kwargs["identifier"] == "ev_0":
+            raise stripe.error.RateLimitError("slow down")
+
+    sleeps = []
+    with patch("stripe.billing.MeterEvent.create", side_effect=create):
+        stats = UsageBackfill(db, rate=0, sleep=sleeps.append).run()
+
+    assert (stats.reported, stats.retries) == (7, 1)
+    assert sleeps == [0.5]
+
+
+def test_interrupted_run_resumes_from_checkpoint(db, tmp_path):
+    checkpoint = str(tmp_path / "backfill.json")
+    with patch("stripe.billing.MeterEvent.create", side_effect=stripe.error.APIError("down")):
+        first = UsageBackfill(db, rate=0, page_size=2, checkpoint=checkpoint).run(max_events=4)
+    assert first.failed_ids == ["ev_0", "ev_1", "ev_2", "ev_3"]
+
+    with patch("stripe.billing.MeterEvent.create") as create:
+        stats = UsageBackfill(db, rate=0, page_size=2, checkpoint=checkpoint).run()
+
+    # The failed first four are retried, then the run continues after them
+    assert sorted(c.kwargs["identifier"] for c in create.call_args_list[:4]) == ["ev_0", "ev_1", "ev_2", "ev_3"]
+    assert sorted(c.kwargs["identifier"] for c in create.call_args_list) == [f"ev_{i}" for i in range(7)]
+    assert (stats.reported, stats.failed, stats.failed_ids) == (7, 0, [])
+    assert stats.errors == {"APIError": 4}
+    assert unreported(db) == ["ev_no_stripe_id", "ev_opted_out"]
+
+
+def test_checkpoint_must_be_resumed_with_its_filters(db, tmp_path):
+    checkpoint = str(tmp_path / "backfill.json")
+    with patch("stripe.billing.MeterEvent.create"):
+        UsageBackfill(db, rate=0, page_size=2, checkpoint=checkpoint).run(
+            user_id="user_1", start_date=datetime(2026, 1, 1), max_events=2
+        )
+        saved = json.loads(open(checkpoint).read())
+        assert (saved["user_id"], saved["since"], saved["until"]) == ("user_1", "2026-01-01T00:00:00", None)
+
+        with pytest.raises(CheckpointMismatchError):
+            UsageBackfill(db, rate=0, checkpoint=checkpoint).run(user_id="user_1")
+        stats = UsageBackfill(db, rate=0, checkpoint=checkpoint).run(user_id="user_1", start_date=datetime(2026, 1, 1))
+
+    assert stats.reported == 7
+
+
+def test_token_bucket_paces_requests(db):
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    with patch("stripe.billing.MeterEvent.create"):
+        UsageBackfill(db, workers=1, rate=2, clock=lambda: now[0], sleep=sleep).run()
+
+    # A burst of two, then one request every half second
+    assert now[0] == pytest.approx(2.5)
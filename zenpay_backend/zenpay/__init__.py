@@ -1 +1,2 @@
 from .client import ZenPay
+from .spool import SpoolFullError
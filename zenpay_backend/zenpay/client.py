@@ -1,9 +1,45 @@
+import logging
+import uuid
+from typing import Optional
+
+import requests
+
 from .api import create_customer, track_usage, create_product, create_subscription, add_credits
+from .spool import UsageSpool, SpoolReplayer
+
+logger = logging.getLogger(__name__)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """Network failures and 5xx responses are worth retrying; 4xx are not"""
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code >= 500
+    return False
+
 
 class ZenPay:
-    def __init__(self, api_key: str, base_url: str = "http://127.0.0.1:8000"):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "http://127.0.0.1:8000",
+        spool_dir: Optional[str] = None,
+        spool_max_bytes: int = 64 * 1024 * 1024,
+    ):
+        """
+        If ``spool_dir`` is set, usage events that cannot reach the server are
+        written to an on-disk spool there and replayed in order by a
+        background thread, with their original idempotency keys.
+        """
         self.api_key = api_key
         self.base_url = base_url
+        self._spool = None
+        self._replayer = None
+        if spool_dir:
+            self._spool = UsageSpool(spool_dir, max_bytes=spool_max_bytes)
+            self._replayer = SpoolReplayer(self._spool, self._replay_usage)
+            self._replayer.start()
 
     def create_customer(self, customer_data: dict):
         return create_customer(self.base_url, self.api_key, customer_data)
@@ -18,4 +54,40 @@ class ZenPay:
         return add_credits(self.base_url, self.api_key, credit_data)
 
     def track_usage(self, usage_data: dict):
-        return track_usage(self.base_url, self.api_key, usage_data)
\ No newline at end of file
+        if self._spool is None:
+            return track_usage(self.base_url, self.api_key, usage_data)
+
+        # The key must be fixed before the first attempt so a replay after a
+        # lost response is deduplicated by the server.
+        usage_data = dict(usage_data)
+        if not usage_data.get("idempotency_key"):
+            usage_data["idempotency_key"] = str(uuid.uuid4())
+
+        # Anything already spooled goes first to keep events in order
+        if not self._spool.has_pending():
+            try:
+                return track_usage(self.base_url, self.api_key, usage_data)
+            except requests.RequestException as e:
+                if not _is_retryable(e):
+                    raise
+                logger.warning(f"ZenPay unreachable, spooling usage event: {e}")
+
+        self._spool.append(usage_data)
+        self._replayer.wake()
+        return {"spooled": True, "idempotency_key": usage_data["idempotency_key"]}
+
+    def close(self):
+        """Stop the replay thread and flush the spool to disk"""
+        if self._replayer is not None:
+            self._replayer.stop()
+        if self._spool is not None:
+            self._spool.close()
+
+    def _replay_usage(self, usage_data: dict):
+        try:
+            track_usage(self.base_url, self.api_key, usage_data)
+        except requests.RequestException as e:
+            if _is_retryable(e):
+                raise
+            # The server will never accept this one; drop it rather than block the spool
+            logger.error(f"Dropping spooled usage event {usage_data.get('idempotency_key')}: {e}")
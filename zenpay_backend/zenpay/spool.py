@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".seg"
+ACK_FILE = "ack"
+
+
+class SpoolFullError(Exception):
+    """Raised when appending would push the spool past its size cap"""
+    pass
+
+
+class UsageSpool:
+    """
+    Append-only on-disk spool for usage events that could not be sent.
+
+    Records are stored as JSON lines in numbered segment files. Each record
+    gets a monotonically increasing sequence number; the highest sequence
+    number the server has accepted is kept in a small ``ack`` file. Segments
+    whose records are all acknowledged are deleted by ``compact()``.
+
+    Writes are fsynced in batches: after ``fsync_batch`` records or once
+    ``fsync_interval`` seconds have passed since the last sync, whichever
+    comes first. ``sync()`` forces the pending tail to disk.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 64 * 1024 * 1024,
+        segment_bytes: int = 1024 * 1024,
+        fsync_batch: int = 64,
+        fsync_interval: float = 0.2,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_path: Optional[str] = None
+        self._file_bytes = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        # segment path -> (last sequence number, size in bytes)
+        self._segments: Dict[str, Tuple[int, int]] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self._acked = self._read_ack()
+        self._next_seq = self._scan_segments() + 1
+        if self._acked >= self._next_seq:
+            self._next_seq = self._acked + 1
+
+    # -- public API ---------------------------------------------------------
+
+    def append(self, record: dict) -> int:
+        """Append a record and return its sequence number"""
+        with self._lock:
+            seq = self._next_seq
+            line = (json.dumps({"seq": seq, "data": record}, separators=(",", ":")) + "\n").encode("utf-8")
+
+            if self.size_bytes + len(line) > self.max_bytes:
+                self._compact_locked()
+                if self.size_bytes + len(line) > self.max_bytes:
+                    raise SpoolFullError(
+                        f"Spool at {self.directory} is full ({self.size_bytes} of {self.max_bytes} bytes)"
+                    )
+
+            if self._file is None or self._file_bytes + len(line) > self.segment_bytes:
+                self._roll_segment(seq)
+
+            self._file.write(line)
+            self._file_bytes += len(line)
+            self._segments[self._file_path] = (seq, self._file_bytes)
+            self._next_seq = seq + 1
+            self._unsynced += 1
+
+            if (
+                self._unsynced >= self.fsync_batch
+                or time.monotonic() - self._last_sync >= self.fsync_interval
+            ):
+                self._sync_locked()
+            return seq
+
+    def sync(self) -> None:
+        """Flush and fsync any records appended since the last sync"""
+        with self._lock:
+            self._sync_locked()
+
+    def pending(self, limit: Optional[int] = None) -> List[Tuple[int, dict]]:
+        """Return unacknowledged records in append order"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            acked = self._acked
+            paths = sorted(self._segments)
+
+        records: List[Tuple[int, dict]] = []
+        for path in paths:
+            if self._segments.get(path, (0, 0))[0] <= acked:
+                continue
+            for seq, data in self._read_segment(path):
+                if seq <= acked:
+                    continue
+                records.append((seq, data))
+                if limit is not None and len(records) >= limit:
+                    return records
+        return records
+
+    def has_pending(self) -> bool:
+        return self._next_seq - 1 > self._acked
+
+    def ack(self, seq: int) -> None:
+        """Mark every record up to and including ``seq`` as delivered"""
+        with self._lock:
+            if seq <= self._acked:
+                return
+            self._acked = seq
+            tmp_path = os.path.join(self.directory, ACK_FILE + ".tmp")
+            with open(tmp_path, "w") as f:
+                f.write(str(seq))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.directory, ACK_FILE))
+
+    def compact(self) -> int:
+        """Delete fully acknowledged segments and return how many were removed"""
+        with self._lock:
+            return self._compact_locked()
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(size for _, size in self._segments.values())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+                self._file_path = None
+
+    # -- internals ----------------------------------------------------------
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, f"{first_seq:020d}{SEGMENT_SUFFIX}")
+
+    def _roll_segment(self, first_seq: int) -> None:
+        if self._file is not None:
+            self._sync_locked()
+            self._file.close()
+        self._file_path = self._segment_path(first_seq)
+        self._file = open(self._file_path, "ab")
+        self._file_bytes = 0
+        self._segments[self._file_path] = (first_seq - 1, 0)
+
+    def _sync_locked(self) -> None:
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _compact_locked(self) -> int:
+        removed = 0
+        for path, (last_seq, size) in list(self._segments.items()):
+            if last_seq > self._acked or size == 0:
+                continue
+            if path == self._file_path:
+                # Stop appending to a fully acknowledged segment so it can go
+                self._sync_locked()
+                self._file.close()
+                self._file = None
+                self._file_path = None
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self._segments[path]
+            removed += 1
+        return removed
+
+    def _read_ack(self) -> int:
+        try:
+            with open(os.path.join(self.directory, ACK_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _scan_segments(self) -> int:
+        last_seq = 0
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            segment_last = 0
+            for seq, _ in self._read_segment(path):
+                segment_last = seq
+            self._segments[path] = (segment_last, os.path.getsize(path))
+            last_seq = max(last_seq, segment_last)
+        return last_seq
+
+    @staticmethod
+    def _read_segment(path: str):
+        try:
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn write at the tail of a segment after a crash
+                        continue
+                    yield entry["seq"], entry["data"]
+        except FileNotFoundError:
+            return
+
+
+class SpoolReplayer(threading.Thread):
+    """
+    Background thread that drains a ``UsageSpool`` in order.
+
+    ``send`` is called with each record's payload. It should return normally
+    once the server has accepted (or permanently rejected) the record and
+    raise to signal the record must be retried later. Retries back off
+    exponentially up to ``max_backoff`` seconds.
+    """
+
+    def __init__(
+        self,
+        spool: UsageSpool,
+        send: Callable[[dict], None],
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        super().__init__(name="zenpay-spool-replayer", daemon=True)
+        self.spool = spool
+        self.send = send
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._backoff = 0.0
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopped.set()
+        self._wake.set()
+        self.join(timeout)
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            self.spool.sync()
+            delay = self.poll_interval
+            if self.spool.has_pending():
+                delay = self.drain_once()
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def drain_once(self) -> float:
+        """Replay one batch; return how long to wait before the next attempt"""
+        for seq, record in self.spool.pending(limit=self.batch_size):
+            if self._stopped.is_set():
+                return 0
+            try:
+                self.send(record)
+            except Exception as e:
+                self._backoff = min(self.max_backoff, max(self._backoff * 2, self.poll_interval))
+                logger.warning(f"Spool replay failed at seq {seq}, retrying in {self._backoff:.1f}s: {e}")
+                return self._backoff
+            self.spool.ack(seq)
+
+        self._backoff = 0.0
+        self.spool.compact()
+        return 0 if self.spool.has_pending() else self.poll_interval